@@ -0,0 +1,637 @@
+"""A local stand-in for an OpenAI/Ollama-compatible model server.
+
+Answers `/v1/chat/completions` (streamed or not), `/v1/models`, the Batch API
+(`/v1/files`, `/v1/batches`) and the Ollama `/api/ps`, `/api/generate` and
+`/api/chat` load/unload routes with plausible responses:
+rewrite requests get the file back with a docstring, chunk requests get the
+chunk back, structured requests get JSON matching the schema instructor sends.
+Timing follows the configured prefill and decode speeds, at most `slots`
+requests are served at once, and a fraction of requests fail with 500 or 429.
+The first request for a model that is not loaded waits `load_seconds`. A batch
+waits `batch_delay` seconds before its lines are served like requests.
+
+    uv run scripts/bench/fake_server.py --port 8000 --decode 40 --rate-limit-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+CHARS_PER_TOKEN: int = 4
+"""Characters per token used to size prompts and completions."""
+
+_SEPARATOR = "=" * 48
+
+
+@dataclass
+class Profile:
+    """Simulated model server.
+
+    Attributes:
+        prefill (float): Prompt tokens processed per second before the first token.
+        decode (float): Completion tokens generated per second by each request.
+        slots (int): Requests generated at once; the others queue.
+        error_rate (float): Fraction of requests answered with a 500.
+        rate_limit_rate (float): Fraction of requests answered with a 429.
+        retry_after (float): `Retry-After` seconds sent with a 429.
+        completion_tokens (int): Completion size when the request does not tell what to echo.
+        load_seconds (float): Cold start of a model that is not loaded.
+        corrupt_rate (float): Fraction of code responses whose code is altered, to exercise verification.
+        batch_delay (float): Seconds a batch is queued before its lines are served.
+        seed (int): Seed of the error draws.
+    """
+
+    prefill: float = 2000.0
+    decode: float = 50.0
+    slots: int = 4
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    completion_tokens: int = 200
+    load_seconds: float = 0.0
+    corrupt_rate: float = 0.0
+    batch_delay: float = 0.0
+    seed: int = 0
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _completion(body: dict, content: str, prompt: int) -> dict:
+    tokens = _tokens(content)
+    return {
+        "id": "fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt,
+            "completion_tokens": tokens,
+            "total_tokens": prompt + tokens,
+        },
+    }
+
+
+def _content(message: dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+def _schema(text: str) -> dict | None:
+    """Find the JSON schema instructor appends to the messages."""
+    idx = text.find("json_schema:")
+    if idx < 0:
+        return None
+    start = text.find("{", idx)
+    try:
+        return json.JSONDecoder().raw_decode(text[start:])[0]
+    except ValueError:
+        return None
+
+
+def _instance(schema: dict, defs: dict, names: list[str], filler: str) -> Any:
+    """Build a value that validates against a JSON schema."""
+    if "$ref" in schema:
+        return _instance(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, names, filler)
+    if "anyOf" in schema:
+        return _instance(schema["anyOf"][0], defs, names, filler)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            key: _instance(prop, defs, names, filler)
+            for key, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        items = schema.get("items", {})
+        item_schema = defs.get(items.get("$ref", "").rsplit("/", 1)[-1], items)
+        if "name" in item_schema.get("properties", {}) and names:
+            # One entry per requested symbol, e.g. `Docstrings`
+            return [
+                {**_instance(item_schema, defs, names, filler), "name": name}
+                for name in names
+            ]
+        return [_instance(items, defs, names, filler) for _ in range(3)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return True
+    return filler
+
+
+class FakeModel:
+    """Generates the completion of a chat request.
+
+    Attributes:
+        profile (Profile): Simulated server.
+    """
+
+    def __init__(self, profile: Profile) -> None:
+        self.profile = profile
+
+    def filler(self, tokens: int) -> str:
+        words = "lorem ipsum dolor sit amet consectetur adipiscing elit".split()
+        return " ".join(
+            words[i % len(words)] for i in range(max(1, tokens * CHARS_PER_TOKEN // 6))
+        )
+
+    def complete(self, body: dict[str, Any]) -> str:
+        messages = body.get("messages", [])
+        text = "\n".join(_content(m) for m in messages)
+        user = next(
+            (_content(m) for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+
+        schema = _schema(text)
+        if schema is not None:
+            names = re.findall(r"- `([^`]+)` \(", text)
+            value = _instance(schema, schema.get("$defs", {}), names, "Generated text.")
+            if body.get("response_format"):
+                return json.dumps(value, indent=2)
+            # Markdown JSON mode asks for a code block
+            return f"```json\n{json.dumps(value, indent=2)}\n```"
+
+        chunk = re.search(r"```python\n(.*?)\n\s*```", user, re.S)
+        if chunk is not None:
+            return f"```python\n{chunk.group(1)}\n```"
+
+        target = re.search(r"File: /?([^`]+)`", user)
+        if target is not None:
+            name = re.escape(target.group(1))
+            # `package` context, or the target of a `pruned` context
+            block = re.search(
+                rf"FILE: {name}\n{_SEPARATOR}\n(.*?)\n\n(?:{_SEPARATOR}|</FILE_CONTENTS>)",
+                text,
+                re.S,
+            ) or re.search(
+                rf"<TARGET_FILE>\nFILE: {name}\n(.*?)\n</TARGET_FILE>", text, re.S
+            )
+            if block is not None:
+                return f'```python\n"""Documented {target.group(1)}."""\n{block.group(1)}\n```'
+
+        return self.filler(self.profile.completion_tokens)
+
+
+class FakeServer:
+    """Runs the fake server in a background thread.
+
+    Attributes:
+        profile (Profile): Simulated server.
+        url (str): OpenAI base URL, e.g. `http://127.0.0.1:8000/v1`.
+        counts (dict[str, int]): Responses sent by status: `ok`, `429`, `500`.
+        loaded (set[str]): Models currently loaded.
+        loads (int): Cold starts so far.
+        batches (dict[str, dict]): Submitted batches by id.
+    """
+
+    def __init__(
+        self, profile: Profile = Profile(), host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        """
+        Bind the server.
+
+        Args:
+            profile (Profile, optional): Simulated server. Defaults to `Profile()`.
+            host (str, optional): Interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, 0 for any free port. Defaults to 0.
+        """
+        self.profile = profile
+        self.counts = {"ok": 0, "429": 0, "500": 0}
+        self.loaded: set[str] = set()
+        self.loads = 0
+        self.batches: dict[str, dict] = {}
+        self._files: dict[str, bytes] = {}
+        self._model = FakeModel(profile)
+        self._slots = threading.Semaphore(max(1, profile.slots))
+        self.__random = random.Random(profile.seed)
+        self.__lock = threading.Lock()
+        self.__httpd = ThreadingHTTPServer((host, port), self.__handler())
+        self.__httpd.daemon_threads = True
+        self.__thread: threading.Thread | None = None
+        self.url = f"http://{host}:{self.__httpd.server_address[1]}/v1"
+
+    def _load(self, model: str) -> None:
+        with self.__lock:
+            cold = model not in self.loaded
+            self.loaded.add(model)
+            self.loads += cold
+        if cold:
+            time.sleep(self.profile.load_seconds)
+
+    def _unload(self, model: str) -> None:
+        with self.__lock:
+            self.loaded.discard(model)
+
+    def _corrupt(self) -> bool:
+        with self.__lock:
+            return self.__random.random() < self.profile.corrupt_rate
+
+    def _answer(self, body: dict) -> tuple[str, int]:
+        """Completion of a request and its prompt tokens, with the load and corruption applied."""
+        self._load(body.get("model", "fake"))
+        prompt = sum(_tokens(_content(m)) for m in body.get("messages", []))
+        completion = self._model.complete(body)
+        if completion.startswith("```python") and self._corrupt():
+            completion = completion.replace("\n```", "\nprint('changed')\n```", 1)
+        return completion, prompt
+
+    def _upload(self, data: bytes, filename: str, purpose: str) -> dict:
+        with self.__lock:
+            file_id = f"file-{len(self._files) + 1}"
+            self._files[file_id] = data
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def _create_batch(self, body: dict) -> dict:
+        lines = self._files[body["input_file_id"]].decode("utf-8").splitlines()
+        with self.__lock:
+            batch_id = f"batch_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "validating",
+                "created_at": int(time.time()),
+                "completed_at": None,
+                "output_file_id": None,
+                "error_file_id": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+        threading.Thread(
+            target=self._run_batch, args=(batch_id, lines), daemon=True
+        ).start()
+        return self.batches[batch_id]
+
+    def _run_batch(self, batch_id: str, lines: list[str]) -> None:
+        batch = self.batches[batch_id]
+        time.sleep(self.profile.batch_delay)
+        batch["status"] = "in_progress"
+
+        def serve(line: str) -> tuple[bool, str]:
+            request = json.loads(line)
+            status = self._draw()
+            if status != "ok":
+                code = 429 if status == "429" else 500
+                response = {
+                    "status_code": code,
+                    "request_id": "",
+                    "body": {"error": {"message": status}},
+                }
+            else:
+                completion, prompt = self._answer(request["body"])
+                with self._slots:
+                    time.sleep(
+                        prompt / self.profile.prefill
+                        + _tokens(completion) / self.profile.decode
+                    )
+                body = _completion(request["body"], completion, prompt)
+                response = {"status_code": 200, "request_id": "", "body": body}
+            with self.__lock:
+                batch["request_counts"][
+                    "completed" if status == "ok" else "failed"
+                ] += 1
+            entry = {
+                "id": f"req-{request['custom_id']}",
+                "custom_id": request["custom_id"],
+                "response": response,
+                "error": None,
+            }
+            return status == "ok", json.dumps(entry)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.profile.slots)) as pool:
+            served = list(pool.map(serve, [line for line in lines if line.strip()]))
+        for key, ok in (("output_file_id", True), ("error_file_id", False)):
+            content = "".join(f"{entry}\n" for good, entry in served if good is ok)
+            if content:
+                batch[key] = self._upload(
+                    content.encode("utf-8"), f"{batch_id}.jsonl", "batch_output"
+                )["id"]
+        batch["completed_at"] = int(time.time())
+        batch["status"] = "completed"
+
+    def _draw(self) -> str:
+        with self.__lock:
+            draw = self.__random.random()
+            if draw < self.profile.rate_limit_rate:
+                status = "429"
+            elif draw < self.profile.rate_limit_rate + self.profile.error_rate:
+                status = "500"
+            else:
+                status = "ok"
+            self.counts[status] += 1
+        return status
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+        profile = self.profile
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def send_json(
+                self, obj: Any, status: int = 200, headers: dict[str, str] = {}
+            ) -> None:
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_bytes(self, data: bytes) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                batch = re.fullmatch(r"/v1/batches/([^/]+)", self.path.rstrip("/"))
+                content = re.fullmatch(
+                    r"/v1/files/([^/]+)/content", self.path.rstrip("/")
+                )
+                if batch is not None and batch.group(1) in server.batches:
+                    self.send_json(server.batches[batch.group(1)])
+                elif content is not None and content.group(1) in server._files:
+                    self.send_bytes(server._files[content.group(1)])
+                elif self.path.rstrip("/").endswith("/models"):
+                    model = {
+                        "id": "fake",
+                        "object": "model",
+                        "created": 0,
+                        "owned_by": "bench",
+                    }
+                    self.send_json({"object": "list", "data": [model]})
+                elif self.path.startswith("/api/ps"):
+                    self.send_json(
+                        {
+                            "models": [
+                                {"name": m, "model": m} for m in sorted(server.loaded)
+                            ]
+                        }
+                    )
+                elif self.path.startswith("/api/"):
+                    self.send_json({"models": []})
+                else:
+                    self.send_json({"error": {"message": "not found"}}, status=404)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                data = self.rfile.read(length)
+                if self.path.rstrip("/") == "/v1/files":
+                    # multipart/form-data with `file` and `purpose` fields
+                    header = (
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+                    )
+                    form = {
+                        part.get_param("name", header="content-disposition"): part
+                        for part in BytesParser(policy=HTTP)
+                        .parsebytes(header + data)
+                        .iter_parts()
+                    }
+                    return self.send_json(
+                        server._upload(
+                            form["file"].get_payload(decode=True),
+                            form["file"].get_filename() or "upload",
+                            form["purpose"].get_payload(decode=True).decode(),
+                        )
+                    )
+                body = json.loads(data or b"{}")
+                if self.path.rstrip("/") == "/v1/batches":
+                    return self.send_json(server._create_batch(body))
+                if self.path.startswith("/api/"):
+                    # Ollama loads a model on a request without a prompt and unloads it with keep_alive 0
+                    model = body.get("model", "fake")
+                    if body.get("keep_alive") in (0, "0"):
+                        server._unload(model)
+                        reason = "unload"
+                    else:
+                        server._load(model)
+                        reason = "load"
+                    reply = {
+                        "model": model,
+                        "created_at": "2024-01-01T00:00:00Z",
+                        "done": True,
+                        "done_reason": reason,
+                    }
+                    if self.path.startswith("/api/chat"):
+                        reply["message"] = {"role": "assistant", "content": ""}
+                    else:
+                        reply["response"] = ""
+                    return self.send_json(reply)
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self.send_json(
+                        {"error": {"message": "not found"}}, status=404
+                    )
+
+                status = server._draw()
+                if status == "429":
+                    return self.send_json(
+                        {"error": {"message": "rate limited", "type": "rate_limit"}},
+                        status=429,
+                        headers={"Retry-After": f"{profile.retry_after:g}"},
+                    )
+                if status == "500":
+                    return self.send_json(
+                        {"error": {"message": "overloaded"}}, status=500
+                    )
+
+                completion, prompt = server._answer(body)
+                with server._slots:
+                    time.sleep(prompt / profile.prefill)
+                    if body.get("stream"):
+                        self.stream(body, completion, prompt)
+                    else:
+                        time.sleep(_tokens(completion) / profile.decode)
+                        self.send_json(_completion(body, completion, prompt))
+
+            def stream(self, body: dict, content: str, prompt: int) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(event: dict | str) -> None:
+                    data = f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                def chunk(
+                    delta: dict, finish: str | None = None, usage: dict | None = None
+                ) -> dict:
+                    return {
+                        "id": "fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [
+                            {"index": 0, "delta": delta, "finish_reason": finish}
+                        ],
+                        "usage": usage,
+                    }
+
+                # Four tokens per event
+                step = 4 * CHARS_PER_TOKEN
+                try:
+                    for idx in range(0, len(content), step):
+                        time.sleep(4 / profile.decode)
+                        send(chunk({"content": content[idx : idx + step]}))
+                    tokens = _tokens(content)
+                    usage = {
+                        "prompt_tokens": prompt,
+                        "completion_tokens": tokens,
+                        "total_tokens": prompt + tokens,
+                    }
+                    send(chunk({}, finish="stop", usage=usage))
+                    send("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client aborted the stream
+                    return
+
+        return Handler
+
+    def start(self) -> "FakeServer":
+        """Serve requests in a daemon thread.
+
+        Returns:
+            FakeServer: The server, for chaining.
+        """
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the `Profile` options to a command line parser."""
+    defaults = Profile()
+    parser.add_argument(
+        "--prefill", type=float, default=defaults.prefill, help="Prompt tokens/s"
+    )
+    parser.add_argument(
+        "--decode",
+        type=float,
+        default=defaults.decode,
+        help="Completion tokens/s per request",
+    )
+    parser.add_argument(
+        "--slots", type=int, default=defaults.slots, help="Requests generated at once"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=defaults.error_rate,
+        help="Fraction answered with 500",
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=defaults.rate_limit_rate,
+        help="Fraction answered with 429",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=defaults.retry_after,
+        help="Seconds sent with a 429",
+    )
+    parser.add_argument(
+        "--load-seconds",
+        type=float,
+        default=defaults.load_seconds,
+        help="Cold start of a model",
+    )
+    parser.add_argument(
+        "--corrupt-rate",
+        type=float,
+        default=defaults.corrupt_rate,
+        help="Fraction of altered code",
+    )
+    parser.add_argument(
+        "--batch-delay",
+        type=float,
+        default=defaults.batch_delay,
+        help="Seconds a batch is queued",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def profile_from(args: argparse.Namespace) -> Profile:
+    """Build a `Profile` from parsed `add_profile_arguments` options."""
+    return Profile(
+        prefill=args.prefill,
+        decode=args.decode,
+        slots=args.slots,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        load_seconds=args.load_seconds,
+        corrupt_rate=args.corrupt_rate,
+        batch_delay=args.batch_delay,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeServer(profile_from(args), host=args.host, port=args.port)
+    print(f"Serving a fake model at {server.url} (Ctrl+C to stop)")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
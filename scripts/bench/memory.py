@@ -0,0 +1,148 @@
+"""Measure the peak memory of building the package context against package size.
+
+For each package size, a synthetic package is written to a temporary directory
+and its system message is built by a fresh interpreter under `tracemalloc`,
+once from scratch and once more after one file changed (as `watch` does). The
+peak of traced memory should stay a small, constant multiple of the package
+size; the script exits with a non-zero status if the peak of the largest
+package exceeds `--max-ratio` times its size.
+
+    uv run scripts/bench/memory.py --files 100 --steps 4 --max-ratio 2
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from strip import synthetic_module
+
+MB = 1e6
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process, None where `resource` is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def make_package(root: Path, files: int) -> Path:
+    """Write a synthetic documented package of `files` modules."""
+    package = root / "synthetic"
+    (package / "sub").mkdir(parents=True)
+    for idx in range(files):
+        target = package / "sub" if idx % 2 else package
+        (target / f"mod{idx}.py").write_text(synthetic_module(idx), encoding="utf-8")
+    return package
+
+
+def child(config: dict) -> None:
+    """Build the system message in this interpreter and write the measurements to `config["output"]`."""
+    import tracemalloc
+
+    from pdoc_ai.ingester import ContextCache, generate_system
+
+    package = Path(config["package"])
+    cache = ContextCache(directory=None)
+
+    tracemalloc.start()
+    system = generate_system(package, cache=cache)
+    _, cold = tracemalloc.get_traced_memory()
+    size = len(system.encode("utf-8"))
+
+    # Rebuild after an edit, releasing the previous message first as `Documenter.refresh` does
+    del system
+    tracemalloc.reset_peak()
+    changed = package / "mod0.py"
+    changed.write_text(
+        changed.read_text(encoding="utf-8") + "\nEDITED = True\n", encoding="utf-8"
+    )
+    system = generate_system(package, cache=cache)
+    _, rebuild = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rebuilt = len(system.encode("utf-8"))
+
+    result = {
+        "context": size,
+        "rebuilt_context": rebuilt,
+        "cold": cold,
+        "rebuild": rebuild,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    Path(config["output"]).write_text(json.dumps(result), encoding="utf-8")
+
+
+def run(files: int) -> dict:
+    """Measure one package size in a fresh interpreter."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        package = make_package(root, files)
+        source = sum(path.stat().st_size for path in package.rglob("*.py"))
+        config = {"package": str(package), "output": str(root / "result.json")}
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", json.dumps(config)],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"Measuring {files} files failed:\n{proc.stdout}\n{proc.stderr}"
+            )
+        return {
+            "files": files,
+            "source": source,
+            **json.loads((root / "result.json").read_text()),
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--files", type=int, default=100, help="Files in the smallest package"
+    )
+    parser.add_argument("--steps", type=int, default=4, help="Number of doublings")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=2.0,
+        help="Largest peak / package size allowed",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(json.loads(args.child))
+        return 0
+
+    print(
+        f"{'files':>8} {'source MB':>10} {'context MB':>11} {'peak MB':>8} {'x source':>9}"
+        f" {'rebuild MB':>11} {'x source':>9} {'RSS MB':>7}"
+    )
+    for step in range(args.steps):
+        r = run(args.files * 2**step)
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(
+            f"{r['files']:>8} {r['source'] / MB:>10.2f} {r['context'] / MB:>11.2f} {r['cold'] / MB:>8.2f}"
+            f" {r['cold'] / r['source']:>9.2f} {r['rebuild'] / MB:>11.2f} {r['rebuild'] / r['source']:>9.2f}"
+            f" {rss:>7}",
+            flush=True,
+        )
+
+    ratio = max(r["cold"], r["rebuild"]) / r["source"]
+    if ratio > args.max_ratio:
+        print(
+            f"Peak memory is {ratio:.2f}x the package size, more than {args.max_ratio}x."
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
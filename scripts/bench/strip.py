@@ -0,0 +1,95 @@
+"""Benchmark docstring stripping on synthetic packages of increasing size.
+
+Stripping should scale linearly with the size of the package: the time per MB
+must stay roughly constant as the corpus grows. The script exits with a non-zero
+status if the largest corpus is more than `--tolerance` times slower per MB than
+the smallest one.
+
+    uv run scripts/bench/strip.py --files 250 --steps 4
+"""
+
+import argparse
+import sys
+from time import perf_counter
+
+from pdoc_ai.ingester import strip_docstrings
+
+
+def synthetic_module(idx: int, functions: int = 20) -> str:
+    """Generate a module with documented classes and functions."""
+    parts = [f'"""Module {idx}."""\n\nimport os\n\n']
+    for fn in range(functions):
+        parts.append(
+            f'''
+class Model{fn}:
+    """Model {fn} of module {idx}.
+
+    Attributes:
+        value (int): Some value.
+    """
+
+    value: int = {fn}
+
+    def method(self, x: int) -> int:
+        """Add the value to `x`.
+
+        Args:
+            x (int): Input.
+
+        Returns:
+            int: The sum.
+        """
+        text = """not a docstring"""
+        return x + self.value + len(text)
+
+
+def function_{fn}(a, b):
+    """Function {fn}."""
+    return a * b
+'''
+        )
+    return "".join(parts)
+
+
+def synthetic_package(files: int) -> list[str]:
+    """Generate the sources of a package of `files` modules."""
+    return [synthetic_module(idx) for idx in range(files)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--files", type=int, default=250, help="Files in the smallest corpus"
+    )
+    parser.add_argument("--steps", type=int, default=4, help="Number of doublings")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N timings")
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    args = parser.parse_args()
+
+    per_mb: list[float] = []
+    print(f"{'files':>8} {'MB':>8} {'seconds':>10} {'s/MB':>8}")
+    for step in range(args.steps):
+        files = args.files * 2**step
+        sources = synthetic_package(files)
+        size_mb = sum(len(source.encode("utf-8")) for source in sources) / 1e6
+
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = perf_counter()
+            for source in sources:
+                strip_docstrings(source)
+            best = min(best, perf_counter() - start)
+
+        per_mb.append(best / size_mb)
+        print(f"{files:>8} {size_mb:>8.2f} {best:>10.3f} {per_mb[-1]:>8.3f}")
+
+    growth = per_mb[-1] / per_mb[0]
+    print(f"Time per MB grew {growth:.2f}x from the smallest to the largest corpus.")
+    if growth > args.tolerance:
+        print(f"Not linear: growth exceeds {args.tolerance}x.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""Benchmark `document` and `update_readme` against the fake model server.
+
+For each package size, a synthetic package is generated in a temporary
+directory and documented by a fresh interpreter, followed by a README update.
+Files/min, latency percentiles and the peak RSS of that interpreter are
+reported and appended to `--results` together with the version and git commit,
+so runs can be compared across versions. The latest earlier run with the same
+settings is shown for comparison.
+
+    uv run scripts/bench/throughput.py --sizes 10 40 160 --workers 4 --decode 80
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fake_server import FakeServer, add_profile_arguments, profile_from
+from strip import synthetic_module
+
+RESULTS = Path(__file__).parent / "results" / "throughput.jsonl"
+
+README_TEMPLATE = (
+    "# {title}\n\n{description}\n\n## Features\n\n{features}\n\n## Usage\n\n{usage}\n"
+)
+
+
+def make_package(root: Path, files: int, functions: int, large: int = 0) -> Path:
+    """Write a synthetic undocumented package of `files` modules, half of them in a subpackage.
+
+    With `large`, one of the modules is `large` times the size of the others and
+    comes last in file order, the worst case for a run that starts files in order.
+    """
+    from pdoc_ai.ingester import strip_docstrings
+
+    package = root / "synthetic"
+    (package / "sub").mkdir(parents=True)
+    for idx in range(files):
+        target = package / "sub" if idx % 2 else package
+        name = f"mod{idx}.py"
+        size = functions
+        if large and idx == files - 1:
+            target, name, size = package / "sub", "zz_large.py", functions * large
+        source = strip_docstrings(synthetic_module(idx, size))
+        (target / name).write_text(source, encoding="utf-8")
+    (root / "README.md").write_text(README_TEMPLATE, encoding="utf-8")
+    return package
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process, None where `resource` is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def child(config: dict) -> None:
+    """Run one benchmark in this interpreter and write its result to `config["output"]`."""
+    from pdoc_ai.main import document
+    from pdoc_ai.readme import update_readme
+
+    package = Path(config["package"])
+    reports = Path(config["output"]).parent
+    common = dict(
+        include_patterns=[],
+        exclude_patterns=[],
+        llm_baseurl=config["url"],
+        llm_model="fake",
+        cache=False,
+    )
+    summary = document(
+        package,
+        workers=config["workers"],
+        mode=config["mode"],
+        stream=config["stream"],
+        order=config["order"],
+        report=reports / "document.json",
+        **common,
+    )
+    update_readme(
+        package, package.parent / "README.md", report=reports / "readme.json", **common
+    )
+
+    result = {
+        "document": json.loads((reports / "document.json").read_text())["aggregate"],
+        "readme": json.loads((reports / "readme.json").read_text())["aggregate"],
+        "failed_files": len(summary.failed),
+        "retried_files": len(summary.retried),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    Path(config["output"]).write_text(json.dumps(result), encoding="utf-8")
+
+
+def run(size: int, url: str, args: argparse.Namespace) -> dict:
+    """Benchmark one package size in a fresh interpreter."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        package = make_package(root, size, args.functions, args.large)
+        config = {
+            "package": str(package),
+            "output": str(root / "result.json"),
+            "url": url,
+            "workers": args.workers,
+            "mode": args.mode,
+            "stream": args.stream,
+            "order": args.order,
+        }
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", json.dumps(config)],
+            capture_output=not args.verbose,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"Benchmark of {size} files failed:\n{proc.stdout}\n{proc.stderr}"
+            )
+        return {"files": size, **json.loads((root / "result.json").read_text())}
+
+
+def git_commit() -> str | None:
+    """Short hash of the checked out commit, None outside a git work tree."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def version() -> str | None:
+    """Installed version of pdoc_ai."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("pdoc_ai")
+    except PackageNotFoundError:
+        return None
+
+
+def previous(results: Path, settings: dict) -> dict | None:
+    """Latest stored run with the same settings."""
+    if not results.is_file():
+        return None
+    match = None
+    for line in results.read_text(encoding="utf-8").splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("settings") == settings:
+            match = entry
+    return match
+
+
+def table(runs: list[dict], baseline: dict | None) -> str:
+    """Format the runs, with the change in files/min against `baseline`."""
+    before = (
+        {r["files"]: r["document"]["files_per_min"] for r in baseline["runs"]}
+        if baseline
+        else {}
+    )
+    lines = [
+        f"{'files':>6} {'requests':>8} {'failed':>6} {'retried':>7} {'files/min':>10} {'vs prev':>8}"
+        f" {'p50 s':>7} {'p95 s':>7} {'ttft s':>7} {'readme s':>8} {'RSS MB':>7}"
+    ]
+    for r in runs:
+        doc = r["document"]
+        change = ""
+        if before.get(r["files"]):
+            change = f"{(doc['files_per_min'] / before[r['files']] - 1) * 100:+.0f}%"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        lines.append(
+            f"{r['files']:>6} {doc['requests']:>8} {r['failed_files']:>6} {r.get('retried_files', 0):>7}"
+            f" {doc['files_per_min'] or 0:>10.1f}"
+            f" {change:>8} {doc['latency_p50']:>7.2f} {doc['latency_p95']:>7.2f} {doc['ttft_p50']:>7.2f}"
+            f" {r['readme']['latency_max']:>8.2f} {rss:>7}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 40, 160], help="Files per package"
+    )
+    parser.add_argument(
+        "--functions", type=int, default=5, help="Classes and functions per module"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["rewrite", "docstrings"], default="rewrite")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument(
+        "--order", choices=["largest", "dependencies"], default="largest"
+    )
+    parser.add_argument(
+        "--large", type=int, default=0, help="Make the last module N times larger"
+    )
+    parser.add_argument(
+        "--results", type=Path, default=RESULTS, help="JSON lines history of runs"
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Do not append to --results"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the output of the runs"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        child(json.loads(args.child))
+        return 0
+
+    profile = profile_from(args)
+    settings = {
+        "functions": args.functions,
+        "workers": args.workers,
+        "mode": args.mode,
+        "stream": args.stream,
+        "order": args.order,
+        "large": args.large,
+        "profile": vars(profile),
+    }
+    with FakeServer(profile) as server:
+        runs = []
+        for size in args.sizes:
+            print(f"Documenting {size} files...", flush=True)
+            runs.append(run(size, server.url, args))
+        responses = dict(server.counts)
+
+    baseline = previous(args.results, settings)
+    print(table(runs, baseline))
+    print(f"Server responses: {responses}")
+    if baseline is not None:
+        print(
+            f"Compared with {baseline['commit'] or baseline['version']} from {baseline['date']}."
+        )
+
+    if not args.no_save:
+        entry = {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "version": version(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "settings": settings,
+            "runs": runs,
+            "responses": responses,
+        }
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Appended the results to {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
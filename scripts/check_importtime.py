@@ -0,0 +1,71 @@
+"""Check that the CLI starts without importing the heavy dependencies.
+
+Runs `python -X importtime -c "import pdoc_ai.cli_app"` in a fresh interpreter
+and fails if any module in `HEAVY` was imported, or if importing the CLI took
+longer than `--budget` milliseconds (best of `--repeat` runs).
+
+    uv run scripts/check_importtime.py --budget 300
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULE = "pdoc_ai.cli_app"
+
+HEAVY = ["openai", "instructor", "ollama", "pydantic", "tiktoken", "httpx"]
+"""Top-level packages that only commands actually talking to a model may import."""
+
+
+def importtime(module: str) -> tuple[dict[str, int], int]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        tuple[dict[str, int], int]: Cumulative microseconds of every imported
+            module, and of `module` itself.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            modules[name.strip()] = int(cumulative)
+        except ValueError:  # header line
+            continue
+    return modules, modules[module]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=300, help="Milliseconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N imports")
+    args = parser.parse_args()
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        modules, total = importtime(MODULE)
+        best = min(best, total / 1000)
+
+    heavy = sorted(name for name in modules if name in HEAVY)
+    print(f"import {MODULE}: {best:.0f} ms (budget {args.budget:.0f} ms)")
+
+    failed = False
+    if heavy:
+        print(f"Heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if best > args.budget:
+        print(f"Startup exceeds the budget by {best - args.budget:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,4 +2,14 @@
 .. include:: ../../README.md
 """
 
-from .main import document as document
+__all__ = ["document"]
+
+
+def __getattr__(name: str):
+    # `document` pulls in openai and instructor; import it on first
+    # use so that `pdoc_ai.cli_app` (and `document --help`) start quickly.
+    if name == "document":
+        from .main import document
+
+        return document
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
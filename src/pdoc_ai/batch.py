@@ -0,0 +1,194 @@
+"""
+Requests sent through the OpenAI-compatible Batch API, and the state that lets a batch run resume.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import Any
+
+BATCH_STATE_NAME: str = ".pdoc_ai_batch.json"
+"""File name of the batch state, stored in the package root."""
+
+BATCH_ENDPOINT: str = "/v1/chat/completions"
+"""Endpoint every line of a batch is sent to."""
+
+TERMINAL: tuple[str, ...] = ("completed", "failed", "expired", "cancelled")
+"""Batch statuses after which no more results arrive."""
+
+JSON_INSTRUCTIONS: str = """
+As a genius expert, your task is to understand the content and provide
+the parsed objects in json that match the following json_schema:
+
+{}
+
+Make sure to return an instance of the JSON, not the schema itself
+"""
+"""Appended to the system message of a structured request, as instructor's JSON mode does."""
+
+
+class BatchError(RuntimeError):
+    """Raised for a request that a batch returned no usable result for."""
+
+
+def batch_line(custom_id: str, body: dict[str, Any]) -> str:
+    """Serialise one request of a batch input file.
+
+    Args:
+        custom_id (str): Identifies the request in the results.
+        body (dict[str, Any]): Parameters of the chat completion.
+
+    Returns:
+        str: One JSON line.
+    """
+    return json.dumps(
+        {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+    )
+
+
+def json_mode(body: dict[str, Any], schema: dict[str, Any]) -> dict[str, Any]:
+    """Ask for a JSON object matching `schema` in a plain chat completion.
+
+    Batches cannot go through instructor, so the request is built the way its
+    JSON mode builds it: the schema goes into the system message and the
+    response format is set to a JSON object.
+
+    Args:
+        body (dict[str, Any]): Parameters of the chat completion.
+        schema (dict[str, Any]): JSON schema of the response model.
+
+    Returns:
+        dict[str, Any]: A copy of `body` with the instructions added.
+    """
+    instructions = JSON_INSTRUCTIONS.format(json.dumps(schema, indent=2))
+    messages = [dict(message) for message in body["messages"]]
+    if messages and messages[0]["role"] == "system":
+        messages[0]["content"] = f"{messages[0]['content']}\n\n{instructions}"
+    else:
+        messages.insert(0, {"role": "system", "content": instructions})
+    return {**body, "messages": messages, "response_format": {"type": "json_object"}}
+
+
+def extract_json(text: str) -> str:
+    """Get the JSON object out of a response that may wrap it in a code fence.
+
+    Args:
+        text (str): Response content.
+
+    Returns:
+        str: The JSON text.
+    """
+    fenced = re.search(r"```(?:json)?\s*\n(.*?)\n\s*```", text, re.S)
+    return fenced.group(1) if fenced is not None else text.strip()
+
+
+def parse_results(text: str) -> dict[str, dict[str, Any] | BatchError]:
+    """Read a batch output or error file.
+
+    Args:
+        text (str): Contents of the file, one JSON result per line.
+
+    Returns:
+        dict[str, dict[str, Any] | BatchError]: The chat completion of every successful request, and the
+            error of every failed one, keyed by `custom_id`.
+    """
+    results: dict[str, dict[str, Any] | BatchError] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get("response") or {}
+        body = response.get("body") or {}
+        if entry.get("error") or response.get("status_code", 200) >= 400:
+            error = entry.get("error") or body.get("error") or {}
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            results[entry["custom_id"]] = BatchError(
+                f"Batch request failed ({response.get('status_code', 'no status')}): {message}"
+            )
+        else:
+            results[entry["custom_id"]] = body
+    return results
+
+
+@dataclass
+class BatchState:
+    """Batches submitted for a run that has not collected their results yet.
+
+    Saved in the package root as soon as a batch is submitted, so a run that is
+    interrupted while waiting picks the same batches up again.
+
+    Attributes:
+        path (Path): Location of the state file.
+        batches (dict[str, str]): Base URL of the server each batch was submitted to, keyed by batch id.
+        files (dict[str, str]): Source hash of every file in the batches, keyed by package-relative path.
+        attempt (int): Verification round the batches belong to, 0 for the first requests.
+        submitted (float): Unix time of the submission.
+    """
+
+    path: Path
+    batches: dict[str, str] = field(default_factory=dict)
+    files: dict[str, str] = field(default_factory=dict)
+    attempt: int = 0
+    submitted: float = 0.0
+
+    @classmethod
+    def load(cls, package: str | Path) -> "BatchState":
+        """Load the batch state of a package, or start an empty one.
+
+        Args:
+            package (str | Path): The package root.
+
+        Returns:
+            BatchState: The saved state, empty if there is none or it cannot be read.
+        """
+        path = Path(package) / BATCH_STATE_NAME
+        if not path.is_file():
+            return cls(path=path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(
+                path=path,
+                batches=data["batches"],
+                files=data["files"],
+                attempt=data.get("attempt", 0),
+                submitted=data.get("submitted", 0.0),
+            )
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring unreadable batch state {path}\n{e}")
+            return cls(path=path)
+
+    def record(
+        self, batches: dict[str, str], files: dict[str, str], attempt: int
+    ) -> None:
+        """Save newly submitted batches.
+
+        Args:
+            batches (dict[str, str]): Base URL of the server of each batch, keyed by batch id.
+            files (dict[str, str]): Source hash of every file in the batches.
+            attempt (int): Verification round of the batches.
+        """
+        self.batches, self.files, self.attempt = dict(batches), dict(files), attempt
+        self.submitted = time()
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": 1,
+                    "batches": self.batches,
+                    "files": self.files,
+                    "attempt": self.attempt,
+                    "submitted": self.submitted,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        """Forget the batches once their results are written."""
+        self.batches, self.files, self.attempt, self.submitted = {}, {}, 0, 0.0
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,166 @@
+"""
+Content-addressed on-disk cache for LLM responses.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from .paths import dir_cache
+
+
+class ResponseCache:
+    """Persistent cache of LLM responses keyed by a hash of the request.
+
+    Entries are stored as one JSON file per key. Reading an entry refreshes its
+    modification time, and the least recently used entries are evicted once the
+    directory grows past `max_bytes`.
+
+    Attributes:
+        directory (Path): Directory holding the cache entries.
+        max_bytes (int): Size cap of the cache directory.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups not found in the cache.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = dir_cache / "responses",
+        max_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str | Path, optional): Directory holding the cache entries. Defaults to `<user cache>/pdoc_ai/responses`.
+            max_bytes (int, optional): Size cap of the cache directory. Defaults to 512 MiB.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__size: int | None = None
+
+    @staticmethod
+    def key(inputs: dict[str, Any], response_model: type | None = None) -> str:
+        """Compute the cache key of a request.
+
+        Args:
+            inputs (dict[str, Any]): Request parameters (model, messages, temperature, ...). `stream` and `stream_options` are ignored.
+            response_model (type | None, optional): Pydantic model of a structured request. Defaults to None.
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+        payload = {
+            k: v
+            for k, v in inputs.items()
+            if k not in ("stream", "stream_options", "response_model")
+        }
+        if response_model is not None:
+            payload["response_model"] = response_model.model_json_schema()
+        blob = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Any | None:
+        """Look up a cached response.
+
+        Args:
+            key (str): Cache key from `ResponseCache.key`.
+
+        Returns:
+            Any | None: The cached value, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)["value"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a response and evict old entries if the cache is over its size cap.
+
+        Args:
+            key (str): Cache key from `ResponseCache.key`.
+            value (Any): JSON-serialisable response.
+        """
+        path = self._path(key)
+        size = self.size
+        try:
+            # Overwritten, e.g. by a `refresh` request
+            size -= path.stat().st_size
+        except OSError:
+            pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"value": value}, f)
+        os.replace(tmp, path)
+
+        self.__size = size + path.stat().st_size
+        if self.__size > self.max_bytes:
+            self.evict()
+
+    @property
+    def size(self) -> int:
+        """int: Total size of the cache entries in bytes."""
+        if self.__size is None:
+            self.__size = sum(p.stat().st_size for p in self.directory.glob("*/*.json"))
+        return self.__size
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+        self.__size = size
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        for path in self.directory.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+        self.__size = 0
+
+    def __str__(self) -> str:
+        return f"ResponseCache(directory={self.directory}, hits={self.hits}, misses={self.misses})"
+
+
+def open_cache(
+    enabled: bool = True, directory: str | Path | None = None, max_mb: int = 512
+) -> ResponseCache | None:
+    """Create the response cache for a run.
+
+    Args:
+        enabled (bool, optional): Whether caching is enabled. Defaults to True.
+        directory (str | Path | None, optional): Cache directory, or None for the default. Defaults to None.
+        max_mb (int, optional): Size cap in MiB. Defaults to 512.
+
+    Returns:
+        ResponseCache | None: The cache, or None if caching is disabled.
+    """
+    if not enabled:
+        return None
+    if directory is None:
+        return ResponseCache(max_bytes=max_mb * 1024 * 1024)
+    return ResponseCache(directory=directory, max_bytes=max_mb * 1024 * 1024)
@@ -0,0 +1,114 @@
+"""
+Split python files that are too large for a model into chunks at top-level definitions.
+"""
+
+import ast
+
+from .splice import _first_line
+from .tokens import count_tokens
+
+MODEL_CONTEXT: dict[str, int] = {
+    "code_assist_large": 32_768,
+    "code_assist_small": 32_768,
+    "general_large": 32_768,
+    "general_small": 32_768,
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4.1": 1_000_000,
+    "llama3.1": 128_000,
+    "qwen2.5-coder": 32_768,
+}
+"""Context window (tokens) of known models, matched by exact name or name prefix."""
+
+MIN_CHUNK_TOKENS: int = 512
+"""Smallest chunk budget worth splitting a file for; below it the prompt nearly fills the context."""
+
+
+def context_size(model: str, overrides: dict[str, int] = {}) -> int | None:
+    """Get the context window of a model.
+
+    Args:
+        model (str): Name of the model.
+        overrides (dict[str, int], optional): Context sizes that take precedence over `MODEL_CONTEXT`. Defaults to {}.
+
+    Returns:
+        int | None: Context window in tokens, None if the model is unknown.
+    """
+    known = {**MODEL_CONTEXT, **overrides}
+    if model in known:
+        return known[model]
+    # e.g. `qwen2.5-coder:32b` matches `qwen2.5-coder`
+    prefixes = [name for name in known if model.startswith(name)]
+    if prefixes:
+        return known[max(prefixes, key=len)]
+    return None
+
+
+def chunk_budget(context: int | None, prompt_tokens: int) -> int | None:
+    """Get the largest chunk of code that can be rewritten in one request.
+
+    The chunk is sent in the prompt and reprinted in the response, so it may use
+    half of the context that is left after the rest of the prompt.
+
+    Args:
+        context (int | None): Context window of the model in tokens, None if unknown.
+        prompt_tokens (int): Tokens of the prompt excluding the chunk (system message, instructions).
+
+    Returns:
+        int | None: Maximum tokens per chunk. None if the context is unknown or the prompt leaves less
+            than `MIN_CHUNK_TOKENS`: every chunk would resend the prompt, so the file is better sent whole.
+    """
+    if context is None:
+        return None
+    budget = (context - prompt_tokens) // 2
+    return budget if budget >= MIN_CHUNK_TOKENS else None
+
+
+def split_source(source: str, max_tokens: int) -> list[str]:
+    """Split python source into chunks of at most `max_tokens` tokens.
+
+    Chunks are cut only before top-level classes and functions (including their
+    decorators and the comments directly above them), so `"".join(chunks)` is
+    always equal to `source`. A single definition larger than `max_tokens` is
+    kept whole in its own chunk.
+
+    Args:
+        source (str): Python source code.
+        max_tokens (int): Token budget of a chunk.
+
+    Returns:
+        list[str]: The chunks in source order. `[source]` if it fits or cannot be parsed.
+    """
+    if count_tokens(source) <= max_tokens:
+        return [source]
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return [source]
+
+    lines = source.splitlines(keepends=True)
+    cuts: list[int] = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = _first_line(node) - 1
+        while start > 0 and lines[start - 1].lstrip().startswith("#"):
+            start -= 1
+        if start > 0:
+            cuts.append(start)
+    if not cuts:
+        return [source]
+
+    bounds = [0, *cuts, len(lines)]
+    segments = ["".join(lines[a:b]) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+    chunks: list[list[str]] = []
+    used = 0
+    for segment in segments:
+        tokens = count_tokens(segment)
+        if not chunks or used + tokens > max_tokens:
+            chunks.append([])
+            used = 0
+        chunks[-1].append(segment)
+        used += tokens
+    return ["".join(chunk) for chunk in chunks]
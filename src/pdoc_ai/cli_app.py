@@ -1,12 +1,25 @@
 import typer
 from rich.console import Console
-from .main import document
 from pathlib import Path
 
+# Commands import `main`, `planner` and `endpoints` (and through them openai
+# and instructor) when they run, so `--help` and `clean` stay fast.
+# `scripts/check_importtime.py` guards this.
+
 app = typer.Typer()
 console = Console()
 
 
+def _keep_alive(value: str) -> float | str | None:
+    """Parse `--keep-alive`: seconds (`-1` for ever), a duration such as `30m`, or "" for the server default."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
 @app.command()
 def package(
     path: str,
@@ -14,24 +27,204 @@ def package(
     llm_key: str = "ollama",
     llm_model: str = "code_assist_large",
     exclude_pattern: str = "",
+    workers: int = 1,
+    mode: str = "rewrite",
+    context_mode: str = "package",
+    context_tokens: int = 8000,
+    context_size: int = 0,
+    cache: bool = True,
+    stream: bool = False,
+    incremental: bool = False,
+    since: str = "",
+    report: str = "",
+    dry_run: bool = False,
+    rate: float = 0.0,
+    retries: int = 5,
+    rpm: float = 0.0,
+    tpm: float = 0.0,
+    small_model: str = "",
+    small_file_tokens: int = 1000,
+    warm_up: bool = True,
+    keep_alive: str = "",
+    unload: bool = False,
+    verify: bool = True,
+    verify_retries: int = 2,
+    order: str = "largest",
+    batch: bool = False,
+    poll_seconds: float = 30.0,
 ) -> str:
     """Generate documentation (docstrings) for provided project directory
 
     Args:
         path (str): The path to the file or directory to parse.
-        llm_baseurl (str, optional): The base URL for the LLM service. Defaults to "http://100.99.54.84:11434/v1".
+        llm_baseurl (str, optional): The base URL for the LLM service, comma-separated to spread requests over several servers. Defaults to "http://100.99.54.84:11434/v1".
         llm_key (str, optional): The key for the LLM service. Defaults to "ollama".
         llm_model (str, optional): The model to use for encoding. Defaults to "code_assist_large".
         exclude_pattern (str, optional): A pattern to exclude files from processing. Defaults to an empty string.
+        workers (int, optional): Number of files to document concurrently on each server. Defaults to 1.
+        mode (str, optional): `rewrite` to regenerate whole files, `docstrings` to only add missing docstrings. Defaults to "rewrite".
+        context_mode (str, optional): `package` for the whole package as context, `pruned` for the file and its imports. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        context_size (int, optional): Context window of `llm_model` in tokens, 0 to use the built-in table. Defaults to 0.
+        cache (bool, optional): Reuse cached responses for unchanged requests, `--no-cache` to bypass. Defaults to True.
+        stream (bool, optional): Stream responses straight to disk and report time to first token. Defaults to False.
+        incremental (bool, optional): Only document files that changed since they were last documented. Defaults to False.
+        since (str, optional): Only document files changed in this git revision or range, e.g. `HEAD~1`. Defaults to "".
+        report (str, optional): Write token usage and latency of every request to this JSON file. Defaults to "".
+        dry_run (bool, optional): Only print the projected tokens and time of the run, see `plan`. Defaults to False.
+        rate (float, optional): Completion tokens/sec per request for `--dry-run`, 0 to use the default. Defaults to 0.0.
+        retries (int, optional): Retries of a request that failed with a rate limit, connection or server error. Defaults to 5.
+        rpm (float, optional): Client-side limit of requests per minute, 0 for no limit. Defaults to 0.0.
+        tpm (float, optional): Client-side limit of tokens per minute, 0 for no limit. Defaults to 0.0.
+        small_model (str, optional): Faster model for files of at most `small_file_tokens` tokens, e.g. `general_small`. Defaults to "".
+        small_file_tokens (int, optional): Largest file (tokens) sent to `small_model`. Defaults to 1000.
+        warm_up (bool, optional): Load the models on the Ollama servers before the first request. Defaults to True.
+        keep_alive (str, optional): How long Ollama keeps the models loaded, e.g. `30m` or `-1` for ever, "" for the server default. Defaults to "".
+        unload (bool, optional): Unload the models when the run is done. Defaults to False.
+        verify (bool, optional): Check that each output parses and only changed docstrings, and request failing files again. Defaults to True.
+        verify_retries (int, optional): Requests made again for a file that fails verification. Defaults to 2.
+        order (str, optional): `largest` to start the longest files first, `dependencies` to document imported modules before the files importing them. Defaults to "largest".
+        batch (bool, optional): Submit all requests through the server's Batch API and wait for the results; run again to resume an interrupted batch. Defaults to False.
+        poll_seconds (float, optional): Seconds between status checks of a batch. Defaults to 30.0.
     """
-    document(
+    if dry_run:
+        from .endpoints import parse_endpoints
+        from .planner import plan as plan_run
+
+        print(
+            plan_run(
+                package=Path(path),
+                exclude_patterns=[exclude_pattern],
+                llm_model=llm_model,
+                workers=workers * len(parse_endpoints(llm_baseurl)),
+                mode=mode,
+                context_mode=context_mode,
+                context_tokens=context_tokens,
+                context_sizes={llm_model: context_size} if context_size else {},
+                incremental=incremental,
+                since=since or None,
+                rate=rate or None,
+            )
+        )
+        return
+
+    from .main import document
+
+    summary = document(
         package=Path(path),
         pyfile=None,
         exclude_patterns=[exclude_pattern],
         llm_baseurl=llm_baseurl,
         llm_key=llm_key,
         llm_model=llm_model,
+        workers=workers,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes={llm_model: context_size} if context_size else {},
+        cache=cache,
+        stream=stream,
+        incremental=incremental,
+        since=since or None,
+        report=Path(report) if report else None,
+        retries=retries,
+        requests_per_minute=rpm or None,
+        tokens_per_minute=tpm or None,
+        routes={small_model: small_file_tokens} if small_model else {},
+        warm_up=warm_up,
+        keep_alive=_keep_alive(keep_alive),
+        unload=unload,
+        verify=verify,
+        verify_retries=verify_retries,
+        order=order,
+        batch=batch,
+        poll_seconds=poll_seconds,
     )
+    if not summary.ok:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def packages(
+    paths: list[str],
+    processes: int = 0,
+    llm_baseurl: str = "http://100.99.54.84:11434/v1",
+    llm_key: str = "ollama",
+    llm_model: str = "code_assist_large",
+    exclude_pattern: str = "",
+    workers: int = 1,
+    mode: str = "rewrite",
+    context_mode: str = "package",
+    context_tokens: int = 8000,
+    context_size: int = 0,
+    cache: bool = True,
+    incremental: bool = False,
+    retries: int = 5,
+    rpm: float = 0.0,
+    tpm: float = 0.0,
+    small_model: str = "",
+    small_file_tokens: int = 1000,
+    warm_up: bool = True,
+    keep_alive: str = "",
+    verify: bool = True,
+    verify_retries: int = 2,
+    order: str = "largest",
+):
+    """Document several packages at once, sharded across a pool of processes.
+
+    Args:
+        paths (list[str]): Package directories or glob patterns of them, e.g. `"libs/*"`.
+        processes (int, optional): Packages documented at once, each in its own process, 0 for the number of CPUs. Defaults to 0.
+        llm_baseurl (str, optional): The base URL for the LLM service, comma-separated to spread requests over several servers. Defaults to "http://100.99.54.84:11434/v1".
+        llm_key (str, optional): The key for the LLM service. Defaults to "ollama".
+        llm_model (str, optional): The model to use. Defaults to "code_assist_large".
+        exclude_pattern (str, optional): A pattern to exclude files from processing. Defaults to an empty string.
+        workers (int, optional): Number of files each process documents concurrently on each server. Defaults to 1.
+        mode (str, optional): `rewrite` or `docstrings`, see `package`. Defaults to "rewrite".
+        context_mode (str, optional): `package` or `pruned`, see `package`. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        context_size (int, optional): Context window of `llm_model` in tokens, 0 to use the built-in table. Defaults to 0.
+        cache (bool, optional): Reuse cached responses for unchanged requests, `--no-cache` to bypass. Defaults to True.
+        incremental (bool, optional): Only document files that changed since they were last documented. Defaults to False.
+        retries (int, optional): Retries of a request that failed with a rate limit, connection or server error. Defaults to 5.
+        rpm (float, optional): Client-side limit of requests per minute of each process, 0 for no limit. Defaults to 0.0.
+        tpm (float, optional): Client-side limit of tokens per minute of each process, 0 for no limit. Defaults to 0.0.
+        small_model (str, optional): Faster model for files of at most `small_file_tokens` tokens. Defaults to "".
+        small_file_tokens (int, optional): Largest file (tokens) sent to `small_model`. Defaults to 1000.
+        warm_up (bool, optional): Load the models on the Ollama servers before the first request. Defaults to True.
+        keep_alive (str, optional): How long Ollama keeps the models loaded, e.g. `30m` or `-1` for ever, "" for the server default. Defaults to "".
+        verify (bool, optional): Check that each output parses and only changed docstrings, and request failing files again. Defaults to True.
+        verify_retries (int, optional): Requests made again for a file that fails verification. Defaults to 2.
+        order (str, optional): `largest` or `dependencies`, see `package`. Defaults to "largest".
+    """
+    from .shard import document_packages
+
+    summary = document_packages(
+        paths,
+        processes=processes or None,
+        exclude_patterns=[exclude_pattern],
+        llm_baseurl=llm_baseurl,
+        llm_key=llm_key,
+        llm_model=llm_model,
+        workers=workers,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes={llm_model: context_size} if context_size else {},
+        cache=cache,
+        incremental=incremental,
+        retries=retries,
+        requests_per_minute=rpm or None,
+        tokens_per_minute=tpm or None,
+        routes={small_model: small_file_tokens} if small_model else {},
+        warm_up=warm_up,
+        keep_alive=_keep_alive(keep_alive),
+        verify=verify,
+        verify_retries=verify_retries,
+        order=order,
+    )
+    if not summary.ok:
+        raise typer.Exit(code=1)
 
 
 @app.command()
@@ -42,20 +235,45 @@ def file(
     llm_key: str = "ollama",
     llm_model: str = "code_assist_large",
     exclude_pattern: str = "",
+    mode: str = "rewrite",
+    context_mode: str = "package",
+    context_tokens: int = 8000,
+    context_size: int = 0,
+    cache: bool = True,
+    stream: bool = False,
+    report: str = "",
+    warm_up: bool = True,
+    keep_alive: str = "",
+    unload: bool = False,
+    verify: bool = True,
+    verify_retries: int = 2,
 ) -> str:
     """Generate documentation for a specific file in a package.
 
     Args:
         package (str): The path to the package.
         file (str): The path to the file.
-        llm_baseurl (str, optional): The base URL for the LLM. Defaults to "http://100.99.54.84:11434/v1".
+        llm_baseurl (str, optional): The base URL for the LLM, comma-separated to spread requests over several servers. Defaults to "http://100.99.54.84:11434/v1".
         llm_key (str, optional): The key for the LLM. Defaults to "ollama".
         llm_model (str, optional): The model to use for the LLM. Defaults to "code_assist_large".
         exclude_pattern (str, optional): Patterns to exclude from documentation generation. Defaults to "".
+        mode (str, optional): `rewrite` to regenerate whole files, `docstrings` to only add missing docstrings. Defaults to "rewrite".
+        context_mode (str, optional): `package` for the whole package as context, `pruned` for the file and its imports. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        context_size (int, optional): Context window of `llm_model` in tokens, 0 to use the built-in table. Defaults to 0.
+        cache (bool, optional): Reuse cached responses for unchanged requests, `--no-cache` to bypass. Defaults to True.
+        stream (bool, optional): Stream responses straight to disk and report time to first token. Defaults to False.
+        report (str, optional): Write token usage and latency of every request to this JSON file. Defaults to "".
+        warm_up (bool, optional): Load the model on the Ollama servers before the request. Defaults to True.
+        keep_alive (str, optional): How long Ollama keeps the model loaded, e.g. `30m` or `-1` for ever, "" for the server default. Defaults to "".
+        unload (bool, optional): Unload the model when done. Defaults to False.
+        verify (bool, optional): Check that the output parses and only changed docstrings, and request it again otherwise. Defaults to True.
+        verify_retries (int, optional): Requests made again if the output fails verification. Defaults to 2.
 
     Returns:
         str: The result of the documentation generation.
     """
+    from .main import document
 
     document(
         package=Path(package),
@@ -64,6 +282,133 @@ def file(
         llm_baseurl=llm_baseurl,
         llm_key=llm_key,
         llm_model=llm_model,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes={llm_model: context_size} if context_size else {},
+        cache=cache,
+        stream=stream,
+        report=Path(report) if report else None,
+        warm_up=warm_up,
+        keep_alive=_keep_alive(keep_alive),
+        unload=unload,
+        verify=verify,
+        verify_retries=verify_retries,
+    )
+
+
+@app.command()
+def watch(
+    path: str,
+    llm_baseurl: str = "http://100.99.54.84:11434/v1",
+    llm_key: str = "ollama",
+    llm_model: str = "code_assist_large",
+    exclude_pattern: str = "",
+    workers: int = 1,
+    mode: str = "rewrite",
+    context_mode: str = "package",
+    context_tokens: int = 8000,
+    context_size: int = 0,
+    cache: bool = True,
+    warm_up: bool = True,
+    keep_alive: str = "",
+    verify: bool = True,
+    verify_retries: int = 2,
+    interval: float = 1.0,
+    debounce: float = 0.5,
+):
+    """Keep running and document each file of a package as soon as it is saved.
+
+    Args:
+        path (str): The path to the package directory.
+        llm_baseurl (str, optional): The base URL for the LLM, comma-separated to spread requests over several servers. Defaults to "http://100.99.54.84:11434/v1".
+        llm_key (str, optional): The key for the LLM. Defaults to "ollama".
+        llm_model (str, optional): The model to use for the LLM. Defaults to "code_assist_large".
+        exclude_pattern (str, optional): A pattern to exclude files from processing. Defaults to an empty string.
+        workers (int, optional): Number of files to document concurrently on each server. Defaults to 1.
+        mode (str, optional): `rewrite` to regenerate whole files, `docstrings` to only add missing docstrings. Defaults to "rewrite".
+        context_mode (str, optional): `package` for the whole package as context, `pruned` for the file and its imports. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        context_size (int, optional): Context window of `llm_model` in tokens, 0 to use the built-in table. Defaults to 0.
+        cache (bool, optional): Reuse cached responses for unchanged requests, `--no-cache` to bypass. Defaults to True.
+        warm_up (bool, optional): Load the model on the Ollama servers when the watch starts. Defaults to True.
+        keep_alive (str, optional): How long Ollama keeps the model loaded between saves, e.g. `30m` or `-1` for ever, "" for the server default. Defaults to "".
+        verify (bool, optional): Check that each output parses and only changed docstrings, and request failing files again. Defaults to True.
+        verify_retries (int, optional): Requests made again for a file that fails verification. Defaults to 2.
+        interval (float, optional): Seconds between scans of the package for saved files. Defaults to 1.0.
+        debounce (float, optional): Seconds without further saves before the saved files are documented. Defaults to 0.5.
+    """
+    from .watch import watch as watch_package
+
+    watch_package(
+        package=Path(path),
+        exclude_patterns=[exclude_pattern],
+        llm_baseurl=llm_baseurl,
+        llm_key=llm_key,
+        llm_model=llm_model,
+        workers=workers,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes={llm_model: context_size} if context_size else {},
+        cache=cache,
+        warm_up=warm_up,
+        keep_alive=_keep_alive(keep_alive),
+        verify=verify,
+        verify_retries=verify_retries,
+        interval=interval,
+        debounce=debounce,
+    )
+
+
+@app.command()
+def plan(
+    path: str,
+    llm_model: str = "code_assist_large",
+    exclude_pattern: str = "",
+    workers: int = 1,
+    mode: str = "rewrite",
+    context_mode: str = "package",
+    context_tokens: int = 8000,
+    context_size: int = 0,
+    incremental: bool = False,
+    since: str = "",
+    rate: float = 0.0,
+    rate_from: str = "",
+):
+    """Estimate the tokens and wall time of documenting a project without calling the LLM.
+
+    Args:
+        path (str): The path to the package directory.
+        llm_model (str, optional): The model the run would use. Defaults to "code_assist_large".
+        exclude_pattern (str, optional): A pattern to exclude files from processing. Defaults to an empty string.
+        workers (int, optional): Number of files documented concurrently. Defaults to 1.
+        mode (str, optional): `rewrite` or `docstrings`, see `package`. Defaults to "rewrite".
+        context_mode (str, optional): `package` or `pruned`, see `package`. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        context_size (int, optional): Context window of `llm_model` in tokens, 0 to use the built-in table. Defaults to 0.
+        incremental (bool, optional): Only count files that changed since they were last documented. Defaults to False.
+        since (str, optional): Only count files changed in this git revision or range. Defaults to "".
+        rate (float, optional): Completion tokens/sec per request, 0 to use `rate_from` or the default. Defaults to 0.0.
+        rate_from (str, optional): Telemetry report (`--report`) of an earlier run to take the rate from. Defaults to "".
+    """
+    from .planner import plan as plan_run
+
+    print(
+        plan_run(
+            package=Path(path),
+            exclude_patterns=[exclude_pattern],
+            llm_model=llm_model,
+            workers=workers,
+            mode=mode,
+            context_mode=context_mode,
+            context_tokens=context_tokens,
+            context_sizes={llm_model: context_size} if context_size else {},
+            incremental=incremental,
+            since=since or None,
+            rate=rate or None,
+            report=Path(rate_from) if rate_from else None,
+        )
     )
 
 
@@ -76,4 +421,4 @@ def clean(package: str):
     """
     for file in Path(package).glob("**/nosync_*.py"):
         file.unlink()
-        print(f"Removed: {str(file).replace(str(package), "")}")
+        print(f"Removed: {str(file).replace(str(package), '')}")
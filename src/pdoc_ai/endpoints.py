@@ -0,0 +1,336 @@
+"""
+Spread requests over several OpenAI-compatible servers.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import NamedTuple
+
+import httpx
+import instructor
+from ollama import Client
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+
+from .resilience import CircuitBreaker, CircuitOpen
+
+
+def parse_endpoints(base_url: str | list[str]) -> list[str]:
+    """Split a comma-separated list of base URLs.
+
+    Args:
+        base_url (str | list[str]): One URL, several URLs separated by commas, or a list of URLs.
+
+    Returns:
+        list[str]: The distinct URLs in the order given.
+    """
+    urls = base_url.split(",") if isinstance(base_url, str) else base_url
+    return list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+
+
+class _AsyncClients(NamedTuple):
+    """Async client objects bound to the event loop that created them."""
+
+    loop: asyncio.AbstractEventLoop
+    openai: AsyncOpenAI
+    instructor: instructor.AsyncInstructor
+
+
+class Endpoint:
+    """One OpenAI-compatible server and its clients.
+
+    Attributes:
+        base_url (str): Base URL of the API.
+        outstanding (int): Requests currently in flight.
+        dispatched (int): Requests sent so far.
+        breaker (CircuitBreaker): Takes the endpoint out of rotation while it keeps failing.
+        openai (OpenAI): Sync client.
+        instructor (instructor.Instructor): Sync structured output client.
+        ollama (Client | None): Ollama client, None for api.openai.com.
+    """
+
+    PROBE_TIMEOUT: float = 5.0
+
+    def __init__(
+        self,
+        base_url: str,
+        key: str,
+        max_concurrency: int = 4,
+        breaker: CircuitBreaker | None = None,
+        **kwargs,
+    ) -> None:
+        """
+        Create the clients of an endpoint.
+
+        The OpenAI clients do not retry by themselves; `LLM` retries across endpoints.
+
+        Args:
+            base_url (str): Base URL of the API.
+            key (str): The API key to authenticate with.
+            max_concurrency (int, optional): Sizes the async connection pool. Defaults to 4.
+            breaker (CircuitBreaker | None, optional): Circuit breaker of the endpoint. Defaults to a new one.
+            **kwargs: Additional keyword arguments to pass to the OpenAI clients.
+        """
+        kwargs = {"max_retries": 0, **kwargs}
+        self.base_url = base_url
+        self.outstanding = 0
+        self.dispatched = 0
+        self.breaker = breaker or CircuitBreaker()
+        self.__key = key
+        self.__kwargs = kwargs
+        self.__max_concurrency = max_concurrency
+        self.__async: _AsyncClients | None = None
+        self.openai = OpenAI(base_url=base_url, api_key=key, **kwargs)
+        self.instructor = instructor.from_openai(self.openai, mode=instructor.Mode.JSON)
+
+        _host = "//".join(Path(base_url).parts[:2])
+        if _host.casefold() == "https://api.openai.com":
+            self.ollama = None
+        else:
+            self.ollama = Client(host=_host)
+
+    def aclients(self) -> _AsyncClients:
+        """
+        Get the async clients for the running event loop, creating them on first use.
+
+        Returns:
+            _AsyncClients: The async OpenAI and instructor clients sharing one connection pool.
+        """
+        loop = asyncio.get_running_loop()
+        if self.__async is None or self.__async.loop is not loop:
+            _openai = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.__key,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.__max_concurrency,
+                        max_keepalive_connections=self.__max_concurrency,
+                    )
+                ),
+                **self.__kwargs,
+            )
+            self.__async = _AsyncClients(
+                loop=loop,
+                openai=_openai,
+                instructor=instructor.from_openai(_openai, mode=instructor.Mode.JSON),
+            )
+        return self.__async
+
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client."""
+        if self.__async is not None:
+            await self.__async.openai.close()
+            self.__async = None
+
+    def check(self) -> bool:
+        """
+        Probe the endpoint by listing its models.
+
+        Returns:
+            bool: True if the endpoint answered.
+        """
+        try:
+            self.openai.with_options(timeout=self.PROBE_TIMEOUT).models.list()
+        except Exception:
+            return False
+        return True
+
+    async def acheck(self) -> bool:
+        """
+        Probe the endpoint by listing its models without blocking the event loop.
+
+        Returns:
+            bool: True if the endpoint answered.
+        """
+        try:
+            await (
+                self.aclients()
+                .openai.with_options(timeout=self.PROBE_TIMEOUT)
+                .models.list()
+            )
+        except Exception:
+            return False
+        return True
+
+    @property
+    def healthy(self) -> bool:
+        """bool: True while the circuit breaker is closed."""
+        return self.breaker.state == "closed"
+
+    def __str__(self) -> str:
+        return self.base_url
+
+
+class EndpointPool:
+    """Least-outstanding-requests scheduling over a set of endpoints.
+
+    Each endpoint runs at most `max_concurrency` requests at once. An endpoint
+    whose request fails with a server error is probed; if the probe fails too, or
+    it keeps failing, its circuit breaker opens and it is removed. Once the
+    breaker is half-open the endpoint is probed again before it is re-admitted.
+
+    Attributes:
+        endpoints (list[Endpoint]): Every configured endpoint, healthy or not.
+        max_concurrency (int): In-flight requests per endpoint.
+    """
+
+    def __init__(self, endpoints: list[Endpoint], max_concurrency: int = 4) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            endpoints (list[Endpoint]): The endpoints to spread requests over.
+            max_concurrency (int, optional): In-flight requests per endpoint. Defaults to 4.
+        """
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = endpoints
+        self.max_concurrency = max(1, max_concurrency)
+        self.__waiters: list[asyncio.Future] = []
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def healthy(self) -> list[Endpoint]:
+        """list[Endpoint]: Endpoints that currently receive requests."""
+        return [e for e in self.endpoints if e.healthy]
+
+    def __pick(self) -> Endpoint | None:
+        free = [e for e in self.healthy if e.outstanding < self.max_concurrency]
+        if not free:
+            return None
+        endpoint = min(free, key=lambda e: (e.outstanding, e.dispatched))
+        endpoint.outstanding += 1
+        endpoint.dispatched += 1
+        return endpoint
+
+    def __due(self) -> list[Endpoint]:
+        due = [e for e in self.endpoints if e.breaker.state == "half-open"]
+        # Concurrent requests must not probe the same endpoint again
+        for endpoint in due:
+            endpoint.breaker.trial()
+        return due
+
+    def __restore(self, endpoint: Endpoint, ok: bool) -> None:
+        if ok:
+            endpoint.breaker.success()
+            print(f"Endpoint {endpoint} is back")
+        else:
+            endpoint.breaker.trip()
+
+    def __no_endpoint(self) -> CircuitOpen:
+        return CircuitOpen(
+            f"No healthy endpoint among {', '.join(map(str, self.endpoints))}",
+            retry_in=min(e.breaker.retry_in for e in self.endpoints),
+        )
+
+    def acquire_sync(self) -> Endpoint:
+        """
+        Reserve the least busy healthy endpoint for a blocking request.
+
+        Returns:
+            Endpoint: The endpoint, to be given back with `release`.
+
+        Raises:
+            CircuitOpen: If every endpoint is down.
+        """
+        for endpoint in self.__due():
+            self.__restore(endpoint, endpoint.check())
+        endpoint = self.__pick()
+        if endpoint is None:
+            # Blocking calls are sequential, so this only happens when all are down
+            raise self.__no_endpoint()
+        return endpoint
+
+    async def acquire(self) -> Endpoint:
+        """
+        Reserve the least busy healthy endpoint, waiting for a free slot.
+
+        Returns:
+            Endpoint: The endpoint, to be given back with `release`.
+
+        Raises:
+            CircuitOpen: If every endpoint is down.
+        """
+        while True:
+            due = self.__due()
+            if due:
+                results = await asyncio.gather(*(e.acheck() for e in due))
+                for endpoint, ok in zip(due, results):
+                    self.__restore(endpoint, ok)
+            if not self.healthy:
+                raise self.__no_endpoint()
+
+            endpoint = self.__pick()
+            if endpoint is not None:
+                return endpoint
+            waiter = asyncio.get_running_loop().create_future()
+            self.__waiters.append(waiter)
+            await waiter
+
+    def release(self, endpoint: Endpoint) -> None:
+        """
+        Give back an endpoint reserved with `acquire` and wake the waiting requests.
+
+        Args:
+            endpoint (Endpoint): The endpoint.
+        """
+        endpoint.outstanding -= 1
+        self.__wake()
+
+    def __wake(self) -> None:
+        waiters, self.__waiters = self.__waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def remove(self, endpoint: Endpoint, error: Exception) -> None:
+        """
+        Take an endpoint out of rotation.
+
+        Args:
+            endpoint (Endpoint): The failing endpoint.
+            error (Exception): Why it failed.
+        """
+        if endpoint.healthy:
+            print(f"Removing endpoint {endpoint}: {error!r}")
+        endpoint.breaker.trip()
+        # Requests waiting for a slot may now have to give up
+        self.__wake()
+
+    def fail_sync(self, endpoint: Endpoint, error: Exception) -> None:
+        """
+        Probe an endpoint after a failed blocking request and remove it if the probe
+        fails or its circuit breaker opens.
+
+        Args:
+            endpoint (Endpoint): The endpoint the request failed on.
+            error (Exception): The error of the request.
+        """
+        if not endpoint.check() or endpoint.breaker.failure():
+            self.remove(endpoint, error)
+
+    async def fail(self, endpoint: Endpoint, error: Exception) -> None:
+        """
+        Probe an endpoint after a failed request and remove it if the probe fails
+        or its circuit breaker opens.
+
+        Args:
+            endpoint (Endpoint): The endpoint the request failed on.
+            error (Exception): The error of the request.
+        """
+        if not await endpoint.acheck() or endpoint.breaker.failure():
+            self.remove(endpoint, error)
+
+    def succeed(self, endpoint: Endpoint) -> None:
+        """
+        Record a successful request, resetting the endpoint's run of failures.
+
+        Args:
+            endpoint (Endpoint): The endpoint that answered.
+        """
+        endpoint.breaker.success()
+
+    async def aclose(self) -> None:
+        """Close the async clients of every endpoint."""
+        await asyncio.gather(*(e.aclose() for e in self.endpoints))
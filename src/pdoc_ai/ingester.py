@@ -1,77 +1,367 @@
-from gitingest import ingest
+import ast
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Literal
+from typing import Iterator
 
+from .paths import dir_cache
+from .scanner import directory_tree, read_file, scan, walk
+from .tokens import count_tokens, truncate_to_tokens
+
+_SYSTEM_HEADER: str = """
+You are an experienced python programming assistant and a documentation specialist.
+Your task is to add documentation comments to code in google format to enable autogeneration of useful and descriptive pdoc documents.
+You will not make any changes to the code itself but only generate documentation comments (docstrings).
+"""
+
+_SEPARATOR: str = "=" * 48
 
-def _begin_quotes(line: str) -> bool:
-    """Check if a line starts with a docstring delimiter.
+
+def _is_docstring(node: ast.stmt) -> bool:
+    """Check if a statement is a string literal expression.
 
     Args:
-        line (str): The line of text to check.
+        node (ast.stmt): The statement to check.
 
     Returns:
-        bool: True if the line starts with a docstring delimiter, False otherwise.
+        bool: True if the statement is a bare string, i.e. a docstring when it comes first in a body.
     """
-    if line.strip().startswith('"""') or line.strip().startswith("'''"):
-        return True
-    return False
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    )
 
 
-def _find_docstrings(text: str) -> list[tuple[int, int]]:
-    """Get range of docstrings from text.
+def strip_docstrings(text: str) -> str:
+    """Remove docstrings from the source of a single python file.
+
+    Only true docstrings (the first statement of a module, class or function
+    body) are removed, in one pass over the file. A docstring that is the only
+    statement of its body is replaced with `...` so the code stays valid. Files
+    that cannot be parsed are returned unchanged.
 
     Args:
-        text (str): The text to search for docstrings.
+        text (str): Python source code.
 
     Returns:
-        list[tuple[int, int]]: A list of tuples containing the start and end indices of each docstring.
+        str: The source with docstrings removed.
     """
-    ranges: list[tuple[int, int]] = []
-    _start: int | None = None
-    _start_type: Literal['"""', "'''", None] = None
-    _skip_next: bool = False
-
-    for idx, line in enumerate(text.split("\n")):
-        if (_start is None) and (_begin_quotes(line)) and (not _skip_next):
-            _start = idx
-            _start_type = line.strip()[:3]
-            line = line.strip()[3:]
-            _skip_next = False
-
-        if _start is None or _start_type is None:
-            if '"""' in line or "'''" in line:
-                _skip_next = not _skip_next
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return text
+
+    lines = text.splitlines(keepends=True)
+    # 0-based (first line, last line, replacement) of each docstring to drop
+    drops: list[tuple[int, int, str]] = []
+    for node in ast.walk(tree):
+        if not isinstance(
+            node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+        ):
             continue
-        elif _start_type in line.strip():
-            ranges.append((_start, idx + 1))
-            _start = None
-            _start_type = None
-    return ranges
+        if not node.body or not _is_docstring(node.body[0]):
+            continue
+        doc = node.body[0]
+        first, last = doc.lineno - 1, doc.end_lineno - 1
+        # AST column offsets count UTF-8 bytes
+        before = (
+            lines[first].encode("utf-8")[: doc.col_offset].decode("utf-8", "replace")
+        )
+        after = (
+            lines[last].encode("utf-8")[doc.end_col_offset :].decode("utf-8", "replace")
+        )
+        if before.strip() or (after.strip() and not after.strip().startswith("#")):
+            # Shares its line with other code, e.g. `def f(): "doc"; return 1`
+            continue
+        replacement = (
+            f"{before}...\n"
+            if len(node.body) == 1 and not isinstance(node, ast.Module)
+            else ""
+        )
+        drops.append((first, last, replacement))
+
+    if not drops:
+        return text
+
+    drops.sort()
+    out: list[str] = []
+    cursor = 0
+    for first, last, replacement in drops:
+        out.extend(lines[cursor:first])
+        out.append(replacement)
+        cursor = last + 1
+    out.extend(lines[cursor:])
+    return "".join(out)
 
 
-def _strip_docstring(doc: str):
-    """Remove docstrings from the given text.
+def _context_pieces(package: str | Path, files: list["StrippedFile"]) -> Iterator[str]:
+    """Yield the context of the given files piece by piece.
 
     Args:
-        doc (str): The text containing docstrings.
+        package (str | Path): The package path, shown as the root of the directory structure.
+        files (list[StrippedFile]): The files, in context order.
 
-    Returns:
-        str: The text with docstrings removed.
+    Yields:
+        str: The directory structure, then a `FILE:` header and the stripped contents of each file.
+    """
+    tree = directory_tree(package, [f.relpath for f in files])
+    yield f"\n<DIRECTORY_STRUCTURE>\n{tree}\n</DIRECTORY_STRUCTURE>\n\n<FILE_CONTENTS>\n"
+    for f in files:
+        yield f"{_SEPARATOR}\nFILE: {f.relpath}\n{_SEPARATOR}\n"
+        yield f.stripped
+        yield "\n\n"
+    yield "\n</FILE_CONTENTS>\n    "
+
+
+@dataclass
+class StrippedFile:
+    """A package file as it appears in the context.
+
+    Attributes:
+        relpath (str): Path relative to the package, using `/` separators.
+        mtime_ns (int): Modification time of the file when it was read.
+        size (int): Size in bytes when it was read.
+        hash (str): Hex sha256 digest of the raw contents, as `manifest.file_hash`.
+        stripped (str): The contents with docstrings removed.
     """
-    _doc: list[str] = doc.split("\n")
-    new_doc = doc[:]
-    ranges = _find_docstrings(doc)
-    for range in ranges:
-        _txt = "\n".join(_doc[range[0] : range[1]])
-        # print(_txt)
-        new_doc = new_doc.replace(_txt, "")
-    return new_doc
+
+    relpath: str
+    mtime_ns: int
+    size: int
+    hash: str
+    stripped: str
+
+
+class ContextCache:
+    """Stripped file contents and assembled contexts, reused across commands and runs.
+
+    Every file is stat-ed on each build, but only files whose modification time
+    or size changed are read and stripped again. Entries live in memory for the
+    whole process, shared by all instances, and in one JSON file per package
+    under `directory`. The assembled context is kept in memory and rebuilt only
+    when the fingerprint of its files (paths and content hashes) changes.
+
+    Attributes:
+        directory (Path | None): Directory of the on-disk entries, None to keep them in memory only.
+        reads (int): Files read and stripped by this instance.
+        hits (int): Files served from the cache by this instance.
+    """
+
+    VERSION: int = 1
+    """Bumped whenever `strip_docstrings` changes its output, invalidating stored entries."""
+
+    # Resolved package path -> relpath -> entry
+    _files: dict[str, dict[str, StrippedFile]] = {}
+    # (package, include, exclude) -> (fingerprint, context)
+    _contexts: dict[tuple, tuple[str, str]] = {}
+
+    def __init__(self, directory: str | Path | None = dir_cache / "context") -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str | Path | None, optional): Directory of the on-disk entries, None to keep
+                them in memory only. Defaults to `<user cache>/pdoc_ai/context`.
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.reads = 0
+        self.hits = 0
+
+    def __path(self, package: Path) -> Path:
+        digest = hashlib.sha256(str(package).encode("utf-8")).hexdigest()
+        return self.directory / f"{digest[:16]}.json"
+
+    def __load(self, package: Path) -> dict[str, StrippedFile]:
+        entries = self._files.get(str(package))
+        if entries is not None:
+            return entries
+        entries = {}
+        if self.directory is not None:
+            try:
+                with open(self.__path(package), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    entries = {
+                        relpath: StrippedFile(relpath=relpath, **entry)
+                        for relpath, entry in data["files"].items()
+                    }
+            except (OSError, ValueError, KeyError, TypeError):
+                entries = {}
+        self._files[str(package)] = entries
+        return entries
+
+    def __save(self, package: Path, entries: dict[str, StrippedFile]) -> None:
+        if self.directory is None:
+            return
+        # Drop deleted files; files excluded by this build's patterns stay for other builds
+        files = {
+            relpath: {k: v for k, v in asdict(entry).items() if k != "relpath"}
+            for relpath, entry in entries.items()
+            if (package / relpath).is_file()
+        }
+        path = self.__path(package)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": self.VERSION, "package": str(package), "files": files},
+                    f,
+                )
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not write the context cache {path}: {e!r}")
+
+    @staticmethod
+    def __read(package: Path, relpath: str, mtime_ns: int) -> StrippedFile:
+        record = read_file(package, relpath)
+        return StrippedFile(
+            relpath=relpath,
+            mtime_ns=mtime_ns,
+            size=record.size,
+            hash=record.hash,
+            stripped=strip_docstrings(record.text),
+        )
+
+    def files(
+        self,
+        package: str | Path,
+        include_patterns: list[str] = [],
+        exclude_patterns: list[str] = [],
+        workers: int | None = None,
+    ) -> list[StrippedFile]:
+        """Get the stripped files of a package, reading only those that changed.
+
+        Args:
+            package (str | Path): The package path.
+            include_patterns (list[str], optional): Patterns to include. Defaults to [].
+            exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+            workers (int | None, optional): Reader threads. Defaults to the `ThreadPoolExecutor` default.
+
+        Returns:
+            list[StrippedFile]: The files in sorted path order.
+        """
+        package = Path(package).resolve()
+        entries = self.__load(package)
+        relpaths = walk(package, include_patterns, exclude_patterns)
+
+        current: dict[str, StrippedFile] = {}
+        stale: list[tuple[str, int]] = []
+        for relpath in relpaths:
+            try:
+                stat = os.stat(package / relpath)
+            except FileNotFoundError:
+                continue
+            entry = entries.get(relpath)
+            if entry is not None and (entry.mtime_ns, entry.size) == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                current[relpath] = entry
+            else:
+                stale.append((relpath, stat.st_mtime_ns))
+
+        self.hits += len(current)
+        if stale:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for entry in pool.map(lambda item: self.__read(package, *item), stale):
+                    entries[entry.relpath] = current[entry.relpath] = entry
+            self.reads += len(stale)
+            self.__save(package, entries)
+        return [current[relpath] for relpath in relpaths if relpath in current]
+
+    def iter_context(
+        self,
+        package: str | Path,
+        include_patterns: list[str] = [],
+        exclude_patterns: list[str] = [],
+    ) -> Iterator[str]:
+        """Yield the context of a package piece by piece, without assembling it.
+
+        Args:
+            package (str | Path): The package path.
+            include_patterns (list[str], optional): Patterns to include. Defaults to [].
+            exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+
+        Yields:
+            str: Pieces of the context; the stripped files are yielded as they are, not copied.
+        """
+        files = self.files(package, include_patterns, exclude_patterns)
+        yield from _context_pieces(package, files)
+
+    def context(
+        self,
+        package: str | Path,
+        include_patterns: list[str] = [],
+        exclude_patterns: list[str] = [],
+        header: str = "",
+        footer: str = "",
+    ) -> str:
+        """Get the context of a package, assembling it only if a file changed.
+
+        The context is joined once from the stripped files, so building it holds
+        the stripped files and the result, not intermediate copies. The result is
+        kept in memory until a file changes, and is usually the same object as the
+        message sent to the model.
+
+        Args:
+            package (str | Path): The package path.
+            include_patterns (list[str], optional): Patterns to include. Defaults to [].
+            exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+            header (str, optional): Text before the context, e.g. instructions. Defaults to "".
+            footer (str, optional): Text after the context. Defaults to "".
+
+        Returns:
+            str: The directory structure and the stripped contents of the files.
+        """
+        files = self.files(package, include_patterns, exclude_patterns)
+        fingerprint = hashlib.sha256(
+            "\n".join(f"{f.relpath}:{f.hash}" for f in files).encode("utf-8")
+        ).hexdigest()
+        key = (
+            str(Path(package).resolve()),
+            tuple(include_patterns),
+            tuple(exclude_patterns),
+            header,
+            footer,
+        )
+        if key in self._contexts and self._contexts[key][0] == fingerprint:
+            return self._contexts[key][1]
+
+        # Release the outdated context before building its replacement
+        self._contexts.pop(key, None)
+        context = "".join([header, *_context_pieces(package, files), footer])
+        self._contexts[key] = (fingerprint, context)
+        return context
+
+    @classmethod
+    def forget(cls, package: str | Path) -> None:
+        """Release the stripped files and contexts of a package kept in memory.
+
+        The on-disk entries stay, so the next build of the package only reads
+        them back instead of stripping the files again.
+
+        Args:
+            package (str | Path): The package path.
+        """
+        package = str(Path(package).resolve())
+        cls._files.pop(package, None)
+        for key in [key for key in cls._contexts if key[0] == package]:
+            del cls._contexts[key]
+
+    def __str__(self) -> str:
+        return f"ContextCache(directory={self.directory}, reads={self.reads}, hits={self.hits})"
 
 
 def generate_context(
     package: str | Path,
     include_patterns: list[str] = [],
     exclude_patterns: list[str] = [],
+    cache: ContextCache | None = None,
 ) -> str:
     """Generate context for the given package.
 
@@ -79,34 +369,41 @@ def generate_context(
         package (str | Path): The package path.
         include_patterns (list[str], optional): Patterns to include. Defaults to [].
         exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+        cache (ContextCache | None, optional): Cache to build the context with. Defaults to one kept in memory only.
 
     Returns:
         str: The generated context as a string.
     """
-    package = str(package)
+    cache = cache or ContextCache(directory=None)
+    return cache.context(package, include_patterns, exclude_patterns)
 
-    _, tree, content = ingest(
-        source=str(package),
-        include_patterns=["*.py", *include_patterns],
-        exclude_patterns=["**/tests/*", "**/nosync**", *exclude_patterns],
-    )
 
-    context = f"""
-<DIRECTORY_STRUCTURE>
-{tree}
-</DIRECTORY_STRUCTURE>
+def iter_context(
+    package: str | Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    cache: ContextCache | None = None,
+) -> Iterator[str]:
+    """Generate the context of the given package piece by piece, e.g. to write it out without holding it.
+
+    Args:
+        package (str | Path): The package path.
+        include_patterns (list[str], optional): Patterns to include. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+        cache (ContextCache | None, optional): Cache to read the files with. Defaults to one kept in memory only.
 
-<FILE_CONTENTS>
-{_strip_docstring(content)}
-</FILE_CONTENTS>
+    Yields:
+        str: Pieces of the context, joining to `generate_context`.
     """
-    return context
+    cache = cache or ContextCache(directory=None)
+    yield from cache.iter_context(package, include_patterns, exclude_patterns)
 
 
 def generate_system(
     package: str | Path,
     include_patterns: list[str] = [],
     exclude_patterns: list[str] = [],
+    cache: ContextCache | None = None,
 ) -> str:
     """Generate a system message for the given package.
 
@@ -114,18 +411,336 @@ def generate_system(
         package (str | Path): The package path.
         include_patterns (list[str], optional): Patterns to include. Defaults to [].
         exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+        cache (ContextCache | None, optional): Cache to build the context with. Defaults to one kept in memory only.
 
     Returns:
         str: The generated system message as a string.
     """
+    cache = cache or ContextCache(directory=None)
+    return cache.context(
+        package,
+        include_patterns,
+        exclude_patterns,
+        header=f"{_SYSTEM_HEADER}\nGiven below are the directory structure, file contents of the project.\n\n",
+        footer="\n    ",
+    )
 
-    SYSTEM_MSG: str = f"""
-You are an experienced python programming assistant and a documentation specialist.
-Your task is to add documentation comments to code in google format to enable autogeneration of useful and descriptive pdoc documents.
-You will not make any changes to the code itself but only generate documentation comments (docstrings).
 
-Given below are the directory structure, file contents of the project.
+def _read_sources(
+    package: Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+) -> dict[str, str]:
+    """Read the python sources of a package.
+
+    Args:
+        package (Path): The package path.
+        include_patterns (list[str], optional): Patterns to include. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
 
-{generate_context(package = package, include_patterns = include_patterns, exclude_patterns = exclude_patterns,)}
+    Returns:
+        dict[str, str]: File contents keyed by package-relative path.
+    """
+    return {
+        record.relpath: record.text
+        for record in scan(
+            package,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+        )
+    }
+
+
+def _module_name(package: Path, relpath: str) -> str:
+    """Get the dotted module name of a package file.
+
+    Args:
+        package (Path): The package path.
+        relpath (str): Path of the file relative to the package.
+
+    Returns:
+        str: Dotted module name, e.g. `pdoc_ai.utils.decorators`.
+    """
+    parts = [package.name, *Path(relpath).with_suffix("").parts]
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _file_imports(
+    package: Path, relpath: str, text: str, modules: dict[str, str]
+) -> set[str]:
+    """Find which package files one file imports, see `build_import_graph`.
+
+    Args:
+        package (Path): The package path.
+        relpath (str): Package-relative path of the file.
+        text (str): Contents of the file.
+        modules (dict[str, str]): Package-relative path of every module, keyed by dotted module name.
+
+    Returns:
+        set[str]: Package-relative paths of the imported files.
+    """
+    imports: set[str] = set()
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return imports
+
+    here = _module_name(package, relpath).split(".")
+    if Path(relpath).name != "__init__.py":
+        here = here[:-1]
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                if node.level - 1 > len(here):
+                    continue
+                base = here[: len(here) - (node.level - 1)]
+                base = ".".join([*base, *([node.module] if node.module else [])])
+            else:
+                base = node.module or ""
+            names = [base, *(f"{base}.{alias.name}" for alias in node.names)]
+        else:
+            continue
+
+        for name in names:
+            # `from pkg.mod import Class` resolves to the longest known module
+            while name and name not in modules:
+                name = name.rpartition(".")[0]
+            if name and modules[name] != relpath:
+                imports.add(modules[name])
+    return imports
+
+
+def build_import_graph(
+    package: str | Path, sources: dict[str, str]
+) -> dict[str, set[str]]:
+    """Find which package files each file imports.
+
+    Both absolute (`pkg.mod`) and relative (`.mod`) imports are resolved. Imports
+    from outside the package are ignored.
+
+    Args:
+        package (str | Path): The package path.
+        sources (dict[str, str]): File contents keyed by package-relative path.
+
+    Returns:
+        dict[str, set[str]]: Package-relative paths of the imported files, keyed by importing file.
     """
-    return SYSTEM_MSG
+    package = Path(package)
+    modules = {_module_name(package, relpath): relpath for relpath in sources}
+    return {
+        relpath: _file_imports(package, relpath, text, modules)
+        for relpath, text in sources.items()
+    }
+
+
+def _stub_body(body: list[ast.stmt]) -> list[ast.stmt]:
+    """Reduce a module or class body to its interface.
+
+    Args:
+        body (list[ast.stmt]): Statements of a module or class.
+
+    Returns:
+        list[ast.stmt]: Imports, assignments, docstrings and signatures with `...` bodies.
+    """
+    stub: list[ast.stmt] = []
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            doc = node.body[:1] if ast.get_docstring(node) is not None else []
+            node.body = [*doc, ast.Expr(ast.Constant(Ellipsis))]
+        elif isinstance(node, ast.ClassDef):
+            node.body = _stub_body(node.body) or [ast.Expr(ast.Constant(Ellipsis))]
+        elif isinstance(node, ast.Expr):
+            if not (
+                isinstance(node.value, ast.Constant)
+                and isinstance(node.value.value, str)
+            ):
+                continue
+        elif not isinstance(
+            node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign)
+        ):
+            continue
+        stub.append(node)
+    return stub
+
+
+def module_stub(text: str) -> str:
+    """Generate a stub (signatures only) of a python module.
+
+    Args:
+        text (str): Source code of the module.
+
+    Returns:
+        str: The stub, or an empty string if the module cannot be parsed.
+    """
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return ""
+    tree.body = _stub_body(tree.body)
+    return ast.unparse(tree)
+
+
+class PrunedContext:
+    """Per-file context made of the file itself and stubs of its neighbours in the import graph.
+
+    Attributes:
+        package (Path): The package path.
+        sources (dict[str, str]): File contents keyed by package-relative path.
+        imports (dict[str, set[str]]): Files imported by each file.
+        importers (dict[str, set[str]]): Files importing each file.
+    """
+
+    def __init__(
+        self,
+        package: str | Path,
+        include_patterns: list[str] = [],
+        exclude_patterns: list[str] = [],
+    ) -> None:
+        """
+        Read the package and build its import graph.
+
+        Args:
+            package (str | Path): The package path.
+            include_patterns (list[str], optional): Patterns to include. Defaults to [].
+            exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+        """
+        self.package = Path(package)
+        self.sources = _read_sources(
+            self.package,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+        )
+        self.imports = build_import_graph(self.package, self.sources)
+        self.importers: dict[str, set[str]] = {}
+        self.__link()
+
+    def __link(self) -> None:
+        """Derive `importers` from `imports`."""
+        self.importers = {relpath: set() for relpath in self.sources}
+        for relpath, deps in self.imports.items():
+            for dep in deps:
+                self.importers[dep].add(relpath)
+
+    def update(self, changed: dict[str, str | None]) -> None:
+        """Take changed files into account without reading the package again.
+
+        Only the imports of the changed files are parsed again, unless files
+        were added or removed, which can change what every import resolves to.
+
+        Args:
+            changed (dict[str, str | None]): New contents keyed by package-relative path, None for a removed file.
+        """
+        # Added, or removed
+        moved = any(
+            (text is None) == (relpath in self.sources)
+            for relpath, text in changed.items()
+        )
+        for relpath, text in changed.items():
+            if text is None:
+                self.sources.pop(relpath, None)
+            else:
+                self.sources[relpath] = text
+
+        if moved:
+            self.imports = build_import_graph(self.package, self.sources)
+        else:
+            modules = {
+                _module_name(self.package, relpath): relpath for relpath in self.sources
+            }
+            for relpath in changed.keys() & self.sources.keys():
+                self.imports[relpath] = _file_imports(
+                    self.package, relpath, self.sources[relpath], modules
+                )
+        self.__link()
+
+    def neighbours(self, relpath: str) -> list[str]:
+        """Get the files related to `relpath`, most relevant first.
+
+        Args:
+            relpath (str): Package-relative path of the target file.
+
+        Returns:
+            list[str]: Files imported by the target, followed by files importing it.
+        """
+        imported = sorted(self.imports.get(relpath, ()))
+        importers = sorted(self.importers.get(relpath, set()) - set(imported))
+        return [*imported, *importers]
+
+    def context(
+        self, relpath: str, token_budget: int = 8000, full_target: bool = True
+    ) -> str:
+        """Generate the context for a single file.
+
+        The target file is always included. Stubs of neighbouring modules are
+        added in order of relevance while they fit in `token_budget`.
+
+        Args:
+            relpath (str): Package-relative path of the target file.
+            token_budget (int, optional): Maximum number of tokens in the context. Defaults to 8000.
+            full_target (bool, optional): Include the full target file rather than its stub, e.g. set to False
+                when the file is sent in chunks. Defaults to True.
+
+        Returns:
+            str: The generated context as a string.
+        """
+        target = self.sources.get(relpath)
+        if target is None:
+            target = (self.package / relpath).read_text(
+                encoding="utf-8", errors="replace"
+            )
+        if not full_target:
+            target = module_stub(target) or target
+        target_block = f"""
+<TARGET_FILE>
+FILE: {relpath}
+{target}
+</TARGET_FILE>
+"""
+        remaining = token_budget - count_tokens(target_block)
+
+        related: list[str] = []
+        for neighbour in self.neighbours(relpath):
+            stub = module_stub(self.sources[neighbour])
+            if not stub:
+                continue
+            block = f"FILE: {neighbour}\n{stub}\n"
+            cost = count_tokens(block)
+            if cost > remaining:
+                # Keep at least a truncated view of the most relevant neighbour
+                if not related and remaining > 0:
+                    related.append(truncate_to_tokens(block, remaining))
+                    remaining = 0
+                continue
+            related.append(block)
+            remaining -= cost
+
+        related_text = "\n".join(related)
+        return f"""{target_block}
+<RELATED_MODULES>
+{related_text}
+</RELATED_MODULES>
+"""
+
+    def system(
+        self, relpath: str, token_budget: int = 8000, full_target: bool = True
+    ) -> str:
+        """Generate a system message for a single file.
+
+        Args:
+            relpath (str): Package-relative path of the target file.
+            token_budget (int, optional): Maximum number of tokens in the context. Defaults to 8000.
+            full_target (bool, optional): Include the full target file rather than its stub. Defaults to True.
+
+        Returns:
+            str: The generated system message as a string.
+        """
+        return f"""{_SYSTEM_HEADER}
+Given below are the file to document and stubs of the modules it imports or is imported by.
+
+{self.context(relpath, token_budget=token_budget, full_target=full_target)}
+"""
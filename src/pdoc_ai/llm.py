@@ -2,17 +2,41 @@
 LLM class for interacting with language models.
 """
 
+import asyncio
 from functools import cached_property
-from pathlib import Path
-from typing import Type, TypeVar
+from time import perf_counter, sleep, time
+from typing import AsyncIterator, Awaitable, Callable, Type, TypeVar
 
-import instructor
-from ollama import Client
-from openai import OpenAI
+from openai import RateLimitError
 from openai.types.chat import ChatCompletion
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+
+from .batch import (
+    BATCH_ENDPOINT,
+    TERMINAL,
+    BatchError,
+    batch_line,
+    extract_json,
+    json_mode,
+    parse_results,
+)
+from .cache import ResponseCache
+from .endpoints import Endpoint, EndpointPool, parse_endpoints
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpen,
+    RateLimiter,
+    api_error,
+    backoff_delay,
+    is_endpoint_error,
+    is_retryable,
+    retry_after,
+)
+from .telemetry import Telemetry
+from .tokens import count_tokens
 
 _StructuredOutput = TypeVar("_StructuredOutput", bound=BaseModel)
+_T = TypeVar("_T")
 
 
 class LLM:
@@ -21,6 +45,11 @@ class LLM:
     Attributes:
         last_completion (dict): A dictionary to store the last completion token usage.
         SYSTEM (str): A system message to guide the assistant's behavior.
+        telemetry (Telemetry): Token usage and latency of every request made by this instance.
+        pool (EndpointPool): The servers requests are spread over.
+        retries (int): Retries of a request that failed with a transient error (rate limit, connection, 5xx).
+        limiter (RateLimiter): Client-side requests and tokens per minute.
+        keep_alive (float | str | None): How long Ollama keeps models loaded by `aload`, e.g. `"30m"`, -1 for ever.
     """
 
     last_completion = {"prompt": 0, "completion": 0}
@@ -28,51 +57,75 @@ class LLM:
 
     def __init__(
         self,
-        base_url: str = "http://100.99.54.84:11434/v1",
+        base_url: str | list[str] = "http://100.99.54.84:11434/v1",
         model: str = "general_small",
         key: str = "ollama",
+        max_concurrency: int = 4,
+        cache: ResponseCache | None = None,
+        retries: int = 5,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        keep_alive: float | str | None = None,
         **kwargs,
     ) -> None:
         """
         Initialize the LLM class with specified parameters.
 
         Args:
-            base_url (str): The base URL for the language model API.
+            base_url (str | list[str]): The base URL for the language model API. Several servers serving the
+                same models may be given as a list or comma-separated; requests go to the least busy one.
             model (str): The name of the language model to use.
             key (str): The API key to authenticate with.
+            max_concurrency (int): Maximum number of in-flight async requests per server. Also sizes the async connection pools.
+            cache (ResponseCache | None): Cache of responses to identical requests, or None to always call the API.
+            retries (int): Retries of a request that failed with a transient error, with exponential backoff and jitter.
+            requests_per_minute (float | None): Client-side request rate limit, None for no limit.
+            tokens_per_minute (float | None): Client-side token rate limit, None for no limit.
+            keep_alive (float | str | None): How long Ollama keeps models loaded by `aload` (seconds or a
+                duration such as `"30m"`, -1 for ever), None for the server default.
             **kwargs: Additional keyword arguments to pass to OpenAI or Ollama clients.
         """
         try:
-
-            self.__api_base = base_url
+            self.__api_base = ",".join(parse_endpoints(base_url))
             self.__model = model
-            self.__openai = OpenAI(
-                base_url=self.__api_base,
-                api_key=key,
-                **kwargs,
-            )
-            self.__instructor = instructor.from_openai(
-                self.__openai, mode=instructor.Mode.JSON
+            self.max_concurrency = max(1, max_concurrency)
+            self.cache = cache
+            self.telemetry = Telemetry()
+            self.last_completion = {"prompt": 0, "completion": 0}
+            self.retries = max(0, retries)
+            self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            self.keep_alive = keep_alive
+            self.pool = EndpointPool(
+                [
+                    Endpoint(
+                        url,
+                        key=key,
+                        max_concurrency=self.max_concurrency,
+                        breaker=CircuitBreaker(),
+                        **kwargs,
+                    )
+                    for url in parse_endpoints(base_url)
+                ],
+                max_concurrency=self.max_concurrency,
             )
 
-            _host = "//".join(Path(self.__api_base).parts[:2])
-            if _host.casefold() == "https://api.openai.com":
-                self.__ollama = None
-            else:
-                self.__ollama = Client(host=_host)
-
         except Exception as e:
             print(f"Exception in `LLM.__init__({kwargs=})`\n{e}")
             raise e
 
     def response(
-        self, messages: list[dict[str]], model: str | None = None, **kwargs
+        self,
+        messages: list[dict[str]],
+        model: str | None = None,
+        label: str | None = None,
+        **kwargs,
     ) -> str:
         """Get ChatCompletions text from LLM
 
         Args:
             messages (list[dict[str]]): Input messages
             model (str | None, optional): Name of Model or `None`. Defaults to None.
+            label (str | None, optional): What the request is for (e.g. a file name), recorded in `telemetry`. Defaults to None.
 
         Returns:
             str: Response content
@@ -86,16 +139,32 @@ class LLM:
         for k, v in kwargs.items():
             _inputs[k] = v
 
-        try:
-            response = self.__openai.chat.completions.create(**_inputs)
+        _key = self.__cache_key(_inputs)
+        if _key is not None and (cached := self.cache.get(_key)) is not None:
+            self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+            return cached
+
+        def request(endpoint: Endpoint) -> str:
+            start = perf_counter()
+            response = endpoint.openai.chat.completions.create(**_inputs)
 
             if _inputs["stream"]:
-                res_text = ""
-                for chunk in response:
-                    res_text += chunk.choices[0].delta.content or ""
+                res_text = "".join(
+                    chunk.choices[0].delta.content or ""
+                    for chunk in response
+                    if chunk.choices
+                )
+                self.__record(label, _inputs, start, endpoint, text=res_text)
             else:
                 res_text = response.choices[0].message.content
                 self.__update_token_usage(response=response)
+                self.__record(label, _inputs, start, endpoint, usage=response.usage)
+            return res_text
+
+        try:
+            res_text = self.__call(request, label, _inputs)
+            if _key is not None:
+                self.cache.set(_key, res_text)
             return res_text
         except Exception as e:
             print(f"Error encountered in `LLM.response({_inputs=})`")
@@ -107,6 +176,7 @@ class LLM:
         messages: list[dict[str]],
         response_model: Type[_StructuredOutput],
         model: str | None = None,
+        label: str | None = None,
     ) -> _StructuredOutput:
         """Chat with LLM to get structured response
 
@@ -114,6 +184,7 @@ class LLM:
             messages (list[dict[str]]): `system`, `user` and `assistant`(optional) messages to pass to LLM
             response_model (Type[_StructuredOutput]): Pydantic model for validation
             model (str | None, optional): Name of model. Defaults to model defined in config.toml.
+            label (str | None, optional): What the request is for, recorded in `telemetry`. Defaults to None.
 
         Returns:
             _StructuredOutput: Instance of `response_model`.
@@ -126,12 +197,710 @@ class LLM:
             "response_model": response_model,
             "temperature": 0,
         }
+        _key = self.__cache_key(_inputs, response_model=response_model)
+        if _key is not None and (cached := self.cache.get(_key)) is not None:
+            self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+            return response_model.model_validate(cached)
+
+        def request(endpoint: Endpoint) -> _StructuredOutput:
+            start = perf_counter()
+            resp, completion = (
+                endpoint.instructor.chat.completions.create_with_completion(**_inputs)
+            )
+            self.__record(label, _inputs, start, endpoint, usage=completion.usage)
+            return resp
+
         try:
-            return self.__instructor.chat.completions.create(**_inputs)
+            resp = self.__call(request, label, _inputs)
+            if _key is not None:
+                self.cache.set(_key, resp.model_dump(mode="json"))
+            return resp
         except Exception as e:
             print(f"Exception in `LLM.structured_response({_inputs=})`\n{e}")
             raise e
 
+    def __record(
+        self,
+        label: str | None,
+        inputs: dict,
+        start: float,
+        endpoint: Endpoint | None = None,
+        usage=None,
+        text: str | None = None,
+        completion_tokens: int = 0,
+        ttft: float | None = None,
+        ok: bool = True,
+    ) -> None:
+        """
+        Record a request in `telemetry`.
+
+        Token counts come from `usage` when the server reports it, otherwise they
+        are measured with tiktoken.
+
+        Args:
+            label (str | None): What the request was for.
+            inputs (dict): Request parameters.
+            start (float): `perf_counter()` when the request was sent.
+            endpoint (Endpoint | None, optional): The server the request was sent to. Defaults to None.
+            usage (CompletionUsage | None, optional): Token usage reported by the server. Defaults to None.
+            text (str | None, optional): Response text, measured if `usage` is missing. Defaults to None.
+            completion_tokens (int, optional): Completion tokens counted while streaming. Defaults to 0.
+            ttft (float | None, optional): Seconds to the first streamed token. Defaults to None.
+            ok (bool, optional): False if the request failed. Defaults to True.
+        """
+        latency = perf_counter() - start
+        if not ok:
+            self.telemetry.record(
+                label=label,
+                model=inputs["model"],
+                endpoint=str(endpoint) if endpoint else None,
+                latency=latency,
+                ok=False,
+            )
+            return
+        if usage is not None:
+            prompt_tokens = usage.prompt_tokens
+            completion_tokens = usage.completion_tokens
+        else:
+            prompt_tokens = sum(
+                count_tokens(m["content"])
+                for m in inputs["messages"]
+                if isinstance(m.get("content"), str)
+            )
+            if text is not None:
+                completion_tokens = count_tokens(text)
+        self.limiter.debit(completion_tokens)
+        self.telemetry.record(
+            label=label,
+            model=inputs["model"],
+            endpoint=str(endpoint) if endpoint else None,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency=latency,
+            ttft=ttft,
+        )
+
+    def __cache_key(
+        self, inputs: dict, response_model: type[BaseModel] | None = None
+    ) -> str | None:
+        """
+        Compute the response cache key of a request.
+
+        Args:
+            inputs (dict): Request parameters.
+            response_model (type[BaseModel] | None, optional): Pydantic model of a structured request. Defaults to None.
+
+        Returns:
+            str | None: The cache key, or None if caching is disabled.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.key(inputs, response_model=response_model)
+
+    def __estimate(self, inputs: dict) -> int:
+        """
+        Roughly estimate the prompt tokens of a request for the token rate limit.
+
+        Args:
+            inputs (dict): Request parameters.
+
+        Returns:
+            int: About four characters per token, 0 when tokens are not limited.
+        """
+        if self.limiter.tokens is None:
+            return 0
+        return (
+            sum(
+                len(m["content"])
+                for m in inputs["messages"]
+                if isinstance(m.get("content"), str)
+            )
+            // 4
+        )
+
+    def __retry_delay(
+        self, e: Exception, attempt: int, endpoint: Endpoint | None
+    ) -> float:
+        """
+        Get the delay before retrying a failed request.
+
+        Args:
+            e (Exception): The retryable error.
+            attempt (int): Number of attempts that failed so far.
+            endpoint (Endpoint | None): The endpoint the request failed on, None if none was available.
+
+        Returns:
+            float: `Retry-After` for rate limits (which also throttles every request), no delay when another
+                endpoint can take over, exponential backoff with jitter otherwise.
+        """
+        cause = api_error(e)
+        if isinstance(cause, CircuitOpen):
+            return cause.retry_in + backoff_delay(attempt)
+        wait = retry_after(e)
+        if isinstance(cause, RateLimitError):
+            wait = backoff_delay(attempt) if wait is None else wait
+            self.limiter.throttle(wait)
+            return wait
+        if endpoint is not None and not endpoint.healthy and self.pool.healthy:
+            return 0.0
+        return backoff_delay(attempt) if wait is None else wait
+
+    def __call(
+        self, request: Callable[[Endpoint], _T], label: str | None, inputs: dict
+    ) -> _T:
+        """
+        Run a blocking request on the least busy endpoint.
+
+        Transient errors are retried up to `retries` times (see `__retry_delay`).
+        A request that fails because of the server is re-queued on another
+        endpoint; an endpoint that also fails its health check is taken out of
+        the pool.
+
+        Args:
+            request (Callable[[Endpoint], _T]): Sends the request to an endpoint.
+            label (str | None): What the request is for.
+            inputs (dict): Request parameters.
+
+        Returns:
+            _T: The result of `request`.
+        """
+        attempt = 0
+        while True:
+            sleep(self.limiter.reserve(self.__estimate(inputs)))
+            endpoint = None
+            start = perf_counter()
+            try:
+                endpoint = self.pool.acquire_sync()
+                start = perf_counter()
+                result = request(endpoint)
+                self.pool.succeed(endpoint)
+                self.limiter.recover()
+                return result
+            except Exception as e:
+                attempt += 1
+                if endpoint is not None:
+                    self.__record(label, inputs, start, endpoint, ok=False)
+                if not is_retryable(e) or attempt > self.retries:
+                    raise e
+                if endpoint is not None and is_endpoint_error(e):
+                    self.pool.fail_sync(endpoint, e)
+                delay = self.__retry_delay(e, attempt, endpoint)
+                print(
+                    f"Retrying {label or 'request'} in {delay:.1f}s ({attempt}/{self.retries}): {e!r}"
+                )
+            finally:
+                if endpoint is not None:
+                    self.pool.release(endpoint)
+            sleep(delay)
+
+    async def __dispatch(
+        self,
+        request: Callable[[Endpoint], Awaitable[_T]],
+        label: str | None,
+        inputs: dict,
+    ) -> _T:
+        """
+        Run a request on the least busy endpoint, waiting for a free slot.
+
+        See `__call` for how failures are retried.
+
+        Args:
+            request (Callable[[Endpoint], Awaitable[_T]]): Sends the request to an endpoint.
+            label (str | None): What the request is for.
+            inputs (dict): Request parameters.
+
+        Returns:
+            _T: The result of `request`.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.reserve(self.__estimate(inputs)))
+            endpoint = None
+            start = perf_counter()
+            try:
+                endpoint = await self.pool.acquire()
+                start = perf_counter()
+                result = await request(endpoint)
+                self.pool.succeed(endpoint)
+                self.limiter.recover()
+                return result
+            except Exception as e:
+                attempt += 1
+                if endpoint is not None:
+                    self.__record(label, inputs, start, endpoint, ok=False)
+                if not is_retryable(e) or attempt > self.retries:
+                    raise e
+                if endpoint is not None and is_endpoint_error(e):
+                    await self.pool.fail(endpoint, e)
+                delay = self.__retry_delay(e, attempt, endpoint)
+                print(
+                    f"Retrying {label or 'request'} in {delay:.1f}s ({attempt}/{self.retries}): {e!r}"
+                )
+            finally:
+                if endpoint is not None:
+                    self.pool.release(endpoint)
+            await asyncio.sleep(delay)
+
+    async def aresponse(
+        self,
+        messages: list[dict[str]],
+        model: str | None = None,
+        label: str | None = None,
+        refresh: bool = False,
+        **kwargs,
+    ) -> str:
+        """Get ChatCompletions text from LLM without blocking the event loop.
+
+        At most `max_concurrency` requests are in flight per endpoint.
+
+        Args:
+            messages (list[dict[str]]): Input messages
+            model (str | None, optional): Name of Model or `None`. Defaults to None.
+            label (str | None, optional): What the request is for (e.g. a file name), recorded in `telemetry`. Defaults to None.
+            refresh (bool, optional): Skip the cache lookup and replace the cached response. Defaults to False.
+
+        Returns:
+            str: Response content
+        """
+        _inputs = {
+            "model": model or self.__model,
+            "messages": messages,
+            "stream": False,
+            "temperature": 0,
+        }
+        for k, v in kwargs.items():
+            _inputs[k] = v
+
+        _key = self.__cache_key(_inputs)
+        if (
+            _key is not None
+            and not refresh
+            and (cached := self.cache.get(_key)) is not None
+        ):
+            self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+            return cached
+
+        async def request(endpoint: Endpoint) -> str:
+            start = perf_counter()
+            response = await endpoint.aclients().openai.chat.completions.create(
+                **_inputs
+            )
+
+            if _inputs["stream"]:
+                parts: list[str] = []
+                async for chunk in response:
+                    if chunk.choices:
+                        parts.append(chunk.choices[0].delta.content or "")
+                res_text = "".join(parts)
+                self.__record(label, _inputs, start, endpoint, text=res_text)
+            else:
+                res_text = response.choices[0].message.content
+                self.__update_token_usage(response=response)
+                self.__record(label, _inputs, start, endpoint, usage=response.usage)
+            return res_text
+
+        try:
+            res_text = await self.__dispatch(request, label, _inputs)
+            if _key is not None:
+                self.cache.set(_key, res_text)
+            return res_text
+        except Exception as e:
+            print(f"Error encountered in `LLM.aresponse({_inputs=})`")
+            print(str(e))
+            raise e
+
+    async def astream(
+        self,
+        messages: list[dict[str]],
+        model: str | None = None,
+        label: str | None = None,
+        refresh: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """Stream ChatCompletions text from LLM as it is generated.
+
+        The request holds one of its endpoint's `max_concurrency` slots until the
+        stream is exhausted or closed. Close the iterator (e.g. `contextlib.aclosing`)
+        to abandon a generation early. A cached response is yielded in one piece.
+        A stream that fails with a transient error before the first piece is
+        retried like other requests; once pieces were yielded the error is raised.
+
+        Args:
+            messages (list[dict[str]]): Input messages
+            model (str | None, optional): Name of Model or `None`. Defaults to None.
+            label (str | None, optional): What the request is for (e.g. a file name), recorded in `telemetry`. Defaults to None.
+            refresh (bool, optional): Skip the cache lookup and replace the cached response. Defaults to False.
+
+        Yields:
+            str: Pieces of the response content
+        """
+        _inputs = {
+            "model": model or self.__model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "temperature": 0,
+        }
+        for k, v in kwargs.items():
+            _inputs[k] = v
+
+        _key = self.__cache_key(_inputs)
+        if (
+            _key is not None
+            and not refresh
+            and (cached := self.cache.get(_key)) is not None
+        ):
+            self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+            yield cached
+            return
+
+        # Only kept to fill the cache once the stream completes
+        parts: list[str] | None = [] if _key is not None else None
+        completion_tokens = 0
+        usage = None
+        ttft: float | None = None
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.reserve(self.__estimate(_inputs)))
+            endpoint = None
+            start = perf_counter()
+            try:
+                endpoint = await self.pool.acquire()
+                start = perf_counter()
+                response = await endpoint.aclients().openai.chat.completions.create(
+                    **_inputs
+                )
+                async with response:
+                    async for chunk in response:
+                        usage = chunk.usage or usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            if ttft is None:
+                                ttft = perf_counter() - start
+                            if usage is None:
+                                completion_tokens += count_tokens(content)
+                            if parts is not None:
+                                parts.append(content)
+                            yield content
+                self.pool.succeed(endpoint)
+                self.limiter.recover()
+                break
+            except Exception as e:
+                attempt += 1
+                if endpoint is not None:
+                    self.__record(label, _inputs, start, endpoint, ok=False)
+                if ttft is not None or not is_retryable(e) or attempt > self.retries:
+                    print(f"Error encountered in `LLM.astream({_inputs=})`")
+                    print(str(e))
+                    raise e
+                if endpoint is not None and is_endpoint_error(e):
+                    await self.pool.fail(endpoint, e)
+                delay = self.__retry_delay(e, attempt, endpoint)
+                print(
+                    f"Retrying {label or 'request'} in {delay:.1f}s ({attempt}/{self.retries}): {e!r}"
+                )
+            except BaseException:
+                # Closed early by the consumer or cancelled
+                if endpoint is not None:
+                    self.__record(label, _inputs, start, endpoint, ok=False)
+                raise
+            finally:
+                if endpoint is not None:
+                    self.pool.release(endpoint)
+            await asyncio.sleep(delay)
+
+        self.__record(
+            label,
+            _inputs,
+            start,
+            endpoint,
+            usage=usage,
+            completion_tokens=completion_tokens,
+            ttft=ttft,
+        )
+        if _key is not None:
+            self.cache.set(_key, "".join(parts))
+
+    async def astructured_response(
+        self,
+        messages: list[dict[str]],
+        response_model: Type[_StructuredOutput],
+        model: str | None = None,
+        label: str | None = None,
+        refresh: bool = False,
+        **kwargs,
+    ) -> _StructuredOutput:
+        """Chat with LLM to get structured response without blocking the event loop.
+
+        Args:
+            messages (list[dict[str]]): `system`, `user` and `assistant`(optional) messages to pass to LLM
+            response_model (Type[_StructuredOutput]): Pydantic model for validation
+            model (str | None, optional): Name of model. Defaults to model defined in config.toml.
+            label (str | None, optional): What the request is for, recorded in `telemetry`. Defaults to None.
+            refresh (bool, optional): Skip the cache lookup and replace the cached response. Defaults to False.
+            **kwargs: Additional request parameters, e.g. `temperature`.
+
+        Returns:
+            _StructuredOutput: Instance of `response_model`.
+        """
+
+        messages[-1]["content"] += ". return as JSON."
+        _inputs = {
+            "model": model or self.__model,
+            "messages": messages,
+            "response_model": response_model,
+            "temperature": 0,
+        }
+        for k, v in kwargs.items():
+            _inputs[k] = v
+
+        _key = self.__cache_key(_inputs, response_model=response_model)
+        if (
+            _key is not None
+            and not refresh
+            and (cached := self.cache.get(_key)) is not None
+        ):
+            self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+            return response_model.model_validate(cached)
+
+        async def request(endpoint: Endpoint) -> _StructuredOutput:
+            start = perf_counter()
+            (
+                resp,
+                completion,
+            ) = await endpoint.aclients().instructor.chat.completions.create_with_completion(
+                **_inputs
+            )
+            self.__record(label, _inputs, start, endpoint, usage=completion.usage)
+            return resp
+
+        try:
+            resp = await self.__dispatch(request, label, _inputs)
+            if _key is not None:
+                self.cache.set(_key, resp.model_dump(mode="json"))
+            return resp
+        except Exception as e:
+            print(f"Exception in `LLM.astructured_response({_inputs=})`\n{e}")
+            raise e
+
+    async def abatch(
+        self,
+        requests: dict[str, dict],
+        submitted: dict[str, str] = {},
+        on_submit: Callable[[dict[str, str]], None] | None = None,
+        poll_seconds: float = 30.0,
+    ) -> dict[str, str | BaseModel | Exception]:
+        """Send requests through the Batch API of the server and wait for their results.
+
+        Requests found in the response cache are not sent. The others are written
+        to a JSONL input file per model (a batch takes a single model), uploaded
+        and submitted to the least busy endpoint. The batches are then polled
+        every `poll_seconds` until they finish, and their results are cached.
+
+        Args:
+            requests (dict[str, dict]): Keyword arguments of `aresponse` (`messages`, `model`, `label`, `refresh`,
+                request parameters), with `response_model` for a structured response, keyed by request id.
+            submitted (dict[str, str], optional): Batches already submitted for these requests, e.g. by an
+                interrupted run, as base URL by batch id. They are polled instead of submitting again. Defaults to {}.
+            on_submit (Callable[[dict[str, str]], None] | None, optional): Called with the new batches each time
+                one is submitted, to save them. Defaults to None.
+            poll_seconds (float, optional): Seconds between status checks. Defaults to 30.0.
+
+        Returns:
+            dict[str, str | BaseModel | Exception]: The text, the `response_model` instance or the error of
+                every request.
+        """
+        results: dict[str, str | BaseModel | Exception] = {}
+        pending: dict[
+            str, tuple[dict, str | None, type[BaseModel] | None, str | None]
+        ] = {}
+        for custom_id, request in requests.items():
+            request = dict(request)
+            label = request.pop("label", None)
+            refresh = request.pop("refresh", False)
+            response_model = request.pop("response_model", None)
+            messages = [dict(message) for message in request.pop("messages")]
+            if response_model is not None:
+                # Same request, and cache key, as `astructured_response`
+                messages[-1]["content"] += ". return as JSON."
+            _inputs = {
+                "model": request.pop("model", None) or self.__model,
+                "messages": messages,
+                "temperature": 0,
+            }
+            for k, v in request.items():
+                _inputs[k] = v
+
+            _key = self.__cache_key(_inputs, response_model=response_model)
+            if (
+                _key is not None
+                and not refresh
+                and (cached := self.cache.get(_key)) is not None
+            ):
+                self.telemetry.record(label=label, model=_inputs["model"], cached=True)
+                results[custom_id] = (
+                    response_model.model_validate(cached)
+                    if response_model is not None
+                    else cached
+                )
+                continue
+            pending[custom_id] = (_inputs, _key, response_model, label)
+
+        if pending and not submitted:
+            by_model: dict[str, list[str]] = {}
+            for custom_id, (_inputs, *_) in pending.items():
+                by_model.setdefault(_inputs["model"], []).append(custom_id)
+
+            submitted = {}
+            for model, ids in by_model.items():
+                lines = []
+                for custom_id in ids:
+                    _inputs, _, response_model, _ = pending[custom_id]
+                    if response_model is not None:
+                        _inputs = json_mode(_inputs, response_model.model_json_schema())
+                    lines.append(batch_line(custom_id, _inputs))
+                data = "\n".join(lines).encode("utf-8") + b"\n"
+
+                async def submit(endpoint: Endpoint) -> tuple[str, str]:
+                    client = endpoint.aclients().openai
+                    upload = await client.files.create(
+                        file=("batch.jsonl", data), purpose="batch"
+                    )
+                    batch = await client.batches.create(
+                        input_file_id=upload.id,
+                        endpoint=BATCH_ENDPOINT,
+                        completion_window="24h",
+                    )
+                    return batch.id, endpoint.base_url
+
+                try:
+                    batch_id, url = await self.__dispatch(
+                        submit, f"batch of {len(ids)}", {"model": model, "messages": []}
+                    )
+                except Exception as e:
+                    print(
+                        f"Exception in `LLM.abatch` submitting {len(ids)} request(s) for {model}\n{e}"
+                    )
+                    raise e
+                print(f"Submitted batch {batch_id} of {len(ids)} request(s) to {url}")
+                submitted[batch_id] = url
+                # Saved one at a time, so an interruption before the next model loses none
+                if on_submit is not None:
+                    on_submit(submitted)
+
+        outputs: dict[str, dict | BatchError] = {}
+        # Where and how long each request ran, for `telemetry`
+        seconds: dict[str, float] = {}
+        served: dict[str, Endpoint] = {}
+        waiting = dict(submitted if pending else {})
+        shown: dict[str, str] = {}
+        while waiting:
+            for batch_id, url in list(waiting.items()):
+                endpoint = next(
+                    (e for e in self.pool.endpoints if e.base_url == url), None
+                )
+                if endpoint is None:
+                    raise ValueError(
+                        f"Batch {batch_id} was submitted to {url}, not to {self.__api_base}"
+                    )
+                client = endpoint.aclients().openai
+                try:
+                    batch = await client.batches.retrieve(batch_id)
+                    counts = batch.request_counts
+                    status = f"Batch {batch_id}: {batch.status}"
+                    if counts is not None and counts.total:
+                        status += (
+                            f" ({counts.completed + counts.failed}/{counts.total})"
+                        )
+                    if shown.get(batch_id) != status:
+                        print(status)
+                        shown[batch_id] = status
+                    if batch.status not in TERMINAL:
+                        continue
+                    for file_id in (batch.output_file_id, batch.error_file_id):
+                        if file_id:
+                            content = await client.files.content(file_id)
+                            for custom_id, output in parse_results(
+                                content.text
+                            ).items():
+                                outputs[custom_id] = output
+                                seconds[custom_id] = (
+                                    batch.completed_at or time()
+                                ) - batch.created_at
+                                served[custom_id] = endpoint
+                    del waiting[batch_id]
+                except Exception as e:
+                    if not is_retryable(e):
+                        print(
+                            f"Exception in `LLM.abatch` checking batch {batch_id}\n{e}"
+                        )
+                        raise e
+                    print(f"Could not check batch {batch_id}, trying again: {e!r}")
+            if waiting:
+                await asyncio.sleep(poll_seconds)
+
+        for custom_id, (_inputs, _key, response_model, label) in pending.items():
+            output = outputs.get(custom_id)
+            start = perf_counter() - seconds.get(custom_id, 0.0)
+            if output is None:
+                output = BatchError(f"{custom_id} is missing from the batch results")
+            if isinstance(output, BatchError):
+                self.__record(label, _inputs, start, served.get(custom_id), ok=False)
+                results[custom_id] = output
+                continue
+            completion = ChatCompletion.model_validate(output)
+            text = completion.choices[0].message.content or ""
+            try:
+                value = (
+                    response_model.model_validate_json(extract_json(text))
+                    if response_model is not None
+                    else text
+                )
+            except ValidationError as e:
+                self.__record(label, _inputs, start, served.get(custom_id), ok=False)
+                results[custom_id] = e
+                continue
+            self.__record(
+                label,
+                _inputs,
+                start,
+                served[custom_id],
+                usage=completion.usage,
+                text=text,
+            )
+            if _key is not None:
+                self.cache.set(
+                    _key,
+                    value.model_dump(mode="json")
+                    if response_model is not None
+                    else value,
+                )
+            results[custom_id] = value
+        return results
+
+    async def amodels(self) -> list[str]:
+        """
+        Get a list of available models from the language model API without blocking the event loop.
+
+        Returns:
+            list[str]: A list of model names.
+        """
+
+        async def request(endpoint: Endpoint) -> list[str]:
+            return [x.id async for x in endpoint.aclients().openai.models.list()]
+
+        try:
+            return await self.__dispatch(request, "models", {"model": self.__model})
+        except Exception as e:
+            print(f"Exception in `LLM.amodels`\n{e}")
+            raise e
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled async HTTP clients. They are recreated on the next async call.
+        """
+        await self.pool.aclose()
+
     @cached_property
     def models(self) -> list[str]:
         """
@@ -141,7 +910,11 @@ class LLM:
             list[str]: A list of model names.
         """
         try:
-            return [x.id for x in self.__openai.models.list().data]
+            return self.__call(
+                lambda endpoint: [x.id for x in endpoint.openai.models.list().data],
+                "models",
+                {"model": self.__model},
+            )
         except Exception as e:
             print("Exception in `LLM.models`\n{e}")
             raise e
@@ -153,47 +926,121 @@ class LLM:
         Args:
             response (ChatCompletion): The response from the language model containing token usage information.
         """
+        if response.usage is None:
+            return
         self.last_completion = {
-            "prompt": response.usage.completion_tokens,
-            "completion": response.usage.prompt_tokens,
+            "prompt": response.usage.prompt_tokens,
+            "completion": response.usage.completion_tokens,
         }
 
-    def msg(self, user_content: str) -> list[dict[str]]:
+    def msg(self, user_content: str, system: str | None = None) -> list[dict[str]]:
         """
         Create a message structure for the language model.
 
         Args:
             user_content (str): The content of the user's message.
+            system (str | None, optional): System message for this request only. Defaults to `SYSTEM`.
 
         Returns:
             list[dict[str]]: A structured message list ready to be sent to the language model.
         """
         return [
-            {"role": "system", "content": self.SYSTEM},
+            {"role": "system", "content": system or self.SYSTEM},
             {"role": "user", "content": user_content},
         ]
 
-    def unload_all(self) -> None:
+    def unload_all(self, models: list[str] | None = None) -> None:
         """
-        Unload all models from the language model API to free up resources.
+        Unload models from every endpoint to free up resources.
+
+        Args:
+            models (list[str] | None, optional): Models to unload, None for every loaded model. Defaults to None.
         """
-        for model in self.loaded_models:
-            self.__ollama.chat(
-                model=model, messages=[{"role": "user", "content": ""}], keep_alive=0
-            )
+        for endpoint in self.pool.endpoints:
+            if endpoint.ollama is None:
+                continue
+            for modelinfo in endpoint.ollama.ps().models:
+                if models is not None and modelinfo.model not in models:
+                    continue
+                endpoint.ollama.chat(
+                    model=modelinfo.model,
+                    messages=[{"role": "user", "content": ""}],
+                    keep_alive=0,
+                )
         return
 
+    async def aload(self, models: list[str] | None = None) -> None:
+        """
+        Load models on every healthy Ollama endpoint so the first requests do not pay for a cold start.
+
+        Models stay loaded for `keep_alive`. Requests through the OpenAI-compatible API apply the
+        server's default keep-alive again, so call this once more after a run to keep the models
+        loaded for the next one. Endpoints that are not Ollama servers are skipped and failures
+        are only reported: a model that could not be loaded is loaded by its first request.
+
+        Args:
+            models (list[str] | None, optional): Models to load. Defaults to the default model.
+        """
+        models = models or [self.__model]
+
+        async def load(endpoint: Endpoint, model: str) -> None:
+            start = perf_counter()
+            try:
+                await asyncio.to_thread(
+                    endpoint.ollama.generate, model=model, keep_alive=self.keep_alive
+                )
+            except Exception as e:
+                print(f"Could not load {model} on {endpoint}: {e!r}")
+                return
+            print(f"Loaded {model} on {endpoint} in {perf_counter() - start:.1f}s")
+
+        endpoints = [e for e in self.pool.healthy if e.ollama is not None]
+        await asyncio.gather(*(load(e, m) for e in endpoints for m in models))
+
+        for endpoint in endpoints:
+            try:
+                resident = {m.model for m in endpoint.ollama.ps().models}
+            except Exception:
+                continue
+            missing = [m for m in models if m not in resident]
+            if missing and len(models) > 1:
+                # e.g. OLLAMA_MAX_LOADED_MODELS=1: the models will evict each other
+                print(
+                    f"{endpoint} cannot keep {', '.join(missing)} loaded alongside the other models"
+                )
+
+    async def aunload(self, models: list[str] | None = None) -> None:
+        """
+        Unload models from every endpoint without blocking the event loop.
+
+        Args:
+            models (list[str] | None, optional): Models to unload, None for every loaded model. Defaults to None.
+        """
+        try:
+            await asyncio.to_thread(self.unload_all, models)
+        except Exception as e:
+            print(f"Exception in `LLM.aunload({models=})`\n{e}")
+
     @property
     def loaded_models(self) -> list[str]:
         """
-        Get a list of currently loaded models in the language model API.
+        Get a list of currently loaded models on the healthy endpoints.
 
         Returns:
             list[str]: A list of model names.
         """
-        if self.__ollama is not None:
-            return [modelinfo.model for modelinfo in self.__ollama.ps().models]
-        return []
+        loaded: dict[str, None] = {}
+        for endpoint in self.pool.healthy:
+            if endpoint.ollama is not None:
+                loaded.update(
+                    (modelinfo.model, None) for modelinfo in endpoint.ollama.ps().models
+                )
+        return list(loaded)
+
+    @property
+    def model(self) -> str:
+        """str: Name of the default model."""
+        return self.__model
 
     def __str__(self) -> str:
         return f"LLM(api_base={self.__api_base}, model={self.__model})"
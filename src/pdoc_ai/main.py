@@ -1,7 +1,1035 @@
+import asyncio
+from contextlib import aclosing
+from dataclasses import asdict
 from pathlib import Path
+from textwrap import dedent
+from time import perf_counter, time
+from typing import Literal
 from pdoc_ai.llm import LLM
 from pathlib import Path
-from .ingester import generate_system
+from pydantic import BaseModel
+
+from .batch import BatchState
+from .cache import open_cache
+from .chunking import chunk_budget, context_size, split_source
+from .ingester import (
+    ContextCache,
+    PrunedContext,
+    build_import_graph,
+    generate_system,
+    module_stub,
+)
+from .manifest import Manifest, changed_since, file_hash
+from .schedule import break_cycles, completion_tokens, largest_first
+from .splice import Docstrings, Symbol, find_undocumented, splice_docstrings
+from .streaming import CodeStreamWriter, StreamStats
+from .summary import RunSummary
+from .tokens import count_tokens, truncate_to_tokens
+from .verify import VerificationError, verify_file
+
+
+def _relpath(package: Path, file: Path) -> str:
+    """Get the path of a file relative to the package root.
+
+    Args:
+        package (Path): The package root.
+        file (Path): A file inside the package.
+
+    Returns:
+        str: The relative path with `/` separators.
+    """
+    return file.resolve().relative_to(package.resolve()).as_posix()
+
+
+def _join_chunks(parts: list[str]) -> str:
+    """Join the rewritten chunks of a file.
+
+    Args:
+        parts (list[str]): The responses, in source order.
+
+    Returns:
+        str: The file, each chunk without its code fence and ending in a newline.
+    """
+    parts = [_strip_fence(part) for part in parts]
+    return "".join(part if part.endswith("\n") else f"{part}\n" for part in parts)
+
+
+def _strip_fence(resp: str) -> str:
+    """Remove the markdown code fence the model may wrap code in.
+
+    Args:
+        resp (str): The model response.
+
+    Returns:
+        str: The response without the opening and closing fence lines.
+    """
+    if resp.strip().startswith("```"):
+        resp = "\n".join(resp.strip().split("\n")[1:-1])
+    return resp
+
+
+class Documenter:
+    """Generates documented copies (`nosync_*.py`) of the files of a package.
+
+    Attributes:
+        package (Path): The root directory of the package.
+        llm (LLM): Client used for every request.
+        mode (Literal["rewrite", "docstrings"]): How docstrings are generated, see `document`.
+        pruned (PrunedContext | None): Per-file context in `pruned` context mode, None in `package` mode.
+        context_tokens (int): Token budget of the per-file context in `pruned` mode.
+        context_size (int | None): Context window of the model, used to split oversized files; None if unknown.
+        context_sizes (dict[str, int]): Context window per model name, overriding the built-in table.
+        routes (dict[str, int]): Largest file (tokens) each alternative model documents, see `route`.
+        verify (bool): Check every documented file against its source, see `verify.verify`.
+        verify_retries (int): Requests made again for a file that fails verification.
+        order (Literal["largest", "dependencies"]): Order files are started in, see `schedule`.
+        imports (dict[str, set[str]]): Files imported by each file, without cycles, in `dependencies` order.
+        documented (dict[str, str]): Documented source of each finished file, in `dependencies` order.
+        stream (bool): Stream rewritten files straight to disk.
+        stall_seconds (float): Warn when a stream produces no tokens for this long.
+        stream_stats (dict[Path, StreamStats]): Timing of each streamed file.
+        retried (dict[Path, int]): Files that were requested again after failing verification, and how often.
+    """
+
+    USER_MSG: str = """
+    Rewrite the contents of `File: {}` to include documentation comments (docstrings).
+    Ensure that all docstrings are in google format.
+    Do not change any other part of the code.
+    Output only the contents of the file, do not add any additional text. Do not add any explainations.
+    """
+
+    # Dedented, so the chunk's own indentation reaches the model unchanged
+    CHUNK_MSG: str = dedent("""
+    Below is part {} of {} of `File: {}`.
+    Rewrite this part to include documentation comments (docstrings).
+    Ensure that all docstrings are in google format.
+    Do not change any other part of the code.
+    Output only the contents of this part, do not add any additional text. Do not add any explainations.
+
+    ```python
+    {}
+    ```
+    """)
+
+    RETRY_TEMPERATURE: float = 0.3
+    """Temperature added per verification retry, so the model does not repeat the same output."""
+
+    DOCSTRINGS_MSG: str = """
+    Write documentation comments (docstrings) for the following symbols of `File: {}`:
+    {}
+    Ensure that all docstrings are in google format.
+    Return one entry per symbol, using the symbol name exactly as listed.
+    """
+
+    def __init__(
+        self,
+        package: Path,
+        llm: LLM,
+        include_patterns: list[str] = [],
+        exclude_patterns: list[str] = [],
+        mode: Literal["rewrite", "docstrings"] = "rewrite",
+        context_mode: Literal["package", "pruned"] = "package",
+        context_tokens: int = 8000,
+        context_sizes: dict[str, int] = {},
+        stream: bool = False,
+        stall_seconds: float = 30.0,
+        context_cache: ContextCache | None = None,
+        routes: dict[str, int] = {},
+        verify: bool = True,
+        verify_retries: int = 2,
+        order: Literal["largest", "dependencies"] = "largest",
+    ) -> None:
+        """
+        Ingest the package and prepare the system message.
+
+        Args:
+            package (Path): The root directory of the package.
+            llm (LLM): Client used for every request.
+            include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+            exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
+            mode (Literal["rewrite", "docstrings"], optional): How docstrings are generated. Defaults to "rewrite".
+            context_mode (Literal["package", "pruned"], optional): Context sent with each request. Defaults to "package".
+            context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+            context_sizes (dict[str, int], optional): Context window per model name. Defaults to {}.
+            stream (bool, optional): Stream rewritten files straight to disk. Defaults to False.
+            stall_seconds (float, optional): Warn when a stream produces no tokens for this long. Defaults to 30.0.
+            context_cache (ContextCache | None, optional): Cache the `package` context is built with. Defaults to one kept in memory only.
+            routes (dict[str, int], optional): Largest file (tokens) each alternative model documents,
+                e.g. `{"general_small": 1000}`. Defaults to {}.
+            verify (bool, optional): Check every documented file against its source. Defaults to True.
+            verify_retries (int, optional): Requests made again for a file that fails verification. Defaults to 2.
+            order (Literal["largest", "dependencies"], optional): Order files are started in. Defaults to "largest".
+        """
+        if context_mode not in ("package", "pruned"):
+            raise ValueError(f"Unknown {context_mode=}, expected 'package' or 'pruned'")
+        if mode not in ("rewrite", "docstrings"):
+            raise ValueError(f"Unknown {mode=}, expected 'rewrite' or 'docstrings'")
+        if order not in ("largest", "dependencies"):
+            raise ValueError(f"Unknown {order=}, expected 'largest' or 'dependencies'")
+
+        self.package = Path(package)
+        self.llm = llm
+        self.mode = mode
+        self.context_tokens = context_tokens
+        self.context_size = context_size(llm.model, overrides=context_sizes)
+        self.context_sizes = context_sizes
+        self.routes = routes
+        self.verify = verify
+        self.verify_retries = max(0, verify_retries)
+        self.order = order
+        self.imports: dict[str, set[str]] = {}
+        self.documented: dict[str, str] = {}
+        self.stream = stream
+        self.stall_seconds = stall_seconds
+        self.stream_stats: dict[Path, StreamStats] = {}
+        self.pruned: PrunedContext | None = None
+        self.__system_tokens: int | None = None
+        self.__routed: dict[Path, str] = {}
+        self.retried: dict[Path, int] = {}
+
+        self.__include_patterns = include_patterns
+        self.__exclude_patterns = exclude_patterns
+        self.__context_cache = context_cache or ContextCache(directory=None)
+        if context_mode == "pruned":
+            self.pruned = PrunedContext(
+                package=self.package,
+                include_patterns=include_patterns,
+                exclude_patterns=exclude_patterns,
+            )
+        else:
+            self.llm.SYSTEM = generate_system(
+                package=self.package,
+                include_patterns=include_patterns,
+                exclude_patterns=exclude_patterns,
+                cache=self.__context_cache,
+            )
+        self.__link()
+
+    def __link(self) -> None:
+        """Build `imports` in `dependencies` order."""
+        if self.order != "dependencies":
+            return
+        if self.pruned is not None:
+            imports = self.pruned.imports
+        else:
+            # Docstrings are stripped, the imports are all the graph needs
+            records = self.__context_cache.files(
+                self.package,
+                include_patterns=self.__include_patterns,
+                exclude_patterns=self.__exclude_patterns,
+            )
+            imports = build_import_graph(
+                self.package, {record.relpath: record.stripped for record in records}
+            )
+        self.imports = break_cycles(imports)
+
+    def refresh(self, changed: list[Path]) -> None:
+        """Bring the context up to date after files of the package changed.
+
+        Only the changed files are read again: `package` mode rebuilds the system
+        message from the context cache, `pruned` mode updates the sources and
+        import graph of those files.
+
+        Args:
+            changed (list[Path]): Files that were modified, added or removed.
+        """
+        if self.pruned is None:
+            # Release the outdated message before building its replacement
+            self.llm.SYSTEM = ""
+            self.llm.SYSTEM = generate_system(
+                package=self.package,
+                include_patterns=self.__include_patterns,
+                exclude_patterns=self.__exclude_patterns,
+                cache=self.__context_cache,
+            )
+            self.__system_tokens = None
+        else:
+            self.pruned.update(
+                {
+                    _relpath(self.package, file): (
+                        file.read_text(encoding="utf-8", errors="replace")
+                        if file.is_file()
+                        else None
+                    )
+                    for file in changed
+                }
+            )
+        for file in changed:
+            self.__routed.pop(file, None)
+            self.documented.pop(_relpath(self.package, file), None)
+        self.__link()
+
+    def name(self, filepath: Path) -> str:
+        """Get the name a file is shown and referred to with.
+
+        Args:
+            filepath (Path): A file of the package.
+
+        Returns:
+            str: The path of the file with the package directory removed.
+        """
+        return str(filepath).replace(str(self.package), "")
+
+    def system(self, filepath: Path, full_target: bool = True) -> str | None:
+        """Get the system message for a file.
+
+        Args:
+            filepath (Path): A file of the package.
+            full_target (bool, optional): Include the whole file rather than its stub in `pruned` mode. Defaults to True.
+
+        Returns:
+            str | None: The per-file system message in `pruned` mode, or in `package` mode once modules
+                the file imports are documented in `dependencies` order; None to use `LLM.SYSTEM`.
+        """
+        if self.pruned is None:
+            return self.__documented_system(_relpath(self.package, filepath))
+        return self.pruned.system(
+            _relpath(self.package, filepath),
+            token_budget=self.context_tokens,
+            full_target=full_target,
+        )
+
+    def __documented_system(self, relpath: str) -> str | None:
+        """Add the stubs of the documented modules a file imports to the package-wide system message.
+
+        Args:
+            relpath (str): Package-relative path of the file.
+
+        Returns:
+            str | None: The system message, None if none of the imported modules is documented yet.
+        """
+        blocks = [
+            f"FILE: {dep}\n{stub}\n"
+            for dep in sorted(self.imports.get(relpath, ()))
+            if dep in self.documented and (stub := module_stub(self.documented[dep]))
+        ]
+        if not blocks:
+            return None
+        documented = truncate_to_tokens("\n".join(blocks), self.context_tokens)
+        return f"""{self.llm.SYSTEM}
+Given below are the documented stubs of the modules `{relpath}` imports.
+<DOCUMENTED_MODULES>
+{documented}
+</DOCUMENTED_MODULES>
+"""
+
+    def documented_by(self, filepath: Path, output: Path) -> None:
+        """Use the docstrings of a documented file in the context of the files importing it.
+
+        Only used in `dependencies` order, where those files start later.
+
+        Args:
+            filepath (Path): A file of the package.
+            output (Path): Its documented copy.
+        """
+        if self.order != "dependencies":
+            return
+        relpath = _relpath(self.package, filepath)
+        self.documented[relpath] = output.read_text(encoding="utf-8", errors="replace")
+        if self.pruned is not None:
+            # Neighbour stubs are built from `sources`
+            self.pruned.sources[relpath] = self.documented[relpath]
+
+    def schedule(self, files: list[Path]) -> list[Path]:
+        """Order files so the longest work starts first.
+
+        Files are ranked by an estimate of the tokens the model generates for
+        them. In `dependencies` order, a file is ranked by the longest chain of
+        files waiting for it instead, as the files importing it only start once
+        it is done.
+
+        Args:
+            files (list[Path]): Files to document.
+
+        Returns:
+            list[Path]: The files in the order they are started.
+        """
+        relpaths = {_relpath(self.package, file): file for file in files}
+        costs = {relpath: self.__cost(file) for relpath, file in relpaths.items()}
+        imports = self.imports if self.order == "dependencies" else None
+        return [relpaths[relpath] for relpath in largest_first(costs, imports)]
+
+    def __cost(self, filepath: Path) -> int:
+        """Estimate the completion tokens of a file, from its size if it cannot be read or parsed."""
+        try:
+            return completion_tokens(filepath.read_text(encoding="utf-8"), self.mode)
+        except Exception:
+            # The file fails again when documented, and is reported there on its own
+            try:
+                return filepath.stat().st_size
+            except OSError:
+                return 0
+
+    def system_tokens(self, system: str | None) -> int:
+        """Count the tokens of a system message.
+
+        Args:
+            system (str | None): A message from `Documenter.system`.
+
+        Returns:
+            int: Number of tokens. The shared package-wide message is only measured once.
+        """
+        if system is not None and (
+            self.pruned is not None or not system.startswith(self.llm.SYSTEM)
+        ):
+            return count_tokens(system)
+        if self.__system_tokens is None:
+            self.__system_tokens = count_tokens(self.llm.SYSTEM)
+        # Documented modules appended in `dependencies` order
+        extra = system[len(self.llm.SYSTEM) :] if system is not None else ""
+        return self.__system_tokens + (count_tokens(extra) if extra else 0)
+
+    def retry_options(self, attempt: int) -> dict:
+        """Get the request options of a verification retry.
+
+        Retries sample at a higher temperature and bypass the response cache, so
+        neither the model nor the cache repeats the output that failed.
+
+        Args:
+            attempt (int): Verification retries so far, 0 for the first request.
+
+        Returns:
+            dict: `temperature` and `refresh` keyword arguments of the `LLM` requests.
+        """
+        return {
+            "temperature": min(self.RETRY_TEMPERATURE * attempt, 1.0),
+            "refresh": attempt > 0,
+        }
+
+    def route(self, filepath: Path) -> str:
+        """Pick the model a file is documented with.
+
+        A file goes to the routed model with the smallest limit it fits under,
+        provided its request also fits that model's context; any other file goes
+        to the default model.
+
+        Args:
+            filepath (Path): A file of the package.
+
+        Returns:
+            str: Name of the model.
+        """
+        if not self.routes:
+            return self.llm.model
+        if filepath not in self.__routed:
+            model = self.llm.model
+            try:
+                tokens = count_tokens(filepath.read_text(encoding="utf-8"))
+            except (OSError, UnicodeDecodeError):
+                # The file fails again when documented, and is reported there on its own
+                self.__routed[filepath] = model
+                return model
+            prompt = self.system_tokens(self.system(filepath)) + count_tokens(
+                self.USER_MSG
+            )
+            for name, limit in sorted(self.routes.items(), key=lambda route: route[1]):
+                budget = chunk_budget(
+                    context_size(name, overrides=self.context_sizes), prompt
+                )
+                if tokens <= limit and (budget is None or tokens <= budget):
+                    model = name
+                    break
+            self.__routed[filepath] = model
+        return self.__routed[filepath]
+
+    async def stream_to(
+        self,
+        messages: list[dict[str]],
+        output: Path,
+        name: str,
+        model: str | None = None,
+        attempt: int = 0,
+    ) -> StreamStats:
+        """Stream a rewritten file straight to disk.
+
+        The response goes through a buffered writer as it arrives, so memory stays
+        bounded however long the file is. A response that does not start with code
+        is abandoned immediately and the partial output removed.
+
+        Args:
+            messages (list[dict[str]]): The request.
+            output (Path): File to write.
+            name (str): Name of the file in progress messages.
+            model (str | None, optional): Model to use. Defaults to the default model.
+            attempt (int, optional): Verification retries so far, see `retry_options`. Defaults to 0.
+
+        Returns:
+            StreamStats: Time to first token and generation speed.
+        """
+        stats = StreamStats(started=perf_counter())
+
+        async def watchdog() -> None:
+            while True:
+                await asyncio.sleep(self.stall_seconds)
+                idle = perf_counter() - (stats.last or stats.started)
+                if idle >= self.stall_seconds:
+                    print(f"No tokens for {name} in the last {idle:.0f}s")
+
+        _watchdog = asyncio.create_task(watchdog())
+        try:
+            with open(output, "w", buffering=1 << 16) as f:
+                writer = CodeStreamWriter(f)
+                async with aclosing(
+                    self.llm.astream(
+                        messages=messages,
+                        model=model,
+                        label=name,
+                        **self.retry_options(attempt),
+                    )
+                ) as chunks:
+                    async for chunk in chunks:
+                        stats.record(count_tokens(chunk))
+                        writer.write(chunk)
+                writer.close()
+        except BaseException:
+            output.unlink(missing_ok=True)
+            raise
+        finally:
+            _watchdog.cancel()
+        stats.finish()
+        return stats
+
+    def rewrite_messages(self, filepath: Path) -> list[list[dict[str]]]:
+        """Build the requests that rewrite a file with docstrings.
+
+        Files too large for the model's context are split at top-level
+        definitions and sent as one request per chunk. Files are sent whole if
+        the model's context is unknown, or too small for chunks to help.
+
+        Args:
+            filepath (Path): A file of the package.
+
+        Returns:
+            list[list[dict[str]]]: One request for the whole file, or one per chunk in source order.
+        """
+        _str_filepath = self.name(filepath)
+        source = filepath.read_text(encoding="utf-8")
+        # The chunks carry the code, so the context only needs the file's stub
+        system = self.system(filepath, full_target=False)
+        prompt = self.system_tokens(system) + count_tokens(self.CHUNK_MSG)
+        budget = chunk_budget(self.context_size, prompt)
+        if budget is None:
+            if self.context_size is not None:
+                print(
+                    f"Warning: the context of {_str_filepath} ({prompt} tokens) leaves no room for chunks in"
+                    f" the context window of {self.llm.model} ({self.context_size} tokens); sending the file whole"
+                )
+            chunks = [source]
+        else:
+            chunks = split_source(source, budget)
+
+        if len(chunks) == 1:
+            return [
+                self.llm.msg(
+                    user_content=self.USER_MSG.format(_str_filepath),
+                    system=self.system(filepath),
+                )
+            ]
+        return [
+            self.llm.msg(
+                user_content=self.CHUNK_MSG.format(
+                    idx, len(chunks), _str_filepath, chunk
+                ),
+                system=system,
+            )
+            for idx, chunk in enumerate(chunks, start=1)
+        ]
+
+    def docstrings_messages(
+        self, filepath: Path, symbols: list[Symbol]
+    ) -> list[dict[str]]:
+        """Build the request for the missing docstrings of a file.
+
+        Args:
+            filepath (Path): A file of the package.
+            symbols (list[Symbol]): The undocumented symbols of the file.
+
+        Returns:
+            list[dict[str]]: The request.
+        """
+        _listing = "\n".join(f"    - `{s.name}` ({s.kind})" for s in symbols)
+        return self.llm.msg(
+            user_content=self.DOCSTRINGS_MSG.format(self.name(filepath), _listing),
+            system=self.system(filepath),
+        )
+
+    async def rewrite(self, filepath: Path, output: Path, attempt: int = 0) -> None:
+        """Ask the model to reprint a file with docstrings.
+
+        Chunked files (see `rewrite_messages`) are documented concurrently by the
+        default model and joined in order. Other files go to the model picked by
+        `route` and are streamed to `output` when `stream` is set.
+
+        Args:
+            filepath (Path): A file of the package.
+            output (Path): File to write the documented source to.
+            attempt (int, optional): Verification retries so far, see `retry_options`. Defaults to 0.
+        """
+        _str_filepath = self.name(filepath)
+        requests = self.rewrite_messages(filepath)
+
+        if len(requests) == 1:
+            model = self.route(filepath)
+            if self.stream:
+                self.stream_stats[filepath] = await self.stream_to(
+                    requests[0], output, _str_filepath, model=model, attempt=attempt
+                )
+                return
+            resp = await self.llm.aresponse(
+                messages=requests[0],
+                model=model,
+                label=_str_filepath,
+                **self.retry_options(attempt),
+            )
+            with open(output, "w") as f:
+                f.write(_strip_fence(resp))
+            return
+
+        print(f"Splitting {_str_filepath} into {len(requests)} chunks")
+
+        parts = await asyncio.gather(
+            *(
+                self.llm.aresponse(
+                    messages=messages,
+                    label=f"{_str_filepath}#{idx}",
+                    **self.retry_options(attempt),
+                )
+                for idx, messages in enumerate(requests, start=1)
+            )
+        )
+        with open(output, "w") as f:
+            f.write(_join_chunks(parts))
+
+    async def docstrings(self, filepath: Path, attempt: int = 0) -> str:
+        """Ask the model for the missing docstrings of a file and splice them into the source.
+
+        Args:
+            filepath (Path): A file of the package.
+            attempt (int, optional): Verification retries so far, see `retry_options`. Defaults to 0.
+
+        Returns:
+            str: The documented source.
+        """
+        source = filepath.read_text(encoding="utf-8")
+        symbols = find_undocumented(source)
+        if not symbols:
+            return source
+
+        resp = await self.llm.astructured_response(
+            messages=self.docstrings_messages(filepath, symbols),
+            response_model=Docstrings,
+            model=self.route(filepath),
+            label=self.name(filepath),
+            **self.retry_options(attempt),
+        )
+        return splice_docstrings(
+            source, symbols, {d.name: d.docstring for d in resp.docstrings}
+        )
+
+    async def document_file(self, filepath: Path) -> Path:
+        """Document a file and write the result next to it.
+
+        With `verify`, the result is checked against the source and requested
+        again, up to `verify_retries` times, if its code differs. An output that
+        still fails is removed.
+
+        Args:
+            filepath (Path): A file of the package.
+
+        Returns:
+            Path: The generated `nosync_*.py` file.
+
+        Raises:
+            VerificationError: If the last output does not parse or changed the code.
+        """
+        _str_filepath = self.name(filepath)
+        print(f"Generating docstrings for {_str_filepath}")
+        new_filepath = filepath.with_stem(f"nosync_{filepath.stem}")
+        for attempt in range(self.verify_retries + 1):
+            if self.mode == "docstrings":
+                resp = await self.docstrings(filepath, attempt=attempt)
+                with open(new_filepath, "w") as f:
+                    f.write(resp)
+            else:
+                await self.rewrite(filepath, new_filepath, attempt=attempt)
+            if not self.verify:
+                break
+            try:
+                verify_file(filepath, new_filepath)
+                break
+            except VerificationError as e:
+                if attempt == self.verify_retries:
+                    new_filepath.unlink(missing_ok=True)
+                    raise VerificationError(
+                        f"{e} (after {attempt + 1} attempt(s))"
+                    ) from e
+                self.retried[filepath] = attempt + 1
+                print(
+                    f"Retrying {_str_filepath} ({attempt + 1}/{self.verify_retries}): {e}"
+                )
+        return new_filepath
+
+    async def run(
+        self,
+        files: list[Path],
+        summary: RunSummary,
+        manifest: Manifest | None = None,
+        hashes: dict[Path, str] = {},
+    ) -> None:
+        """Document files concurrently, up to `LLM.max_concurrency` at a time.
+
+        Files are started in the order of `schedule`, which the endpoint pool
+        keeps when requests queue for a free slot. In `dependencies` order a file
+        also waits until the files it imports are done, failed or not.
+
+        Each file is written as soon as its response arrives; a failing file is
+        recorded in `summary` and the remaining files carry on.
+
+        Args:
+            files (list[Path]): Files to document.
+            summary (RunSummary): Collects the succeeded and failed files.
+            manifest (Manifest | None, optional): Records each documented file. Defaults to None.
+            hashes (dict[Path, str], optional): Source hashes recorded in `manifest`. Defaults to {}.
+        """
+        files = self.schedule(files)
+        done = {_relpath(self.package, file): asyncio.Event() for file in files}
+
+        async def run_file(filepath: Path) -> None:
+            relpath = _relpath(self.package, filepath)
+            for dep in self.imports.get(relpath, ()):
+                if dep in done:
+                    await done[dep].wait()
+            try:
+                new_filepath = await self.document_file(filepath)
+                self.documented_by(filepath, new_filepath)
+                self.__succeeded(
+                    filepath, new_filepath, len(files), summary, manifest, hashes
+                )
+            except Exception as e:
+                self.__failed(filepath, e, len(files), summary)
+            finally:
+                done[relpath].set()
+
+        try:
+            await asyncio.gather(*(run_file(file) for file in files))
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+    def __succeeded(
+        self,
+        filepath: Path,
+        output: Path,
+        total: int,
+        summary: RunSummary,
+        manifest: Manifest | None,
+        hashes: dict[Path, str],
+    ) -> None:
+        """Record a documented file in the summary and the manifest and report progress.
+
+        Args:
+            filepath (Path): A file of the package.
+            output (Path): Its documented copy.
+            total (int): Files in the run.
+            summary (RunSummary): Summary of the run.
+            manifest (Manifest | None): Records the documented file.
+            hashes (dict[Path, str]): Source hashes recorded in `manifest`.
+        """
+        _str_filepath = self.name(filepath)
+        if manifest is not None:
+            manifest.record(
+                _relpath(self.package, filepath),
+                hashes.get(filepath) or file_hash(filepath),
+                output,
+            )
+        summary.succeeded.append(_str_filepath)
+        if filepath in self.retried:
+            summary.retried[_str_filepath] = self.retried[filepath]
+        _done = len(summary.succeeded) + len(summary.failed)
+        _stats = ""
+        if filepath in self.stream_stats:
+            summary.streams[_str_filepath] = self.stream_stats[filepath]
+            _stats = f" ({self.stream_stats[filepath]})"
+        print(f"[{_done}/{total}] Documented {_str_filepath}{_stats}")
+
+    def __failed(
+        self, filepath: Path, error: Exception, total: int, summary: RunSummary
+    ) -> None:
+        """Record a file that could not be documented and report progress.
+
+        Args:
+            filepath (Path): A file of the package.
+            error (Exception): Why it failed.
+            total (int): Files in the run.
+            summary (RunSummary): Summary of the run.
+        """
+        _str_filepath = self.name(filepath)
+        summary.failed[_str_filepath] = str(error) or repr(error)
+        if filepath in self.retried:
+            summary.retried[_str_filepath] = self.retried[filepath]
+        _done = len(summary.succeeded) + len(summary.failed)
+        print(f"[{_done}/{total}] Failed {_str_filepath}: {error!r}")
+
+    def batch_requests(
+        self, files: list[Path], attempt: int = 0
+    ) -> tuple[dict[str, dict], dict[Path, list[str]]]:
+        """Build the requests of a batch, see `LLM.abatch`.
+
+        Args:
+            files (list[Path]): Files to document.
+            attempt (int, optional): Verification retries so far, see `retry_options`. Defaults to 0.
+
+        Returns:
+            tuple[dict[str, dict], dict[Path, list[str]]]: The requests keyed by their id (the package-relative
+                path, with `#n` for the chunks of a file), and the ids of each file's requests in source order.
+                Files without missing docstrings in `docstrings` mode have no request.
+        """
+        requests: dict[str, dict] = {}
+        ids: dict[Path, list[str]] = {}
+        for filepath in files:
+            relpath = _relpath(self.package, filepath)
+            _str_filepath = self.name(filepath)
+            options = self.retry_options(attempt)
+            if self.mode == "docstrings":
+                symbols = find_undocumented(filepath.read_text(encoding="utf-8"))
+                ids[filepath] = [relpath] if symbols else []
+                if symbols:
+                    requests[relpath] = {
+                        "messages": self.docstrings_messages(filepath, symbols),
+                        "response_model": Docstrings,
+                        "model": self.route(filepath),
+                        "label": _str_filepath,
+                        **options,
+                    }
+                continue
+
+            messages = self.rewrite_messages(filepath)
+            if len(messages) == 1:
+                ids[filepath] = [relpath]
+                requests[relpath] = {
+                    "messages": messages[0],
+                    "model": self.route(filepath),
+                    "label": _str_filepath,
+                    **options,
+                }
+                continue
+            ids[filepath] = [f"{relpath}#{idx}" for idx in range(1, len(messages) + 1)]
+            for idx, (custom_id, chunk) in enumerate(
+                zip(ids[filepath], messages), start=1
+            ):
+                requests[custom_id] = {
+                    "messages": chunk,
+                    "label": f"{_str_filepath}#{idx}",
+                    **options,
+                }
+        return requests, ids
+
+    def write_batch_output(
+        self, filepath: Path, responses: list[str | BaseModel | Exception]
+    ) -> Path:
+        """Write a documented file from the batch results of its requests.
+
+        Args:
+            filepath (Path): A file of the package.
+            responses (list[str | BaseModel | Exception]): Results of its requests, see `batch_requests`.
+
+        Returns:
+            Path: The generated `nosync_*.py` file.
+
+        Raises:
+            Exception: The error of a request that failed.
+        """
+        for resp in responses:
+            if isinstance(resp, Exception):
+                raise resp
+        new_filepath = filepath.with_stem(f"nosync_{filepath.stem}")
+        if self.mode == "docstrings":
+            source = filepath.read_text(encoding="utf-8")
+            text = source
+            if responses:
+                text = splice_docstrings(
+                    source,
+                    find_undocumented(source),
+                    {d.name: d.docstring for d in responses[0].docstrings},
+                )
+        elif len(responses) == 1:
+            text = _strip_fence(responses[0])
+        else:
+            text = _join_chunks(responses)
+        with open(new_filepath, "w") as f:
+            f.write(text)
+        return new_filepath
+
+    async def run_batch(
+        self,
+        files: list[Path],
+        summary: RunSummary,
+        manifest: Manifest | None = None,
+        hashes: dict[Path, str] = {},
+        state: BatchState | None = None,
+        poll_seconds: float = 30.0,
+    ) -> None:
+        """Document files through the Batch API of the server instead of one request per file.
+
+        The requests of every file are submitted as a batch (see `LLM.abatch`),
+        which is saved to `state` as soon as it is submitted. A run that finds a
+        saved batch collects it instead of submitting again, for the files of
+        that batch, provided none of them changed since; the other files of
+        `files` are then sent in a batch of their own. Files that fail
+        verification are sent in a new batch, up to `verify_retries` times.
+        Streaming and `dependencies` order do not apply to batches.
+
+        Args:
+            files (list[Path]): Files to document.
+            summary (RunSummary): Collects the succeeded and failed files.
+            manifest (Manifest | None, optional): Records each documented file. Defaults to None.
+            hashes (dict[Path, str], optional): Source hashes recorded in `manifest`. Defaults to {}.
+            state (BatchState | None, optional): Pending batches of the package. Defaults to the saved state.
+            poll_seconds (float, optional): Seconds between status checks of a batch. Defaults to 30.0.
+        """
+        state = state or BatchState.load(self.package)
+        # Files sent in one batch, with the attempt they are at
+        rounds: list[tuple[list[Path], int]] = [(files, 0)]
+        if state.batches:
+            resumed = [self.package / relpath for relpath in state.files]
+            if all(
+                file.is_file()
+                and file_hash(file) == state.files[_relpath(self.package, file)]
+                for file in resumed
+            ):
+                print(
+                    f"Resuming {len(state.batches)} batch(es) submitted"
+                    f" {(time() - state.submitted) / 60:.0f} min ago for {len(resumed)} file(s)"
+                )
+                others = [
+                    file
+                    for file in files
+                    if _relpath(self.package, file) not in state.files
+                ]
+                if others:
+                    print(f"Submitting the {len(others)} other file(s) in a new batch")
+                rounds = [(resumed, state.attempt), (others, 0)]
+            else:
+                print(
+                    f"Files changed since the batch(es) in {state.path} were submitted, submitting again"
+                )
+                state.clear()
+
+        total = sum(len(batch) for batch, _ in rounds)
+        try:
+            while rounds:
+                files, attempt = rounds.pop(0)
+                if not files:
+                    continue
+                requests, ids = self.batch_requests(files, attempt)
+                sources = {
+                    _relpath(self.package, file): hashes.get(file) or file_hash(file)
+                    for file in files
+                }
+                results = await self.llm.abatch(
+                    requests,
+                    submitted=state.batches,
+                    on_submit=lambda batches: state.record(batches, sources, attempt),
+                    poll_seconds=poll_seconds,
+                )
+
+                retry: list[Path] = []
+                for filepath in files:
+                    try:
+                        new_filepath = self.write_batch_output(
+                            filepath,
+                            [results[custom_id] for custom_id in ids[filepath]],
+                        )
+                        if self.verify:
+                            try:
+                                verify_file(filepath, new_filepath)
+                            except VerificationError as e:
+                                if attempt < self.verify_retries:
+                                    self.retried[filepath] = attempt + 1
+                                    print(
+                                        f"Retrying {self.name(filepath)} ({attempt + 1}/{self.verify_retries}): {e}"
+                                    )
+                                    retry.append(filepath)
+                                    continue
+                                new_filepath.unlink(missing_ok=True)
+                                raise VerificationError(
+                                    f"{e} (after {attempt + 1} attempt(s))"
+                                ) from e
+                        self.__succeeded(
+                            filepath, new_filepath, total, summary, manifest, hashes
+                        )
+                    except Exception as e:
+                        self.__failed(filepath, e, total, summary)
+
+                state.clear()
+                if retry:
+                    rounds.insert(0, (retry, attempt + 1))
+        except BaseException:
+            if state.batches:
+                print(
+                    f"Batch(es) {', '.join(state.batches)} saved to {state.path}, run again to collect them"
+                )
+            raise
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+
+def select_files(
+    package: Path,
+    pyfile: Path | None = None,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    incremental: bool = False,
+    since: str | None = None,
+    manifest: Manifest | None = None,
+    context_cache: ContextCache | None = None,
+) -> tuple[list[Path], list[Path], dict[Path, str]]:
+    """Select the files a run documents.
+
+    Args:
+        package (Path): The root directory of the package.
+        pyfile (Path | None, optional): Document only this file. Defaults to None.
+        include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude when scanning files, in addition to
+            tests and generated `nosync_*` files. Defaults to [].
+        incremental (bool, optional): Leave out files that are current in `manifest`. Defaults to False.
+        since (str | None, optional): Only files changed in this git revision or range. Defaults to None.
+        manifest (Manifest | None, optional): Manifest of the package, read from disk if None. Defaults to None.
+        context_cache (ContextCache | None, optional): Cache that provides the file hashes; files it has
+            already read are not read again. Defaults to one kept in memory only.
+
+    Returns:
+        tuple[list[Path], list[Path], dict[Path, str]]: The files to document, the unchanged files
+            that were left out, and the content hash of every candidate file.
+    """
+    if pyfile is not None:
+        files = [pyfile]
+        hashes = {pyfile: file_hash(pyfile)}
+    else:
+        # Same walk and patterns as the context, so excluded files are never documented
+        context_cache = context_cache or ContextCache(directory=None)
+        records = context_cache.files(
+            package,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+        )
+        files = [Path(package) / record.relpath for record in records]
+        hashes = {file: record.hash for file, record in zip(files, records)}
+        if since is not None:
+            changed = changed_since(package, since)
+            files = [file for file in files if file.resolve() in changed]
+
+    unchanged: list[Path] = []
+    if incremental and pyfile is None:
+        manifest = manifest or Manifest(package)
+        unchanged = [
+            file
+            for file in files
+            if manifest.is_current(_relpath(package, file), hashes[file])
+        ]
+        files = [file for file in files if file not in unchanged]
+    return files, unchanged, hashes
 
 
 def document(
@@ -12,52 +1040,173 @@ def document(
     llm_baseurl: str = "http://100.99.54.84:11434/v1",
     llm_key: str = "ollama",
     llm_model: str = "code_assist_large",
+    workers: int = 1,
+    context_mode: Literal["package", "pruned"] = "package",
+    context_tokens: int = 8000,
+    cache: bool = True,
+    cache_dir: Path | None = None,
+    cache_max_mb: int = 512,
+    incremental: bool = False,
+    since: str | None = None,
+    mode: Literal["rewrite", "docstrings"] = "rewrite",
+    context_sizes: dict[str, int] = {},
+    stream: bool = False,
+    report: Path | None = None,
+    retries: int = 5,
+    requests_per_minute: float | None = None,
+    tokens_per_minute: float | None = None,
+    routes: dict[str, int] = {},
+    warm_up: bool = True,
+    keep_alive: float | str | None = None,
+    unload: bool = False,
+    verify: bool = True,
+    verify_retries: int = 2,
+    order: Literal["largest", "dependencies"] = "largest",
+    batch: bool = False,
+    poll_seconds: float = 30.0,
     **kwargs,
-) -> None:
+) -> RunSummary:
     """Generate documentation comments (docstrings) for the given package using a specified language model.
 
     Args:
         package (Path): The root directory of the Python package to document.
         include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
         exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
-        llm_baseurl (str, optional): The base URL for the language model API. Defaults to "http://100.99.54.84:11434/v1".
+        llm_baseurl (str, optional): The base URL for the language model API, or several comma-separated URLs
+            of servers with the same models to spread requests over. Defaults to "http://100.99.54.84:11434/v1".
         llm_key (str, optional): The key used to authenticate with the language model API. Defaults to "ollama".
         llm_model (str, optional): The name of the language model to use. Defaults to "code_assist_large".
+        workers (int, optional): Maximum number of requests in flight to each language model server at once. Defaults to 1.
+        context_mode (Literal["package", "pruned"], optional): `package` sends the whole package with every request,
+            `pruned` sends only the file and stubs of the modules it imports or is imported by. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        cache (bool, optional): Serve identical requests from the on-disk response cache, and reuse the stripped
+            files of the context from earlier runs. Defaults to True.
+        cache_dir (Path | None, optional): Directory of the response cache. Defaults to the user cache directory.
+        cache_max_mb (int, optional): Size cap of the response cache in MiB. Defaults to 512.
+        incremental (bool, optional): Only document files whose contents changed since they were last documented,
+            as recorded in the package manifest. Defaults to False.
+        since (str | None, optional): Only document files changed in this git revision or range (e.g. `HEAD~1`,
+            `main..HEAD`). Defaults to None.
+        mode (Literal["rewrite", "docstrings"], optional): `rewrite` asks the model to reprint each file with docstrings,
+            `docstrings` asks only for the missing docstrings and splices them into the original source. Defaults to "rewrite".
+        context_sizes (dict[str, int], optional): Context window (tokens) per model name, overriding the built-in table.
+            Files too large for the context are documented in chunks. Defaults to {}.
+        stream (bool, optional): Stream `rewrite` responses straight to the output files and report time to first
+            token and tokens/sec per file. Defaults to False.
+        report (Path | None, optional): Write token usage and latency of every request to this JSON file. Defaults to None.
+        retries (int, optional): Retries of a request that failed with a rate limit, connection or server error. Defaults to 5.
+        requests_per_minute (float | None, optional): Client-side request rate limit, None for no limit. Defaults to None.
+        tokens_per_minute (float | None, optional): Client-side token rate limit, None for no limit. Defaults to None.
+        routes (dict[str, int], optional): Send files up to this many tokens to a faster model instead of `llm_model`,
+            e.g. `{"general_small": 1000}`. Defaults to {}.
+        warm_up (bool, optional): Load the models on every Ollama server before the first request. Defaults to True.
+        keep_alive (float | str | None, optional): How long Ollama keeps the models loaded after warm-up and after
+            the run, e.g. `"30m"` or -1 for ever; None for the server default. Defaults to None.
+        unload (bool, optional): Unload the models when the run is done. Defaults to False.
+        verify (bool, optional): Check that every documented file parses and that its code, with docstrings
+            removed, equals the source's. Defaults to True.
+        verify_retries (int, optional): Requests made again for a file that fails verification, at a higher
+            temperature each time. Defaults to 2.
+        order (Literal["largest", "dependencies"], optional): `largest` starts the files with the most
+            estimated output first, so no long file is left for the end of the run. `dependencies` documents
+            the modules a file imports before the file and adds their new docstrings to its context.
+            Defaults to "largest".
+        batch (bool, optional): Submit the requests through the server's Batch API (`/v1/batches`) and wait for
+            the results instead of sending them one by one. An interrupted batch run is resumed by running
+            again. Defaults to False.
+        poll_seconds (float, optional): Seconds between status checks of a batch. Defaults to 30.0.
+
+    Returns:
+        RunSummary: The files that were documented and the files that failed.
     """
     if pyfile is not None:
         pyfile = Path(pyfile)
         assert pyfile.is_file()
-    llm = LLM(base_url=llm_baseurl, model=llm_model, key=llm_key)
 
-    USER_MSG: str = """
-    Rewrite the contents of `File: {}` to include documentation comments (docstrings).
-    Ensure that all docstrings are in google format.
-    Do not change any other part of the code.
-    Output only the contents of the file, do not add any additional text. Do not add any explainations.
-    """
+    manifest = Manifest(package)
+    summary = RunSummary()
+    context_cache = ContextCache() if cache else ContextCache(directory=None)
+    files, unchanged, hashes = select_files(
+        package,
+        pyfile=pyfile,
+        include_patterns=include_patterns,
+        exclude_patterns=exclude_patterns,
+        incremental=incremental,
+        since=since,
+        manifest=manifest,
+        context_cache=context_cache,
+    )
+    if incremental and pyfile is None:
+        summary.skipped = [str(file).replace(str(package), "") for file in unchanged]
+        print(f"Skipping {len(unchanged)} unchanged file(s)")
 
-    llm.SYSTEM = generate_system(
+    if not files:
+        print(summary)
+        return summary
+
+    llm = LLM(
+        base_url=llm_baseurl,
+        model=llm_model,
+        key=llm_key,
+        max_concurrency=max(1, workers),
+        cache=open_cache(cache, cache_dir, cache_max_mb),
+        retries=retries,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        keep_alive=keep_alive,
+    )
+    documenter = Documenter(
         package=package,
+        llm=llm,
         include_patterns=include_patterns,
         exclude_patterns=exclude_patterns,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes=context_sizes,
+        stream=stream,
+        context_cache=context_cache,
+        routes=routes,
+        verify=verify,
+        verify_retries=verify_retries,
+        order=order,
     )
+    models = list(dict.fromkeys(documenter.route(file) for file in files))
 
-    def document_file(filepath: Path):
-        _str_filepath = str(filepath).replace(str(package), "")
-        print(f"Generating docstrings for {_str_filepath}")
-        resp = llm.response(
-            messages=llm.msg(user_content=USER_MSG.format(_str_filepath)),
-        )
+    async def run_all() -> None:
+        try:
+            if batch:
+                await documenter.run_batch(
+                    files,
+                    summary=summary,
+                    manifest=manifest,
+                    hashes=hashes,
+                    poll_seconds=poll_seconds,
+                )
+                return
+            if warm_up:
+                await llm.aload(models)
+            await documenter.run(
+                files, summary=summary, manifest=manifest, hashes=hashes
+            )
+        finally:
+            if unload:
+                await llm.aunload(models)
+            elif warm_up and keep_alive is not None and not batch:
+                # Requests reset the keep-alive to the server default
+                await llm.aload(models)
+            await llm.aclose()
 
-        if resp.strip().startswith("```"):
-            resp = "\n".join(resp.strip().split("\n")[1:-1])
+    asyncio.run(run_all())
 
-        new_filepath = filepath.with_stem(f"nosync_{filepath.stem}")
-        with open(new_filepath, "w") as f:
-            f.write(resp)
+    if llm.cache is not None:
+        summary.cache_hits = llm.cache.hits
+        summary.cache_misses = llm.cache.misses
 
-    if pyfile is None:
-        for file in package.glob("**/*.py"):
-            document_file(file)
-    else:
-        document_file(pyfile)
+    print(summary)
+    print(llm.telemetry.report(files=len(files)))
+    if report is not None:
+        llm.telemetry.write_json(report, files=len(files), summary=asdict(summary))
+        print(f"Wrote telemetry report to {report}")
+    return summary
@@ -0,0 +1,136 @@
+"""
+Manifest of documented files, used to skip unchanged files between runs.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+
+MANIFEST_NAME: str = ".pdoc_ai_manifest.json"
+"""File name of the manifest, stored in the package root."""
+
+
+def text_hash(text: str) -> str:
+    """Hash file contents.
+
+    Args:
+        text (str): The contents to hash.
+
+    Returns:
+        str: Hex sha256 digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: Path) -> str:
+    """Hash a file on disk.
+
+    Args:
+        path (Path): The file to hash.
+
+    Returns:
+        str: Hex sha256 digest of the file contents.
+    """
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class Manifest:
+    """Source hashes of documented files and the outputs generated from them.
+
+    Attributes:
+        package (Path): The package root.
+        path (Path): Location of the manifest file.
+        entries (dict[str, dict[str, str]]): `{"source": hash, "output": relpath}` keyed by package-relative source path.
+    """
+
+    def __init__(self, package: str | Path) -> None:
+        """
+        Load the manifest of a package, or start an empty one.
+
+        Args:
+            package (str | Path): The package root.
+        """
+        self.package = Path(package)
+        self.path = self.package / MANIFEST_NAME
+        self.entries: dict[str, dict[str, str]] = {}
+        if self.path.is_file():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))[
+                    "files"
+                ]
+            except (ValueError, KeyError) as e:
+                print(f"Ignoring unreadable manifest {self.path}\n{e}")
+
+    def is_current(self, relpath: str, source_hash: str) -> bool:
+        """Check whether a file was documented from identical contents.
+
+        Args:
+            relpath (str): Package-relative path of the source file.
+            source_hash (str): Hash of the current source contents.
+
+        Returns:
+            bool: True if the manifest holds `source_hash` for the file and its output still exists.
+        """
+        entry = self.entries.get(relpath)
+        if entry is None or entry.get("source") != source_hash:
+            return False
+        return (self.package / entry["output"]).is_file()
+
+    def record(self, relpath: str, source_hash: str, output: Path) -> None:
+        """Record a documented file.
+
+        Args:
+            relpath (str): Package-relative path of the source file.
+            source_hash (str): Hash of the source contents that were documented.
+            output (Path): The generated file.
+        """
+        self.entries[relpath] = {
+            "source": source_hash,
+            "output": Path(output)
+            .resolve()
+            .relative_to(self.package.resolve())
+            .as_posix(),
+        }
+
+    def save(self) -> None:
+        """Write the manifest to disk."""
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": 1, "files": self.entries}, f, indent=2, sort_keys=True
+            )
+        os.replace(tmp, self.path)
+
+
+def changed_since(package: str | Path, since: str) -> set[Path]:
+    """List files changed in a git revision range.
+
+    Args:
+        package (str | Path): Directory inside the git work tree.
+        since (str): A revision (`HEAD~3`, compared with the working tree) or a range (`main..HEAD`).
+
+    Raises:
+        RuntimeError: If git fails, e.g. the package is not in a git repository.
+
+    Returns:
+        set[Path]: Resolved paths of the changed files below `package`. Untracked files are included
+            when `since` is a single revision.
+    """
+    package = Path(package).resolve()
+    commands = [["git", "diff", "--name-only", "--relative", since, "--", "."]]
+    if ".." not in since:
+        commands.append(
+            ["git", "ls-files", "--others", "--exclude-standard", "--", "."]
+        )
+
+    changed: set[Path] = set()
+    for cmd in commands:
+        proc = subprocess.run(cmd, cwd=package, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"`{' '.join(cmd)}` failed: {proc.stderr.strip()}")
+        changed.update(
+            (package / line).resolve() for line in proc.stdout.splitlines() if line
+        )
+    return changed
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 _this = Path(__file__)
@@ -16,3 +17,6 @@ dir_logs = dir_src / "logs"
 
 name_pkg = dir_pkg.name
 """Name of the package."""
+
+dir_cache = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / name_pkg
+"""Path to the user-level cache directory."""
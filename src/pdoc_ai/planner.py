@@ -0,0 +1,245 @@
+"""
+Estimate the tokens and wall time of a `document` run without calling the model.
+"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from .llm import LLM
+from .ingester import ContextCache
+from .main import Documenter, select_files
+from .schedule import completion_tokens
+from .splice import find_undocumented
+from .tokens import count_tokens
+
+MESSAGE_OVERHEAD: int = 4
+"""Tokens the chat format adds around every message."""
+
+DEFAULT_RATE: float = 20.0
+"""Completion tokens per second of a single request, used when no rate is given."""
+
+
+@dataclass
+class FilePlan:
+    """Estimated size of the requests for one file.
+
+    Attributes:
+        name (str): The file, relative to the package.
+        requests (int): Requests the file needs (chunks in `rewrite` mode).
+        prompt_tokens (int): Tokens sent.
+        completion_tokens (int): Estimated tokens received.
+        error (str | None): Why the file could not be planned, e.g. it does not parse; None if it was.
+    """
+
+    name: str
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: str | None = None
+
+
+@dataclass
+class Plan:
+    """Projected size and duration of a run.
+
+    Attributes:
+        files (list[FilePlan]): Estimate for each selected file.
+        skipped (list[str]): Files left out because they are unchanged.
+        rate (float): Completion tokens per second of a single request.
+        workers (int): Requests in flight at once.
+    """
+
+    files: list[FilePlan] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    rate: float = DEFAULT_RATE
+    workers: int = 1
+
+    @property
+    def requests(self) -> int:
+        """int: Total number of requests."""
+        return sum(f.requests for f in self.files)
+
+    @property
+    def prompt_tokens(self) -> int:
+        """int: Total prompt tokens."""
+        return sum(f.prompt_tokens for f in self.files)
+
+    @property
+    def completion_tokens(self) -> int:
+        """int: Total estimated completion tokens."""
+        return sum(f.completion_tokens for f in self.files)
+
+    @property
+    def seconds(self) -> float:
+        """float: Projected wall time, with requests spread evenly over the workers.
+
+        Never shorter than the longest single request.
+        """
+        longest = max(
+            (f.completion_tokens / f.requests for f in self.files if f.requests),
+            default=0.0,
+        )
+        return max(self.completion_tokens / self.workers, longest) / self.rate
+
+    def __str__(self) -> str:
+        width = max((len(f.name) for f in self.files), default=4)
+        lines = [f"{'file':<{width}} {'requests':>8} {'prompt':>10} {'completion':>10}"]
+        for f in sorted(self.files, key=lambda f: f.prompt_tokens, reverse=True):
+            lines.append(
+                f"{f.name:<{width}} {f.requests:>8} {f.prompt_tokens:>10} {f.completion_tokens:>10}"
+            )
+        minutes, seconds = divmod(round(self.seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        failed = [f for f in self.files if f.error is not None]
+        if failed:
+            lines += [
+                "",
+                f"Could not plan {len(failed)} file(s), a run would fail them:",
+            ]
+            lines += [f"  {f.name}: {f.error}" for f in failed]
+        lines += [
+            "",
+            f"{len(self.files)} file(s), {len(self.skipped)} unchanged, {self.requests} request(s).",
+            f"Tokens: {self.prompt_tokens} prompt, ~{self.completion_tokens} completion.",
+            f"Projected time: {hours}h {minutes:02d}m {seconds:02d}s"
+            f" at {self.rate:.1f} tok/s per request with {self.workers} worker(s).",
+        ]
+        return "\n".join(lines)
+
+
+def measured_rate(report: Path) -> float:
+    """Read the completion speed of an earlier run from its telemetry report.
+
+    Args:
+        report (Path): JSON report written by `document(report=...)`.
+
+    Returns:
+        float: Completion tokens per second of a single request.
+
+    Raises:
+        ValueError: If the report has no measured requests.
+    """
+    with open(report, "r", encoding="utf-8") as f:
+        rate = json.load(f)["aggregate"]["completion_tokens_per_sec"]
+    if not rate:
+        raise ValueError(f"{report} does not contain any measured requests")
+    return rate
+
+
+def plan(
+    package: Path,
+    pyfile: Path | None = None,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    llm_model: str = "code_assist_large",
+    workers: int = 1,
+    context_mode: Literal["package", "pruned"] = "package",
+    context_tokens: int = 8000,
+    incremental: bool = False,
+    since: str | None = None,
+    mode: Literal["rewrite", "docstrings"] = "rewrite",
+    context_sizes: dict[str, int] = {},
+    rate: float | None = None,
+    report: Path | None = None,
+    **kwargs,
+) -> Plan:
+    """Build the requests of a `document` run and estimate its size and duration.
+
+    Files are selected and prompts built exactly as `document` does, but
+    nothing is sent to the model. Prompt tokens are counted with tiktoken;
+    completion tokens are estimated from the size of each file (`rewrite`) or
+    the number of missing docstrings (`docstrings`).
+
+    Args:
+        package (Path): The root directory of the Python package to document.
+        pyfile (Path | None, optional): Plan only this file. Defaults to None.
+        include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
+        llm_model (str, optional): The model the run would use, to look up its context window. Defaults to "code_assist_large".
+        workers (int, optional): Requests in flight at once. Defaults to 1.
+        context_mode (Literal["package", "pruned"], optional): Context sent with each request. Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        incremental (bool, optional): Leave out files that are unchanged since they were last documented. Defaults to False.
+        since (str | None, optional): Only files changed in this git revision or range. Defaults to None.
+        mode (Literal["rewrite", "docstrings"], optional): How docstrings would be generated. Defaults to "rewrite".
+        context_sizes (dict[str, int], optional): Context window (tokens) per model name. Defaults to {}.
+        rate (float | None, optional): Completion tokens per second of a single request. Defaults to None.
+        report (Path | None, optional): Telemetry report of an earlier run to measure the rate from,
+            used when `rate` is None. Defaults to None.
+
+    Returns:
+        Plan: Per-file token estimates and the projected wall time.
+    """
+    if rate is None:
+        rate = measured_rate(report) if report is not None else DEFAULT_RATE
+
+    # Warms the on-disk context cache for the run being planned
+    context_cache = ContextCache()
+    files, unchanged, _ = select_files(
+        package,
+        pyfile=pyfile,
+        include_patterns=include_patterns,
+        exclude_patterns=exclude_patterns,
+        incremental=incremental,
+        since=since,
+        context_cache=context_cache,
+    )
+    result = Plan(
+        skipped=[str(file).replace(str(package), "") for file in unchanged],
+        rate=rate,
+        workers=max(1, workers),
+    )
+    if not files:
+        return result
+
+    # Only used to build messages, no request is made
+    llm = LLM(model=llm_model, cache=None)
+    documenter = Documenter(
+        package=package,
+        llm=llm,
+        include_patterns=include_patterns,
+        exclude_patterns=exclude_patterns,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes=context_sizes,
+        context_cache=context_cache,
+    )
+
+    # The package-wide system message is shared by every request
+    counted: dict[str, int] = {}
+
+    def prompt_tokens(messages: list[dict[str]]) -> int:
+        total = 0
+        for message in messages:
+            content = message["content"]
+            if content not in counted:
+                counted[content] = count_tokens(content)
+            total += counted[content] + MESSAGE_OVERHEAD
+        return total
+
+    for filepath in files:
+        estimate = FilePlan(name=documenter.name(filepath))
+        result.files.append(estimate)
+        try:
+            source = filepath.read_text(encoding="utf-8")
+            estimate.completion_tokens = completion_tokens(source, mode)
+            if mode == "docstrings":
+                symbols = find_undocumented(source)
+                requests = (
+                    [documenter.docstrings_messages(filepath, symbols)]
+                    if symbols
+                    else []
+                )
+            else:
+                requests = documenter.rewrite_messages(filepath)
+        except Exception as e:
+            # The run reports the same error for this file and documents the others
+            estimate.error = f"{type(e).__name__}: {e}"
+            print(f"Could not plan {estimate.name}\n{estimate.error}")
+            continue
+        estimate.requests = len(requests)
+        estimate.prompt_tokens = sum(prompt_tokens(messages) for messages in requests)
+    return result
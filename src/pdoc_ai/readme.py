@@ -1,7 +1,232 @@
-from pdoc_ai.ingester import generate_context
+"""
+README sections generated from the package, each regenerated only when the code it describes changes.
+"""
+
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from pdoc_ai.ingester import ContextCache, StrippedFile, module_stub
 from pdoc_ai.llm import LLM, BaseModel
+from pdoc_ai.cache import open_cache
+from pdoc_ai.manifest import text_hash
+from pdoc_ai.scanner import directory_tree
 from pydantic import Field
-from pathlib import Path
+
+README_STATE_NAME: str = ".pdoc_ai_readme.json"
+"""File name of the inputs each README section was generated from, stored in the package root."""
+
+_LAYOUT = "(layout)"
+_PROMPT = "(prompt)"
+_MODEL = "(model)"
+
+_ENTRY_POINT = re.compile(
+    r"""^\s*(?:import|from)\s+(?:typer|click|argparse)\b|__name__\s*==\s*["']__main__["']""",
+    re.M,
+)
+
+
+class Title(BaseModel):
+    title: str = Field(description="Title for the python package")
+
+
+class Description(BaseModel):
+    description: str = Field(
+        description="Brief description of the package under 20 tokens"
+    )
+
+
+class Features(BaseModel):
+    features: list[str] = Field(
+        description="List of features of the package  in markdown format"
+    )
+
+
+class Usage(BaseModel):
+    usage: str = Field(
+        description="A description of how to use the package, including examples"
+    )
+
+
+def _overview_inputs(package: Path, files: list[StrippedFile]) -> dict[str, str]:
+    """The directory structure and the interface of the `__init__` and `__main__` modules."""
+    inputs = {_LAYOUT: directory_tree(package, [f.relpath for f in files])}
+    for f in files:
+        if f.relpath.rsplit("/", 1)[-1] in ("__init__.py", "__main__.py"):
+            inputs[f.relpath] = module_stub(f.stripped)
+    return inputs
+
+
+def _features_inputs(package: Path, files: list[StrippedFile]) -> dict[str, str]:
+    """The interface of every module."""
+    return {f.relpath: stub for f in files if (stub := module_stub(f.stripped))}
+
+
+def _usage_inputs(package: Path, files: list[StrippedFile]) -> dict[str, str]:
+    """Entry points in full and the interface of the `__init__` modules, or every interface without entry points."""
+    inputs = {
+        f.relpath: f.stripped
+        for f in files
+        if f.relpath.rsplit("/", 1)[-1] == "__main__.py"
+        or _ENTRY_POINT.search(f.stripped)
+    }
+    if not inputs:
+        return _features_inputs(package, files)
+    for f in files:
+        if f.relpath.rsplit("/", 1)[-1] == "__init__.py" and f.relpath not in inputs:
+            inputs[f.relpath] = module_stub(f.stripped)
+    return inputs
+
+
+@dataclass(frozen=True)
+class Section:
+    """A part of the README generated by one request.
+
+    Attributes:
+        name (str): Name of the section, used by its `{name}` placeholder and its markers.
+        response_model (type[BaseModel]): Model of the response, with a single field named `name`.
+        source (str): What the request is given, completing "You are given ... of a python project".
+        inputs (Callable[[Path, list[StrippedFile]], dict[str, str]]): Text the section is generated from,
+            keyed by package-relative path.
+    """
+
+    name: str
+    response_model: type[BaseModel]
+    source: str
+    inputs: Callable[[Path, list[StrippedFile]], dict[str, str]]
+
+    def prompt(self, context: str) -> str:
+        """Build the request of the section.
+
+        Args:
+            context (str): The inputs of the section.
+
+        Returns:
+            str: The user message.
+        """
+        return f"""You are given {self.source} of a python project below.
+    Using this information You are tasked with generating the {self.name} of its README.md file.
+    The information presented should be useful for anyone who wants to use the package.
+    {context}
+    """
+
+    def render(self, response: BaseModel) -> str:
+        """Format the response as markdown.
+
+        Args:
+            response (BaseModel): Instance of `response_model`.
+
+        Returns:
+            str: The content of the section.
+        """
+        value = getattr(response, self.name)
+        return "\n".join(value) if isinstance(value, list) else value.strip()
+
+
+SECTIONS: list[Section] = [
+    Section(
+        "title",
+        Title,
+        "the directory structure and package interfaces",
+        _overview_inputs,
+    ),
+    Section(
+        "description",
+        Description,
+        "the directory structure and package interfaces",
+        _overview_inputs,
+    ),
+    Section("features", Features, "the module interfaces", _features_inputs),
+    Section("usage", Usage, "the entry points and package interfaces", _usage_inputs),
+]
+"""Sections generated into a README, where it has their placeholder or markers."""
+
+
+def _markers(name: str) -> tuple[str, str]:
+    return f"<!-- pdoc_ai:{name} -->", f"<!-- /pdoc_ai:{name} -->"
+
+
+def has_section(content: str, name: str) -> bool:
+    """Check whether a README has the placeholder or the markers of a section.
+
+    Args:
+        content (str): The README.
+        name (str): Name of the section.
+
+    Returns:
+        bool: True if the section can be written.
+    """
+    return _markers(name)[0] in content or f"{{{name}}}" in content
+
+
+def write_section(content: str, name: str, text: str) -> str:
+    """Put the content of a section into a README.
+
+    The content goes between the markers of the section. On the first run the
+    `{name}` placeholder is replaced by the markers, on their own lines if the
+    placeholder is, so the section can be found and replaced again later.
+
+    Args:
+        content (str): The README.
+        name (str): Name of the section.
+        text (str): Content of the section.
+
+    Returns:
+        str: The updated README.
+    """
+    start, end = _markers(name)
+    begin = content.find(start)
+    stop = content.find(end, begin)
+    if begin != -1 and stop != -1:
+        block = content[begin + len(start) : stop].startswith("\n")
+        body = f"\n{text}\n" if block else text
+        return f"{content[: begin + len(start)]}{body}{content[stop:]}"
+
+    placeholder = f"{{{name}}}"
+    block = (
+        re.search(rf"^[ \t]*{re.escape(placeholder)}[ \t]*$", content, re.M) is not None
+    )
+    body = f"{start}\n{text}\n{end}" if block else f"{start}{text}{end}"
+    return content.replace(placeholder, body, 1)
+
+
+def _load_state(package: Path, readme: Path) -> dict[str, dict[str, str]]:
+    path = package / README_STATE_NAME
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["readmes"].get(str(readme.resolve()), {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        print(f"Ignoring unreadable README state {path}\n{e}")
+        return {}
+
+
+def _save_state(
+    package: Path, readme: Path, sections: dict[str, dict[str, str]]
+) -> None:
+    path = package / README_STATE_NAME
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            readmes = json.load(f)["readmes"]
+    except (OSError, ValueError, KeyError):
+        readmes = {}
+    readmes[str(readme.resolve())] = sections
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "readmes": readmes}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _changes(before: dict[str, str], after: dict[str, str]) -> list[str]:
+    return sorted(
+        key for key in before.keys() | after.keys() if before.get(key) != after.get(key)
+    )
 
 
 def update_readme(
@@ -12,55 +237,126 @@ def update_readme(
     llm_baseurl: str = "http://100.99.54.84:11434/v1",
     llm_key: str = "ollama",
     llm_model: str = "code_assist_large",
+    cache: bool = True,
+    cache_dir: Path | None = None,
+    cache_max_mb: int = 512,
+    report: Path | None = None,
+    force: bool = False,
     **kwargs,
 ) -> None:
     """Update the README file with generated content based on the package structure.
 
+    Every section in `SECTIONS` that the README has a `{name}` placeholder or
+    markers for is generated from its own inputs (e.g. the module interfaces for
+    `features`), and the digest of those inputs is stored in `README_STATE_NAME`.
+    On later runs only the sections whose inputs, prompt or model changed are
+    requested again, concurrently, and written between their markers.
+
     Args:
         package (Path): The path to the package directory.
         readme (Path): The path to the README file to be updated.
         include_patterns (list[str], optional): Patterns for files to include. Defaults to [].
         exclude_patterns (list[str], optional): Patterns for files to exclude. Defaults to [].
-        llm_baseurl (str, optional): The base URL for the LLM service. Defaults to "http://100.99.54.84:11434/v1".
+        llm_baseurl (str, optional): The base URL for the LLM service, comma-separated for several servers. Defaults to "http://100.99.54.84:11434/v1".
         llm_key (str, optional): The key for the LLM service. Defaults to "ollama".
         llm_model (str, optional): The model to use for the LLM service. Defaults to "code_assist_large".
+        cache (bool, optional): Serve identical requests from the on-disk response cache, and reuse the stripped
+            files of the context from earlier runs. Defaults to True.
+        cache_dir (Path | None, optional): Directory of the response cache. Defaults to the user cache directory.
+        cache_max_mb (int, optional): Size cap of the response cache in MiB. Defaults to 512.
+        report (Path | None, optional): Write token usage and latency of the requests to this JSON file. Defaults to None.
+        force (bool, optional): Regenerate every section, even if its inputs did not change. Defaults to False.
         **kwargs: Additional keyword arguments.
     """
-
+    package, readme = Path(package), Path(readme)
     with open(readme, "r") as f:
         content = f.read()
 
-    class Readme(BaseModel):
-        title: str = Field(description="Title for the python package")
-        description: str = Field(
-            description="Brief description of the package under 20 tokens"
-        )
-        features: list[str] = Field(
-            description="List of features of the package  in markdown format"
-        )
-        usage: str = Field(
-            description="A description of how to use the package, including examples"
-        )
+    sections = [section for section in SECTIONS if has_section(content, section.name)]
+    if not sections:
+        print(f"No README sections to update in {readme}")
+        return
 
-    llm = LLM(base_url=llm_baseurl, model=llm_model, key=llm_key)
+    context_cache = ContextCache() if cache else ContextCache(directory=None)
+    files = context_cache.files(package, include_patterns, exclude_patterns)
+    state = _load_state(package, readme)
+    inputs: dict[str, dict[str, str]] = {}
+    digests: dict[str, dict[str, str]] = {}
+    stale: list[Section] = []
+    for section in sections:
+        inputs[section.name] = section.inputs(package, files)
+        digests[section.name] = {
+            **{key: text_hash(text) for key, text in inputs[section.name].items()},
+            _PROMPT: text_hash(
+                section.prompt("")
+                + json.dumps(section.response_model.model_json_schema())
+            ),
+            _MODEL: llm_model,
+        }
+        changes = _changes(state.get(section.name, {}), digests[section.name])
+        fresh = section.name in state and _markers(section.name)[0] in content
+        if force or not fresh:
+            stale.append(section)
+        elif changes:
+            shown = ", ".join(changes[:5]) + (
+                f" and {len(changes) - 5} more" if len(changes) > 5 else ""
+            )
+            print(f"README {section.name}: {shown} changed")
+            stale.append(section)
+    if not stale:
+        print(f"README sections are up to date: {', '.join(s.name for s in sections)}")
+        return
 
+    llm = LLM(
+        base_url=llm_baseurl,
+        model=llm_model,
+        key=llm_key,
+        cache=open_cache(cache, cache_dir, cache_max_mb),
+    )
     llm.SYSTEM = """You are a helpful coding assistant.
     """
-    resp = llm.structured_response(
-        messages=llm.msg(
-            user_content=f"""You are given a python project layout and contents below. 
-    Using this information You are tasked with creating generating contents for README.md file.
-    The information presented should be useful for anyone who wants to use the package.
-    {generate_context(package=package, include_patterns=include_patterns, exclude_patterns=exclude_patterns)}
-    """
-        ),
-        response_model=Readme,
-    )
 
-    content = content.replace("{title}", resp.title)
-    content = content.replace("{description}", resp.description)
-    content = content.replace("{features}", "\n".join(resp.features))
-    content = content.replace("{usage}", resp.usage)
+    async def generate(section: Section) -> str:
+        context = "\n".join(
+            text if key == _LAYOUT else f"FILE: {key}\n{text}\n"
+            for key, text in inputs[section.name].items()
+        )
+        resp = await llm.astructured_response(
+            messages=llm.msg(user_content=section.prompt(context)),
+            response_model=section.response_model,
+            label=f"README {section.name}",
+        )
+        return section.render(resp)
+
+    async def generate_all() -> list[str | BaseException]:
+        try:
+            return await asyncio.gather(
+                *(generate(s) for s in stale), return_exceptions=True
+            )
+        finally:
+            await llm.aclose()
+
+    print(f"Generating README sections: {', '.join(s.name for s in stale)}")
+    results = asyncio.run(generate_all())
+
+    errors = []
+    for section, result in zip(stale, results):
+        if isinstance(result, BaseException):
+            print(f"Could not generate the README {section.name}\n{result!r}")
+            errors.append(result)
+            continue
+        content = write_section(content, section.name, result)
+        state[section.name] = digests[section.name]
 
     with open(readme, "w") as f:
         f.write(content)
+    _save_state(package, readme, state)
+
+    if llm.cache is not None:
+        print(f"Response cache: {llm.cache.hits} hit(s), {llm.cache.misses} miss(es).")
+    print(llm.telemetry.report())
+    if report is not None:
+        llm.telemetry.write_json(report)
+        print(f"Wrote telemetry report to {report}")
+    if errors:
+        raise errors[0]
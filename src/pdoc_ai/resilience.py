@@ -0,0 +1,332 @@
+"""
+Retries, client-side rate limiting and circuit breaking for requests to the language model.
+"""
+
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import perf_counter
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APIError,
+    APIStatusError,
+    InternalServerError,
+    RateLimitError,
+)
+
+
+class CircuitOpen(RuntimeError):
+    """Raised when no endpoint accepts requests.
+
+    Attributes:
+        retry_in (float): Seconds until the first endpoint may be tried again.
+    """
+
+    def __init__(self, message: str, retry_in: float) -> None:
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Get the delay before a retry, using exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Number of attempts that already failed, starting at 1.
+        base (float, optional): Delay scale in seconds. Defaults to 1.0.
+        cap (float, optional): Longest delay in seconds. Defaults to 60.0.
+
+    Returns:
+        float: A random delay between 0 and `min(cap, base * 2 ** (attempt - 1))`.
+    """
+    return random.uniform(0, min(cap, base * 2 ** max(attempt - 1, 0)))
+
+
+def api_error(e: BaseException) -> BaseException:
+    """Find the API error behind an exception that wraps it, e.g. instructor's `InstructorRetryException`.
+
+    Args:
+        e (BaseException): The exception raised by the request.
+
+    Returns:
+        BaseException: The first OpenAI or transport error in the chain of causes, `e` itself if there is none.
+    """
+    cause: BaseException | None = e
+    while cause is not None:
+        if isinstance(cause, (APIError, httpx.TransportError, CircuitOpen)):
+            return cause
+        cause = cause.__cause__ or cause.__context__
+    return e
+
+
+def retry_after(e: Exception) -> float | None:
+    """Read how long the server asked us to wait from the headers of an error response.
+
+    Args:
+        e (Exception): The exception raised by the request.
+
+    Returns:
+        float | None: Seconds to wait from `retry-after-ms` or `Retry-After` (seconds or HTTP date), None if absent.
+    """
+    e = api_error(e)
+    if not isinstance(e, APIStatusError):
+        return None
+    headers = e.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                when = parsedate_to_datetime(value)
+                return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_endpoint_error(e: Exception) -> bool:
+    """Check whether a request failed because of the server rather than the request.
+
+    Args:
+        e (Exception): The exception raised by the request.
+
+    Returns:
+        bool: True for connection errors, timeouts and 5xx responses.
+    """
+    return isinstance(
+        api_error(e), (APIConnectionError, InternalServerError, httpx.TransportError)
+    )
+
+
+def is_retryable(e: Exception) -> bool:
+    """Check whether a failed request is worth retrying.
+
+    Args:
+        e (Exception): The exception raised by the request.
+
+    Returns:
+        bool: True for rate limiting (429), connection errors, timeouts, 5xx responses and open circuits.
+    """
+    return isinstance(api_error(e), (RateLimitError, CircuitOpen)) or is_endpoint_error(
+        e
+    )
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute / 60` units per second.
+
+    Callers reserve what they need up front; the balance may go negative, in
+    which case the caller waits until it has been refilled. Reservations are
+    therefore served in order.
+
+    Attributes:
+        per_minute (float): Configured refill rate.
+        capacity (float): Largest balance, i.e. the burst size.
+        scale (float): Fraction of `per_minute` currently in effect, lowered while the server rate limits us.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        """
+        Initialize a full bucket.
+
+        Args:
+            per_minute (float): Units added per minute.
+            capacity (float | None, optional): Burst size. Defaults to one second of refill, at least 1.
+        """
+        if per_minute <= 0:
+            raise ValueError(f"Invalid {per_minute=}")
+        self.per_minute = per_minute
+        self.capacity = capacity or max(per_minute / 60, 1.0)
+        self.scale = 1.0
+        self.__balance = self.capacity
+        self.__updated = perf_counter()
+
+    @property
+    def rate(self) -> float:
+        """float: Units added per second."""
+        return self.per_minute * self.scale / 60
+
+    def __refill(self) -> None:
+        now = perf_counter()
+        self.__balance = min(
+            self.capacity, self.__balance + (now - self.__updated) * self.rate
+        )
+        self.__updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take units from the bucket.
+
+        Args:
+            amount (float): Units to take. Amounts above `capacity` are allowed and just wait longer.
+
+        Returns:
+            float: Seconds to wait before using them.
+        """
+        self.__refill()
+        self.__balance -= amount
+        return max(-self.__balance / self.rate, 0.0)
+
+    def debit(self, amount: float) -> None:
+        """
+        Take units that were already used, without waiting, e.g. completion tokens.
+
+        Args:
+            amount (float): Units used.
+        """
+        self.__refill()
+        self.__balance -= amount
+
+
+class RateLimiter:
+    """Client-side limit of requests and tokens per minute that adapts to 429 responses.
+
+    A rate limited response halves the effective rates (down to `min_scale`) and
+    pauses every request for the time the server asked for; each successful
+    request then restores 5% of the configured rates.
+
+    Attributes:
+        requests (TokenBucket | None): Requests per minute, None for no limit.
+        tokens (TokenBucket | None): Prompt and completion tokens per minute, None for no limit.
+        min_scale (float): Lowest fraction of the configured rates.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        min_scale: float = 0.1,
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            requests_per_minute (float | None, optional): Request budget, None for no limit. Defaults to None.
+            tokens_per_minute (float | None, optional): Token budget, None for no limit. Defaults to None.
+            min_scale (float, optional): Lowest fraction of the configured rates. Defaults to 0.1.
+        """
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.min_scale = min_scale
+        self.__paused_until = 0.0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve a request and its prompt tokens.
+
+        Args:
+            tokens (int, optional): Prompt tokens of the request. Defaults to 0.
+
+        Returns:
+            float: Seconds to wait before sending the request.
+        """
+        wait = max(self.__paused_until - perf_counter(), 0.0)
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def debit(self, tokens: int) -> None:
+        """
+        Account for tokens that were only known after the request, e.g. the completion.
+
+        Args:
+            tokens (int): Tokens used.
+        """
+        if self.tokens is not None and tokens:
+            self.tokens.debit(tokens)
+
+    def throttle(self, pause: float) -> None:
+        """
+        Slow down after a rate limited response.
+
+        Args:
+            pause (float): Seconds during which no request is sent.
+        """
+        self.__paused_until = max(self.__paused_until, perf_counter() + pause)
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.scale = max(bucket.scale / 2, self.min_scale)
+
+    def recover(self) -> None:
+        """Speed back up after a successful request."""
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.scale = min(bucket.scale + 0.05, 1.0)
+
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint that keeps failing.
+
+    `closed`: requests flow. After `threshold` consecutive failures (or a failed
+    health check) the breaker opens and the endpoint gets no requests. After
+    `reset_seconds` it is `half-open`: one trial decides whether it closes again.
+
+    Attributes:
+        threshold (int): Consecutive failures that open the breaker.
+        reset_seconds (float): Seconds the breaker stays open before a trial.
+        failures (int): Current run of consecutive failures.
+        opened_at (float | None): `perf_counter()` when the breaker opened or the last trial started.
+    """
+
+    def __init__(self, threshold: int = 5, reset_seconds: float = 30.0) -> None:
+        """
+        Initialize a closed breaker.
+
+        Args:
+            threshold (int, optional): Consecutive failures that open the breaker. Defaults to 5.
+            reset_seconds (float, optional): Seconds the breaker stays open before a trial. Defaults to 30.0.
+        """
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        """str: `closed`, `open` or `half-open`."""
+        if self.opened_at is None:
+            return "closed"
+        if self.retry_in > 0:
+            return "open"
+        return "half-open"
+
+    @property
+    def retry_in(self) -> float:
+        """float: Seconds until the next trial, 0 when closed or due."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.reset_seconds - perf_counter(), 0.0)
+
+    def trial(self) -> None:
+        """Start a trial of a `half-open` breaker; it stays open for other callers meanwhile."""
+        self.opened_at = perf_counter()
+
+    def success(self) -> None:
+        """Record a successful request or health check, closing the breaker."""
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self) -> bool:
+        """
+        Record a failed request.
+
+        Returns:
+            bool: True if the breaker opened.
+        """
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.threshold:
+            self.trip()
+            return True
+        return False
+
+    def trip(self) -> None:
+        """Open the breaker immediately, e.g. after a failed health check."""
+        self.opened_at = perf_counter()
@@ -0,0 +1,176 @@
+"""
+Walk a package once and read its python files in parallel.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterator
+
+DEFAULT_EXCLUDES: list[str] = ["**/tests/*", "**/nosync**", "nosync_*"]
+"""Files never sent as context or documented: tests and previously generated `nosync_*` files."""
+
+SKIP_DIRS: set[str] = {
+    "__pycache__",
+    "build",
+    "dist",
+    "env",
+    "node_modules",
+    "site-packages",
+    "venv",
+}
+"""Directory names not entered unless the directory has an `__init__.py`, i.e. is a subpackage.
+Hidden directories (`.git`, `.venv`, ...) are never entered."""
+
+
+@dataclass(frozen=True)
+class FileRecord:
+    """A python file of the package.
+
+    Attributes:
+        path (Path): The file, `package / relpath`.
+        relpath (str): Path relative to the package, using `/` separators.
+        text (str): Contents decoded as UTF-8 (undecodable bytes replaced).
+        hash (str): Hex sha256 digest of the raw contents, as `manifest.file_hash`.
+        size (int): Size in bytes.
+    """
+
+    path: Path
+    relpath: str
+    text: str
+    hash: str
+    size: int
+
+
+def matches(relpath: str, patterns: list[str]) -> bool:
+    """Check a package-relative path against glob patterns.
+
+    Args:
+        relpath (str): Path relative to the package, using `/` separators.
+        patterns (list[str]): Glob patterns, matched against the path and the file name.
+
+    Returns:
+        bool: True if any pattern matches.
+    """
+    name = relpath.rsplit("/", 1)[-1]
+    return any(
+        fnmatch(relpath, p) or fnmatch(name, p) or fnmatch(f"/{relpath}", p)
+        for p in patterns
+        if p
+    )
+
+
+def walk(
+    package: str | Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+) -> list[str]:
+    """List the python files of a package that pass the include and exclude patterns.
+
+    Args:
+        package (str | Path): The package path.
+        include_patterns (list[str], optional): Patterns to include, in addition to `*.py`. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude, in addition to `DEFAULT_EXCLUDES`. Defaults to [].
+
+    Returns:
+        list[str]: Sorted package-relative paths.
+    """
+    include = ["*.py", *include_patterns]
+    exclude = [*DEFAULT_EXCLUDES, *exclude_patterns]
+    found: list[str] = []
+    pending = [""]
+    while pending:
+        reldir = pending.pop()
+        with os.scandir(Path(package) / reldir) as entries:
+            for entry in entries:
+                relpath = f"{reldir}{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.name in SKIP_DIRS and not os.path.isfile(
+                        os.path.join(entry.path, "__init__.py")
+                    ):
+                        continue
+                    pending.append(f"{relpath}/")
+                elif entry.name.endswith(".py") and entry.is_file():
+                    if matches(relpath, include) and not matches(relpath, exclude):
+                        found.append(relpath)
+    return sorted(found)
+
+
+def read_file(package: str | Path, relpath: str) -> FileRecord:
+    """Read one file of a package.
+
+    Args:
+        package (str | Path): The package path.
+        relpath (str): Path relative to the package.
+
+    Returns:
+        FileRecord: The file's contents, hash and size.
+    """
+    path = Path(package) / relpath
+    data = path.read_bytes()
+    return FileRecord(
+        path=path,
+        relpath=relpath,
+        text=data.decode("utf-8", errors="replace"),
+        hash=hashlib.sha256(data).hexdigest(),
+        size=len(data),
+    )
+
+
+def scan(
+    package: str | Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    workers: int | None = None,
+) -> Iterator[FileRecord]:
+    """Walk a package once and read its python files on a thread pool.
+
+    Args:
+        package (str | Path): The package path.
+        include_patterns (list[str], optional): Patterns to include, in addition to `*.py`. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude, in addition to `DEFAULT_EXCLUDES`. Defaults to [].
+        workers (int | None, optional): Reader threads. Defaults to the `ThreadPoolExecutor` default.
+
+    Yields:
+        FileRecord: The files in sorted path order.
+    """
+    relpaths = walk(package, include_patterns, exclude_patterns)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(lambda relpath: read_file(package, relpath), relpaths)
+
+
+def directory_tree(package: str | Path, relpaths: list[str]) -> str:
+    """Draw the directory structure of the given files.
+
+    Args:
+        package (str | Path): The package path, shown as the root.
+        relpaths (list[str]): Package-relative paths of the files to show.
+
+    Returns:
+        str: A `tree`-style drawing, directories first at each level.
+    """
+    root: dict = {}
+    for relpath in relpaths:
+        node = root
+        for part in relpath.split("/"):
+            node = node.setdefault(part, {})
+
+    lines = ["Directory structure:", f"└── {Path(package).resolve().name}/"]
+
+    def draw(node: dict, prefix: str) -> None:
+        names = sorted(node, key=lambda name: (not node[name], name))
+        for idx, name in enumerate(names):
+            last = idx == len(names) - 1
+            lines.append(
+                f"{prefix}{'└── ' if last else '├── '}{name}{'/' if node[name] else ''}"
+            )
+            if node[name]:
+                draw(node[name], prefix + ("    " if last else "│   "))
+
+    draw(root, "    ")
+    return "\n".join(lines)
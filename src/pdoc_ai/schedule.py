@@ -0,0 +1,120 @@
+"""
+Order the files of a run so that the longest work starts first.
+"""
+
+from typing import Literal
+
+from .splice import find_undocumented
+from .tokens import count_tokens
+
+REWRITE_GROWTH: float = 1.3
+"""Completion tokens per source token when a file is reprinted with docstrings."""
+
+DOCSTRING_TOKENS: int = 80
+"""Completion tokens per docstring requested in `docstrings` mode."""
+
+
+def completion_tokens(
+    source: str, mode: Literal["rewrite", "docstrings"] = "rewrite"
+) -> int:
+    """Estimate the tokens the model generates to document a file.
+
+    Args:
+        source (str): The file.
+        mode (Literal["rewrite", "docstrings"], optional): How docstrings are generated. Defaults to "rewrite".
+
+    Returns:
+        int: Reprinted file (`rewrite`) or missing docstrings (`docstrings`), in tokens.
+    """
+    if mode == "docstrings":
+        return DOCSTRING_TOKENS * len(find_undocumented(source))
+    return round(count_tokens(source) * REWRITE_GROWTH)
+
+
+def break_cycles(imports: dict[str, set[str]]) -> dict[str, set[str]]:
+    """Drop the imports that close a cycle, so every file has an order.
+
+    Args:
+        imports (dict[str, set[str]]): Files imported by each file.
+
+    Returns:
+        dict[str, set[str]]: The same graph without cycles. Of the files in a cycle,
+            the one visited first (by name) is documented last.
+    """
+    acyclic: dict[str, set[str]] = {file: set() for file in imports}
+    # 1: on the current path, 2: finished
+    state: dict[str, int] = {}
+    for root in sorted(imports):
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(sorted(imports[root])))]
+        while stack:
+            file, deps = stack[-1]
+            dep = next(deps, None)
+            if dep is None:
+                state[file] = 2
+                stack.pop()
+            elif dep not in imports or state.get(dep) == 1:
+                continue
+            else:
+                acyclic[file].add(dep)
+                if dep not in state:
+                    state[dep] = 1
+                    stack.append((dep, iter(sorted(imports[dep]))))
+    return acyclic
+
+
+def critical_path(
+    costs: dict[str, int], imports: dict[str, set[str]]
+) -> dict[str, int]:
+    """Get the cost of the longest chain of work that waits for each file.
+
+    A file can only start once the files it imports are done, so its own cost
+    plus the longest chain through the files importing it bounds how soon the
+    run can finish once it starts.
+
+    Args:
+        costs (dict[str, int]): Estimated cost of each file.
+        imports (dict[str, set[str]]): Files imported by each file, without cycles.
+
+    Returns:
+        dict[str, int]: Cost of each file plus that of its longest chain of importers.
+    """
+    importers: dict[str, set[str]] = {file: set() for file in costs}
+    waiting = {file: 0 for file in costs}
+    for file in costs:
+        for dep in imports.get(file, ()):
+            if dep in costs:
+                importers[dep].add(file)
+                waiting[file] += 1
+
+    # Files before the files importing them
+    order = [file for file, count in waiting.items() if count == 0]
+    for file in order:
+        for importer in importers[file]:
+            waiting[importer] -= 1
+            if waiting[importer] == 0:
+                order.append(importer)
+
+    rank: dict[str, int] = {}
+    for file in reversed(order):
+        rank[file] = costs[file] + max((rank[i] for i in importers[file]), default=0)
+    return rank
+
+
+def largest_first(
+    costs: dict[str, int], imports: dict[str, set[str]] | None = None
+) -> list[str]:
+    """Order files so the longest work starts first, which keeps the last request short.
+
+    Args:
+        costs (dict[str, int]): Estimated cost of each file.
+        imports (dict[str, set[str]] | None, optional): Files imported by each file, without cycles.
+            If given, files are ranked by their `critical_path` instead of their own cost. Defaults to None.
+
+    Returns:
+        list[str]: The files, longest first; ties keep their order in `costs`.
+    """
+    rank = critical_path(costs, imports) if imports is not None else costs
+    return sorted(costs, key=lambda file: rank[file], reverse=True)
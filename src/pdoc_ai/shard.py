@@ -0,0 +1,293 @@
+"""
+Document several packages at once, sharded across a pool of processes.
+"""
+
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from pathlib import Path
+from time import perf_counter, time
+from typing import TextIO
+
+from .scanner import walk
+from .summary import PackagesSummary, RunSummary
+
+LOCK_NAME: str = ".pdoc_ai.lock"
+"""File name of the lock a run holds on a package, stored in the package root."""
+
+LOCK_GRACE_SECONDS: float = 10.0
+"""Age below which a lock file without an owner is taken to be still being written."""
+
+
+class LockedError(RuntimeError):
+    """Raised when another process is documenting the package."""
+
+
+def _alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process; treat the lock as held
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PackageLock:
+    """Exclusive claim of a package by one process, held as a file in the package root.
+
+    The file holds the id of the owning process, so a lock left behind by a
+    process that no longer exists is taken over by the next run.
+
+    Attributes:
+        path (Path): Location of the lock file.
+    """
+
+    def __init__(self, package: str | Path) -> None:
+        """
+        Initialize the lock.
+
+        Args:
+            package (str | Path): The package root.
+        """
+        self.path = Path(package) / LOCK_NAME
+
+    def owner(self) -> int | None:
+        """Get the process holding the lock.
+
+        Returns:
+            int | None: Its process id, None if the lock is free or its file is not written yet.
+        """
+        try:
+            return int(self.path.read_text(encoding="utf-8").strip())
+        except (OSError, ValueError):
+            return None
+
+    def __stale(self) -> bool:
+        pid = self.owner()
+        if pid is not None:
+            return not _alive(pid)
+        try:
+            return time() - self.path.stat().st_mtime > LOCK_GRACE_SECONDS
+        except OSError:
+            return True
+
+    def acquire(self) -> None:
+        """Take the lock.
+
+        Raises:
+            LockedError: If a running process holds the lock.
+        """
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self.__stale():
+                    raise LockedError(
+                        f"{self.path.parent} is being documented by process {self.owner()}"
+                        f" (remove {self.path} if it is not)"
+                    )
+                self.path.unlink(missing_ok=True)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(str(os.getpid()))
+            return
+        raise LockedError(f"Could not lock {self.path.parent}")
+
+    def release(self) -> None:
+        """Give the lock up, if this process holds it."""
+        if self.owner() == os.getpid():
+            self.path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "PackageLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class _Prefixed(io.TextIOBase):
+    """Text stream writing whole lines to `stream`, each starting with `prefix`.
+
+    Lines are written with one call each, so the output of processes sharing a
+    terminal interleaves by line rather than by character.
+    """
+
+    def __init__(self, stream: TextIO, prefix: str) -> None:
+        self.__stream = stream
+        self.__prefix = prefix
+        self.__line = ""
+
+    def write(self, text: str) -> int:
+        *lines, self.__line = (self.__line + text).split("\n")
+        if lines:
+            self.__stream.write("".join(f"{self.__prefix}{line}\n" for line in lines))
+            self.__stream.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        self.__stream.flush()
+
+    def close(self) -> None:
+        if self.__line:
+            self.write("\n")
+        super().close()
+
+
+def expand_packages(patterns: list[str | Path]) -> list[Path]:
+    """Resolve package roots given as paths or glob patterns.
+
+    Roots inside another root are dropped, since that package documents their files.
+
+    Args:
+        patterns (list[str | Path]): Package roots or glob patterns of them, e.g. `"libs/*"`.
+
+    Returns:
+        list[Path]: The package directories, sorted.
+    """
+    found: set[Path] = set()
+    for pattern in patterns:
+        matches = [Path(match) for match in glob(str(pattern), recursive=True)]
+        dirs = [match.resolve() for match in matches if match.is_dir()]
+        if not dirs:
+            print(f"No package matches {pattern}")
+        found.update(dirs)
+
+    roots = []
+    for root in sorted(found):
+        outer = next((other for other in roots if root.is_relative_to(other)), None)
+        if outer is not None:
+            print(f"Skipping {root}, it is part of {outer}")
+            continue
+        roots.append(root)
+    return roots
+
+
+def package_size(
+    package: str | Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+) -> int:
+    """Get the size of the python files a run would document.
+
+    Args:
+        package (str | Path): The package root.
+        include_patterns (list[str], optional): Patterns to include. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude. Defaults to [].
+
+    Returns:
+        int: Total size in bytes.
+    """
+    return sum(
+        (Path(package) / relpath).stat().st_size
+        for relpath in walk(package, include_patterns, exclude_patterns)
+    )
+
+
+def _labels(roots: list[Path]) -> dict[Path, str]:
+    if len(roots) == 1:
+        return {roots[0]: roots[0].name}
+    base = Path(os.path.commonpath([root.parent for root in roots]))
+    return {root: root.relative_to(base).as_posix() for root in roots}
+
+
+def _document_shard(package: str, label: str, kwargs: dict) -> RunSummary:
+    """Document one package in a worker process, holding its lock and prefixing its output."""
+    from .ingester import ContextCache
+    from .main import document
+
+    stdout = sys.stdout
+    sys.stdout = _Prefixed(stdout, f"[{label}] ")
+    try:
+        with PackageLock(package):
+            return document(Path(package), **kwargs)
+    finally:
+        # The process goes on to other packages
+        ContextCache.forget(package)
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def document_packages(
+    packages: list[str | Path],
+    processes: int | None = None,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    **kwargs,
+) -> PackagesSummary:
+    """Document several packages, one package at a time in each process of a pool.
+
+    Every process builds its own `LLM` client, so each package gets the full
+    `workers` budget on every server: up to `processes * workers` requests are
+    in flight per server. Ingestion, stripping and verification run in parallel
+    across processes instead of sharing one interpreter. The packages share the
+    on-disk response and context caches, and each is locked while documented so
+    concurrent runs never document the same package twice. The largest packages
+    start first, so no long package is left for the end.
+
+    Args:
+        packages (list[str | Path]): Package roots or glob patterns of them.
+        processes (int | None, optional): Packages documented at once. Defaults to the number of CPUs.
+        include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
+        **kwargs: Arguments of `document` used for every package, e.g. `workers` or `llm_baseurl`.
+
+    Returns:
+        PackagesSummary: The summary of every package.
+    """
+    # Imported before the pool starts, so forked processes share it instead of each importing it
+    from . import main  # noqa: F401
+
+    summary = PackagesSummary()
+    roots = expand_packages(packages)
+    if not roots:
+        print(summary)
+        return summary
+
+    sizes = {
+        root: package_size(root, include_patterns, exclude_patterns) for root in roots
+    }
+    roots.sort(key=lambda root: sizes[root], reverse=True)
+    labels = _labels(roots)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(roots)))
+    print(f"Documenting {len(roots)} package(s) on {processes} process(es)")
+
+    shard_kwargs = dict(
+        include_patterns=include_patterns, exclude_patterns=exclude_patterns, **kwargs
+    )
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {
+            pool.submit(_document_shard, str(root), labels[root], shard_kwargs): labels[
+                root
+            ]
+            for root in roots
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                label = futures[future]
+                try:
+                    result = future.result()
+                except LockedError as e:
+                    summary.locked[label] = str(e)
+                    status = "locked by another run"
+                except Exception as e:
+                    summary.errors[label] = f"{type(e).__name__}: {e}"
+                    status = f"error: {summary.errors[label]}"
+                else:
+                    summary.packages[label] = result
+                    status = str(result).splitlines()[0]
+                print(f"[{done}/{len(roots)} packages] {label}: {status}", flush=True)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    summary.seconds = perf_counter() - start
+
+    print(summary)
+    return summary
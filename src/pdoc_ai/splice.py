@@ -0,0 +1,171 @@
+"""
+Find symbols without docstrings and splice generated docstrings into the original source.
+"""
+
+import ast
+import inspect
+from dataclasses import dataclass
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+MODULE: str = "<module>"
+"""Name used for the module docstring."""
+
+
+class SymbolDocstring(BaseModel):
+    """Docstring generated for one symbol."""
+
+    name: str = Field(
+        description="Name of the symbol, exactly as listed in the request"
+    )
+    docstring: str = Field(
+        description="Google format docstring for the symbol, without the surrounding triple quotes"
+    )
+
+
+class Docstrings(BaseModel):
+    """Docstrings generated for the symbols of a file."""
+
+    docstrings: list[SymbolDocstring] = Field(
+        description="One docstring for each requested symbol"
+    )
+
+
+@dataclass
+class Symbol:
+    """A module, class or function that lacks a docstring.
+
+    Attributes:
+        name (str): Qualified name, e.g. `LLM.response`, or `MODULE` for the module itself.
+        kind (Literal["module", "class", "function"]): Type of the symbol.
+        line (int): 0-based index of the source line the docstring is inserted before.
+        indent (str): Indentation of the docstring.
+    """
+
+    name: str
+    kind: Literal["module", "class", "function"]
+    line: int
+    indent: str
+
+
+def _first_line(node: ast.stmt) -> int:
+    """Get the first line of a statement, including its decorators.
+
+    Args:
+        node (ast.stmt): The statement.
+
+    Returns:
+        int: 1-based line number.
+    """
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno, *(d.lineno for d in decorators)])
+
+
+def find_undocumented(source: str) -> list[Symbol]:
+    """Find the module, classes and functions of `source` that have no docstring.
+
+    Definitions whose body starts on the `def`/`class` line (e.g. `def f(): ...`)
+    are skipped, as a docstring cannot be inserted without reformatting them.
+
+    Args:
+        source (str): Python source code.
+
+    Raises:
+        SyntaxError: If `source` cannot be parsed.
+
+    Returns:
+        list[Symbol]: Undocumented symbols in source order.
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    symbols: list[Symbol] = []
+
+    if ast.get_docstring(tree, clean=False) is None and tree.body:
+        # After a shebang or encoding line, before anything else
+        line = 0
+        while line < len(lines) and lines[line].startswith("#"):
+            line += 1
+        symbols.append(Symbol(name=MODULE, kind="module", line=line, indent=""))
+
+    def visit(body: list[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if not isinstance(
+                node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                continue
+            name = f"{prefix}{node.name}"
+            first = node.body[0]
+            own_line = not lines[first.lineno - 1][: first.col_offset].strip()
+            if ast.get_docstring(node, clean=False) is None and own_line:
+                symbols.append(
+                    Symbol(
+                        name=name,
+                        kind="class" if isinstance(node, ast.ClassDef) else "function",
+                        line=_first_line(first) - 1,
+                        indent=lines[first.lineno - 1][: first.col_offset],
+                    )
+                )
+            visit(node.body, prefix=f"{name}.")
+
+    visit(tree.body, prefix="")
+    return symbols
+
+
+def format_docstring(docstring: str, indent: str) -> list[str]:
+    """Format docstring text as indented source lines.
+
+    Args:
+        docstring (str): Docstring text, with or without surrounding quotes.
+        indent (str): Indentation of the docstring.
+
+    Returns:
+        list[str]: Source lines, each ending with a newline.
+    """
+    text = docstring.strip()
+    for quote in ('"""', "'''"):
+        if text.startswith(quote) and text.endswith(quote) and len(text) >= 6:
+            text = text[3:-3]
+    text = inspect.cleandoc(text)
+    if "\\" in text and '"""' not in text:
+        prefix = "r"
+    else:
+        prefix = ""
+        text = text.replace("\\", "\\\\").replace('"""', r"\"\"\"")
+
+    body = text.splitlines() or [""]
+    if len(body) == 1:
+        # A final quote or backslash would run into the closing quotes
+        end = " " if body[0].endswith(('"', "\\")) else ""
+        return [f'{indent}{prefix}"""{body[0]}{end}"""\n']
+    return [
+        f'{indent}{prefix}"""{body[0]}\n',
+        *(f"{indent}{line}\n" if line.strip() else "\n" for line in body[1:]),
+        f'{indent}"""\n',
+    ]
+
+
+def splice_docstrings(
+    source: str, symbols: list[Symbol], docstrings: dict[str, str]
+) -> str:
+    """Insert docstrings into `source` without touching any other line.
+
+    Args:
+        source (str): The original source code.
+        symbols (list[Symbol]): Symbols found by `find_undocumented` in `source`.
+        docstrings (dict[str, str]): Docstring text keyed by symbol name. Symbols without an entry are left alone.
+
+    Returns:
+        str: The source with the docstrings inserted.
+    """
+    lines = source.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+
+    # Bottom-up, so earlier insertions do not shift the lines of later ones
+    for symbol in sorted(symbols, key=lambda s: s.line, reverse=True):
+        docstring = docstrings.get(symbol.name)
+        if not docstring or not docstring.strip():
+            continue
+        lines[symbol.line : symbol.line] = format_docstring(docstring, symbol.indent)
+    return "".join(lines)
@@ -0,0 +1,152 @@
+"""
+Write streamed model output straight to disk and measure the stream.
+"""
+
+import codeop
+import warnings
+from dataclasses import dataclass
+from time import perf_counter
+from typing import TextIO
+
+
+class StreamAborted(ValueError):
+    """Raised when streamed output is clearly not the requested code."""
+
+
+@dataclass
+class StreamStats:
+    """Timing of one streamed response.
+
+    Attributes:
+        started (float): `perf_counter()` when the request was sent.
+        ttft (float | None): Seconds until the first token arrived, None if none did.
+        seconds (float): Seconds until the stream ended.
+        tokens (int): Tokens received.
+        last (float): `perf_counter()` when the last token arrived.
+    """
+
+    started: float
+    ttft: float | None = None
+    seconds: float = 0.0
+    tokens: int = 0
+    last: float = 0.0
+
+    def record(self, tokens: int) -> None:
+        """Record a chunk of the stream.
+
+        Args:
+            tokens (int): Tokens in the chunk.
+        """
+        self.last = perf_counter()
+        if self.ttft is None:
+            self.ttft = self.last - self.started
+        self.tokens += tokens
+
+    def finish(self) -> None:
+        """Record the end of the stream."""
+        self.seconds = perf_counter() - self.started
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """float: Generation speed after the first token."""
+        generating = self.seconds - (self.ttft or 0.0)
+        return self.tokens / generating if generating > 0 else 0.0
+
+    def __str__(self) -> str:
+        ttft = "n/a" if self.ttft is None else f"{self.ttft:.2f}s"
+        return f"ttft {ttft}, {self.tokens_per_sec:.1f} tok/s"
+
+
+def _looks_like_code(line: str) -> bool:
+    """Check that the first line of a response can start a python file.
+
+    Args:
+        line (str): The first non-empty line of the response.
+
+    Returns:
+        bool: False if the line is a syntax error on its own, e.g. "Here is the documented file:".
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            codeop.compile_command(line, symbol="exec")
+    except (SyntaxError, ValueError, OverflowError):
+        return False
+    return True
+
+
+class CodeStreamWriter:
+    """Write a streamed response to a file line by line, dropping any markdown code fence.
+
+    Text after a closing fence (explanations the model appends) is discarded.
+    Only the current, incomplete line is kept in memory.
+    """
+
+    def __init__(self, file: TextIO, check_preamble: bool = True) -> None:
+        """
+        Initialize the writer.
+
+        Args:
+            file (TextIO): Output file, ideally buffered.
+            check_preamble (bool, optional): Raise `StreamAborted` if the response does not start with code. Defaults to True.
+        """
+        self.file = file
+        self.check_preamble = check_preamble
+        self.__pending = ""
+        self.__started = False
+        self.__fenced = False
+        self.__done = False
+        self.__checked = False
+
+    def write(self, text: str) -> None:
+        """Consume a chunk of the response.
+
+        Args:
+            text (str): The chunk.
+
+        Raises:
+            StreamAborted: If the first line of code is not python.
+        """
+        if self.__done:
+            return
+        if "\n" not in text:
+            self.__pending += text
+            return
+        first, *lines, self.__pending = f"{self.__pending}{text}".split("\n")
+        self.__line(first)
+        for line in lines:
+            self.__line(line)
+
+    def close(self) -> None:
+        """Flush the last line of the response.
+
+        Raises:
+            StreamAborted: If the response did not contain any code.
+        """
+        if self.__pending:
+            self.__line(self.__pending)
+            self.__pending = ""
+        if not self.__started:
+            raise StreamAborted("The response did not contain any code")
+
+    def __line(self, line: str) -> None:
+        if self.__done:
+            return
+        if not self.__started:
+            if not line.strip():
+                return
+            self.__started = True
+            if line.strip().startswith("```"):
+                self.__fenced = True
+                return
+        elif self.__fenced and line.strip().startswith("```"):
+            self.__done = True
+            return
+
+        if not self.__checked and line.strip():
+            self.__checked = True
+            if self.check_preamble and not _looks_like_code(line):
+                raise StreamAborted(
+                    f"The response does not start with code: {line[:80]!r}"
+                )
+        self.file.write(f"{line}\n")
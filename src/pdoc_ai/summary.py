@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+
+from .streaming import StreamStats
+
+
+@dataclass
+class RunSummary:
+    """Outcome of a documentation run.
+
+    Attributes:
+        succeeded (list[str]): Files (relative to the package) that were documented.
+        failed (dict[str, str]): Files that could not be documented, mapped to the error message.
+        skipped (list[str]): Files left alone because they did not change since the last run.
+        cache_hits (int): Responses served from the response cache.
+        cache_misses (int): Responses that had to be requested from the language model.
+        streams (dict[str, StreamStats]): Timing of the files that were streamed.
+        retried (dict[str, int]): Files requested again because their output failed verification, and how often.
+    """
+
+    succeeded: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    skipped: list[str] = field(default_factory=list)
+    cache_hits: int = 0
+    cache_misses: int = 0
+    streams: dict[str, StreamStats] = field(default_factory=dict)
+    retried: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        """bool: True if no file failed."""
+        return not self.failed
+
+    def __str__(self) -> str:
+        lines = [
+            f"Documented {len(self.succeeded)} file(s), {len(self.failed)} failed, {len(self.skipped)} unchanged."
+        ]
+        if self.cache_hits or self.cache_misses:
+            lines.append(
+                f"Response cache: {self.cache_hits} hit(s), {self.cache_misses} miss(es)."
+            )
+        if self.retried:
+            lines.append(
+                f"Verification: {len(self.retried)} file(s) retried, {sum(self.retried.values())} retry request(s)."
+            )
+        for name in sorted(self.succeeded):
+            stats = f" ({self.streams[name]})" if name in self.streams else ""
+            if name in self.retried:
+                stats += f" (retried {self.retried[name]}x)"
+            lines.append(f"  [ok]     {name}{stats}")
+        for name, error in sorted(self.failed.items()):
+            lines.append(f"  [failed] {name}: {error}")
+        return "\n".join(lines)
+
+
+@dataclass
+class PackagesSummary:
+    """Outcome of documenting several packages.
+
+    Attributes:
+        packages (dict[str, RunSummary]): Summary of every package that was documented.
+        errors (dict[str, str]): Packages whose run raised, mapped to the error message.
+        locked (dict[str, str]): Packages skipped because another run held their lock, mapped to its owner.
+        seconds (float): Wall time of the whole run.
+    """
+
+    packages: dict[str, RunSummary] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    locked: dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """bool: True if every package was documented without a failed file."""
+        return (
+            not self.errors
+            and not self.locked
+            and all(s.ok for s in self.packages.values())
+        )
+
+    def __str__(self) -> str:
+        succeeded = sum(len(s.succeeded) for s in self.packages.values())
+        failed = sum(len(s.failed) for s in self.packages.values())
+        skipped = sum(len(s.skipped) for s in self.packages.values())
+        lines = [
+            f"Documented {len(self.packages)} package(s) in {self.seconds:.1f}s: {succeeded} file(s),"
+            f" {failed} failed, {skipped} unchanged."
+        ]
+        hits = sum(s.cache_hits for s in self.packages.values())
+        misses = sum(s.cache_misses for s in self.packages.values())
+        if hits or misses:
+            lines.append(f"Response cache: {hits} hit(s), {misses} miss(es).")
+        if self.seconds and succeeded:
+            lines.append(f"Throughput: {succeeded / self.seconds * 60:.1f} files/min.")
+        for package, summary in sorted(self.packages.items()):
+            status = "[ok]    " if summary.ok else "[failed]"
+            lines.append(
+                f"  {status} {package}: {len(summary.succeeded)} documented, {len(summary.failed)} failed,"
+                f" {len(summary.skipped)} unchanged"
+            )
+            for name, error in sorted(summary.failed.items()):
+                lines.append(f"             {name}: {error}")
+        for package, error in sorted(self.errors.items()):
+            lines.append(f"  [error]  {package}: {error}")
+        for package, owner in sorted(self.locked.items()):
+            lines.append(f"  [locked] {package}: {owner}")
+        return "\n".join(lines)
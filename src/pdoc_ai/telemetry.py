@@ -0,0 +1,178 @@
+"""
+Per-request token and latency telemetry for a run.
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+
+@dataclass
+class RequestRecord:
+    """One request sent to (or served on behalf of) the language model.
+
+    Attributes:
+        label (str | None): What the request was for, usually the file being documented.
+        model (str): Model the request was sent to.
+        endpoint (str | None): Server the request was sent to, None if it was served from the cache.
+        prompt_tokens (int): Tokens in the prompt.
+        completion_tokens (int): Tokens in the response.
+        latency (float): Wall-clock seconds from sending the request to the end of the response.
+        ttft (float | None): Seconds to the first streamed token, None for non-streamed requests.
+        ok (bool): False if the request raised.
+        cached (bool): True if the response came from the response cache.
+    """
+
+    label: str | None
+    model: str
+    endpoint: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    ttft: float | None = None
+    ok: bool = True
+    cached: bool = False
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """float: Completion tokens per second of latency."""
+        return self.completion_tokens / self.latency if self.latency > 0 else 0.0
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Compute a percentile with linear interpolation.
+
+    Args:
+        values (list[float]): The samples.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0.0 if there are no samples.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass
+class Telemetry:
+    """Collects a `RequestRecord` for every request of a run.
+
+    Attributes:
+        records (list[RequestRecord]): Requests in completion order.
+        started (float): `perf_counter()` when collection started.
+    """
+
+    records: list[RequestRecord] = field(default_factory=list)
+    started: float = field(default_factory=perf_counter)
+
+    def record(self, **kwargs) -> RequestRecord:
+        """Add a request.
+
+        Args:
+            **kwargs: Fields of `RequestRecord`.
+
+        Returns:
+            RequestRecord: The new record.
+        """
+        rec = RequestRecord(**kwargs)
+        self.records.append(rec)
+        return rec
+
+    def aggregate(self, files: int | None = None) -> dict[str, Any]:
+        """Summarise the run.
+
+        Latency percentiles and throughput only cover requests that reached the model.
+
+        Args:
+            files (int | None, optional): Number of files processed, to report files/min. Defaults to None.
+
+        Returns:
+            dict[str, Any]: Request counts, token totals, latency percentiles and throughput.
+        """
+        wall = perf_counter() - self.started
+        sent = [r for r in self.records if r.ok and not r.cached]
+        latencies = [r.latency for r in sent]
+        ttfts = [r.ttft for r in sent if r.ttft is not None]
+        completion = sum(r.completion_tokens for r in sent)
+        endpoints: dict[str, int] = {}
+        models: dict[str, int] = {}
+        for r in sent:
+            endpoints[r.endpoint] = endpoints.get(r.endpoint, 0) + 1
+            models[r.model] = models.get(r.model, 0) + 1
+        return {
+            "requests": len(self.records),
+            "failed": sum(not r.ok for r in self.records),
+            "cached": sum(r.cached for r in self.records),
+            "prompt_tokens": sum(r.prompt_tokens for r in sent),
+            "completion_tokens": completion,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_max": max(latencies, default=0.0),
+            "ttft_p50": percentile(ttfts, 50),
+            "completion_tokens_per_sec": completion / sum(latencies)
+            if sum(latencies) > 0
+            else 0.0,
+            "wall_seconds": wall,
+            "files": files,
+            "files_per_min": files / wall * 60 if files and wall > 0 else None,
+            "requests_per_endpoint": endpoints,
+            "requests_per_model": models,
+        }
+
+    def report(self, files: int | None = None) -> str:
+        """Format the aggregates for the console.
+
+        Args:
+            files (int | None, optional): Number of files processed. Defaults to None.
+
+        Returns:
+            str: A short multi-line report.
+        """
+        agg = self.aggregate(files=files)
+        lines = [
+            f"Requests: {agg['requests']} ({agg['failed']} failed, {agg['cached']} cached)",
+            f"Tokens: {agg['prompt_tokens']} prompt, {agg['completion_tokens']} completion",
+            f"Latency: p50 {agg['latency_p50']:.2f}s, p95 {agg['latency_p95']:.2f}s, max {agg['latency_max']:.2f}s",
+            f"Throughput: {agg['completion_tokens_per_sec']:.1f} completion tok/s per request",
+        ]
+        if len(agg["requests_per_endpoint"]) > 1:
+            lines.append(
+                "Endpoints: "
+                + ", ".join(f"{e} {n}" for e, n in agg["requests_per_endpoint"].items())
+            )
+        if len(agg["requests_per_model"]) > 1:
+            lines.append(
+                "Models: "
+                + ", ".join(f"{m} {n}" for m, n in agg["requests_per_model"].items())
+            )
+        if agg["files_per_min"] is not None:
+            lines.append(
+                f"Files: {agg['files']} in {agg['wall_seconds']:.1f}s ({agg['files_per_min']:.1f} files/min)"
+            )
+        return "\n".join(lines)
+
+    def write_json(self, path: str | Path, files: int | None = None, **extra) -> None:
+        """Write the aggregates and every request to a JSON report.
+
+        Args:
+            path (str | Path): Report file.
+            files (int | None, optional): Number of files processed. Defaults to None.
+            **extra: Additional top-level entries, e.g. the run summary.
+        """
+        report = {
+            "aggregate": self.aggregate(files=files),
+            "requests": [
+                {**asdict(r), "tokens_per_sec": r.tokens_per_sec} for r in self.records
+            ],
+            **extra,
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
@@ -0,0 +1,60 @@
+"""
+Token counting helpers built on `tiktoken`.
+"""
+
+from functools import cache
+
+import tiktoken
+
+ENCODING: str = "cl100k_base"
+"""Name of the `tiktoken` encoding used to measure prompts."""
+
+
+@cache
+def _encoding() -> tiktoken.Encoding | None:
+    """Load the `tiktoken` encoding once per process.
+
+    Returns:
+        tiktoken.Encoding | None: The encoding, or None if it could not be loaded (e.g. offline hosts without a cached BPE file).
+    """
+    try:
+        return tiktoken.get_encoding(ENCODING)
+    except Exception as e:
+        print(f"Could not load tiktoken encoding {ENCODING!r}, estimating tokens\n{e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in `text`.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Number of tokens. Falls back to ~4 characters per token if the encoding is unavailable.
+    """
+    enc = _encoding()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Trim `text` so that it fits in `budget` tokens.
+
+    Args:
+        text (str): The text to trim.
+        budget (int): Maximum number of tokens to keep.
+
+    Returns:
+        str: `text` unchanged if it fits, otherwise its longest prefix that fits.
+    """
+    if budget <= 0:
+        return ""
+    enc = _encoding()
+    if enc is None:
+        return text[: budget * 4]
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    return enc.decode(tokens[:budget])
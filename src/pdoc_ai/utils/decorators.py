@@ -2,13 +2,21 @@ from functools import wraps
 from time import perf_counter, sleep
 from typing import Any, Callable
 
+from ..resilience import backoff_delay
 
-def retry_on_exception(retries: int = 3, delay: float = 1) -> Callable:
-    """Decorator to retry a function on exception with a specified delay between retries.
+
+def retry_on_exception(
+    retries: int = 3, delay: float = 1, max_delay: float = 60
+) -> Callable:
+    """Decorator to retry a function on exception with exponential backoff and jitter.
+
+    The wait before retry `i` is random between 0 and `min(max_delay, delay * 2 ** (i - 1))`.
+    The last exception is re-raised once all retries are used up.
 
     Args:
-        retries (int): Number of times to retry the function in case of an exception.
-        delay (float): Time interval (in seconds) to wait before retrying the function.
+        retries (int): Number of times to run the function in total.
+        delay (float): Scale (in seconds) of the wait before a retry.
+        max_delay (float): Longest wait (in seconds) before a retry.
 
     Raises:
         ValueError: If `retries` is less than 1 or `delay` is less than or equal to 0.
@@ -31,14 +39,14 @@ def retry_on_exception(retries: int = 3, delay: float = 1) -> Callable:
                     print(f"Running ({i}): {func.__name__}()")
                     return func(*args, **kwargs)
                 except Exception as e:
-                    # Break out of the loop if the max amount of retries is exceeded
+                    # Give up once the max amount of retries is exceeded
                     if i == retries:
                         print(f"Error: {repr(e)}.")
                         print(f'"{func.__name__}()" failed after {retries} retries.')
-                        break
-                    else:
-                        print(f"Error: {repr(e)} -> Retrying...")
-                        sleep(delay)  # Add a delay before running the next iteration
+                        raise
+                    wait = backoff_delay(i, base=delay, cap=max_delay)
+                    print(f"Error: {repr(e)} -> Retrying in {wait:.1f}s...")
+                    sleep(wait)  # Add a delay before running the next iteration
 
         return wrapper
 
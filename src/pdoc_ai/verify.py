@@ -0,0 +1,125 @@
+"""
+Check that a documented file differs from its source only in docstrings.
+"""
+
+import ast
+from itertools import zip_longest
+from pathlib import Path
+
+from .ingester import _is_docstring
+
+_BODIES = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+class VerificationError(ValueError):
+    """Raised when a documented file does not parse or its code differs from the source."""
+
+
+def _is_placeholder(node: ast.stmt) -> bool:
+    return isinstance(node, ast.Pass) or (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and node.value.value is Ellipsis
+    )
+
+
+def _normalise(tree: ast.Module) -> ast.Module:
+    """Remove docstrings, and `pass` or `...` bodies left empty without them, in place.
+
+    Args:
+        tree (ast.Module): A parsed file.
+
+    Returns:
+        ast.Module: The same tree.
+    """
+    for node in ast.walk(tree):
+        if not isinstance(node, _BODIES):
+            continue
+        if node.body and _is_docstring(node.body[0]):
+            node.body = node.body[1:]
+        if len(node.body) == 1 and _is_placeholder(node.body[0]):
+            node.body = []
+    return tree
+
+
+def _describe(node: ast.stmt) -> str:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return f"`def {node.name}`"
+    if isinstance(node, ast.ClassDef):
+        return f"`class {node.name}`"
+    return f"`{type(node).__name__.lower()}` statement"
+
+
+def _difference(source: list[ast.stmt], output: list[ast.stmt]) -> str | None:
+    """Find the first statement that differs, descending into matching classes and functions.
+
+    Args:
+        source (list[ast.stmt]): Normalised statements of the source.
+        output (list[ast.stmt]): Normalised statements of the documented file.
+
+    Returns:
+        str | None: Where the code differs, None if it does not.
+    """
+    for old, new in zip_longest(source, output):
+        if new is None:
+            return f"{_describe(old)} (line {old.lineno} of the source) is missing"
+        if old is None:
+            return f"{_describe(new)} (line {new.lineno}) was added"
+        if ast.dump(old) == ast.dump(new):
+            continue
+        if isinstance(old, _BODIES) and type(old) is type(new) and old.name == new.name:
+            inner = _difference(old.body, new.body)
+            old.body, new.body = [], []
+            # Same header: the difference is in the body
+            if inner is not None and ast.dump(old) == ast.dump(new):
+                return inner
+        return f"{_describe(new)} (line {new.lineno}) differs from the source"
+    return None
+
+
+def verify(source: str, documented: str) -> None:
+    """Check that documenting a file only added or changed docstrings.
+
+    Both files are parsed and compared with their docstrings removed; formatting
+    and comments are ignored.
+
+    Args:
+        source (str): The original file.
+        documented (str): The documented file.
+
+    Raises:
+        VerificationError: If the documented file does not parse, or its code differs.
+            A source that does not parse itself cannot be verified and passes.
+    """
+    try:
+        old = _normalise(ast.parse(source))
+    except (SyntaxError, ValueError):
+        return
+    try:
+        new = _normalise(ast.parse(documented))
+    except SyntaxError as e:
+        raise VerificationError(
+            f"Output does not parse: {e.msg} (line {e.lineno})"
+        ) from e
+    except ValueError as e:
+        raise VerificationError(f"Output does not parse: {e}") from e
+
+    if ast.dump(old) != ast.dump(new):
+        where = _difference(old.body, new.body) or "the module differs from the source"
+        raise VerificationError(f"Code changed: {where}")
+
+
+def verify_file(source: Path, documented: Path) -> None:
+    """Check a documented file against its source on disk, see `verify`.
+
+    Args:
+        source (Path): The original file.
+        documented (Path): The documented file.
+
+    Raises:
+        VerificationError: If the documented file does not parse, or its code differs.
+    """
+    verify(
+        source.read_text(encoding="utf-8"),
+        documented.read_text(encoding="utf-8", errors="replace"),
+    )
@@ -0,0 +1,181 @@
+"""
+Document the files of a package as they are saved, keeping the client and the context warm.
+"""
+
+import asyncio
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Literal
+
+from .cache import open_cache
+from .ingester import ContextCache
+from .llm import LLM
+from .main import Documenter
+from .manifest import Manifest
+from .summary import RunSummary
+
+
+def snapshot(
+    package: Path,
+    context_cache: ContextCache,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+) -> dict[Path, str]:
+    """Hash the files of a package, reading only those whose size or modification time changed.
+
+    Args:
+        package (Path): The root directory of the package.
+        context_cache (ContextCache): Cache that keeps the hashes between calls.
+        include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
+
+    Returns:
+        dict[Path, str]: Content hash of every file.
+    """
+    records = context_cache.files(
+        package, include_patterns=include_patterns, exclude_patterns=exclude_patterns
+    )
+    return {package / record.relpath: record.hash for record in records}
+
+
+def watch(
+    package: Path,
+    include_patterns: list[str] = [],
+    exclude_patterns: list[str] = [],
+    llm_baseurl: str = "http://100.99.54.84:11434/v1",
+    llm_key: str = "ollama",
+    llm_model: str = "code_assist_large",
+    workers: int = 1,
+    context_mode: Literal["package", "pruned"] = "package",
+    context_tokens: int = 8000,
+    cache: bool = True,
+    cache_dir: Path | None = None,
+    cache_max_mb: int = 512,
+    mode: Literal["rewrite", "docstrings"] = "rewrite",
+    context_sizes: dict[str, int] = {},
+    retries: int = 5,
+    warm_up: bool = True,
+    keep_alive: float | str | None = None,
+    verify: bool = True,
+    verify_retries: int = 2,
+    interval: float = 1.0,
+    debounce: float = 0.5,
+    rounds: int | None = None,
+    **kwargs,
+) -> None:
+    """Document the files of a package whenever they change, until interrupted.
+
+    The client, the package context and the caches are set up once. The package
+    is then polled every `interval` seconds; only files whose size or modification
+    time changed are read, and the context is updated with just those files. Once
+    no file has changed for `debounce` seconds, the changed files are documented
+    and recorded in the manifest, so a save costs little more than the model call.
+
+    Args:
+        package (Path): The root directory of the Python package to watch.
+        include_patterns (list[str], optional): Patterns to include when scanning files. Defaults to [].
+        exclude_patterns (list[str], optional): Patterns to exclude when scanning files. Defaults to [].
+        llm_baseurl (str, optional): The base URL for the language model API, comma-separated for several servers.
+            Defaults to "http://100.99.54.84:11434/v1".
+        llm_key (str, optional): The key used to authenticate with the language model API. Defaults to "ollama".
+        llm_model (str, optional): The name of the language model to use. Defaults to "code_assist_large".
+        workers (int, optional): Maximum number of requests in flight to each server at once. Defaults to 1.
+        context_mode (Literal["package", "pruned"], optional): Context sent with each request, see `document`.
+            Defaults to "package".
+        context_tokens (int, optional): Token budget of the per-file context in `pruned` mode. Defaults to 8000.
+        cache (bool, optional): Use the on-disk response and context caches. Defaults to True.
+        cache_dir (Path | None, optional): Directory of the response cache. Defaults to the user cache directory.
+        cache_max_mb (int, optional): Size cap of the response cache in MiB. Defaults to 512.
+        mode (Literal["rewrite", "docstrings"], optional): How docstrings are generated, see `document`.
+            Defaults to "rewrite".
+        context_sizes (dict[str, int], optional): Context window (tokens) per model name. Defaults to {}.
+        retries (int, optional): Retries of a request that failed with a transient error. Defaults to 5.
+        warm_up (bool, optional): Load the model on every Ollama server when the watch starts. Defaults to True.
+        keep_alive (float | str | None, optional): How long Ollama keeps the model loaded after warm-up, e.g.
+            `"30m"`; None for the server default. Defaults to None.
+        verify (bool, optional): Check every documented file against its source. Defaults to True.
+        verify_retries (int, optional): Requests made again for a file that fails verification. Defaults to 2.
+        interval (float, optional): Seconds between scans of the package. Defaults to 1.0.
+        debounce (float, optional): Seconds without further changes before changed files are documented.
+            Defaults to 0.5.
+        rounds (int | None, optional): Stop after documenting this many sets of changes, None to watch until
+            interrupted. Defaults to None.
+    """
+    package = Path(package)
+    context_cache = ContextCache() if cache else ContextCache(directory=None)
+    manifest = Manifest(package)
+    llm = LLM(
+        base_url=llm_baseurl,
+        model=llm_model,
+        key=llm_key,
+        max_concurrency=max(1, workers),
+        cache=open_cache(cache, cache_dir, cache_max_mb),
+        retries=retries,
+        keep_alive=keep_alive,
+    )
+    documenter = Documenter(
+        package=package,
+        llm=llm,
+        include_patterns=include_patterns,
+        exclude_patterns=exclude_patterns,
+        mode=mode,
+        context_mode=context_mode,
+        context_tokens=context_tokens,
+        context_sizes=context_sizes,
+        context_cache=context_cache,
+        verify=verify,
+        verify_retries=verify_retries,
+    )
+
+    def scan() -> dict[Path, str]:
+        return snapshot(package, context_cache, include_patterns, exclude_patterns)
+
+    async def run() -> None:
+        known = await asyncio.to_thread(scan)
+        if warm_up:
+            await llm.aload()
+        print(f"Watching {len(known)} file(s) in {package} (Ctrl+C to stop)")
+
+        pending: set[Path] = set()
+        changed_at = 0.0
+        done = 0
+        try:
+            while rounds is None or done < rounds:
+                await asyncio.sleep(interval)
+                current = await asyncio.to_thread(scan)
+                changed = [
+                    file
+                    for file in known.keys() | current.keys()
+                    if known.get(file) != current.get(file)
+                ]
+                if changed:
+                    documenter.refresh(changed)
+                    pending = {
+                        file for file in pending | set(changed) if file in current
+                    }
+                    known, changed_at = current, monotonic()
+                    continue
+                if not pending or monotonic() - changed_at < debounce:
+                    continue
+
+                files, pending = sorted(pending), set()
+                summary = RunSummary()
+                start = perf_counter()
+                await documenter.run(
+                    files, summary=summary, manifest=manifest, hashes=current
+                )
+                done += 1
+                if warm_up and keep_alive is not None:
+                    # Requests reset the keep-alive to the server default
+                    await llm.aload()
+                print(
+                    f"Documented {len(summary.succeeded)} file(s), {len(summary.failed)} failed"
+                    f" in {perf_counter() - start:.1f}s"
+                )
+        finally:
+            await llm.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"Stopped watching {package}")
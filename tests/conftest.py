@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The fake model server and the synthetic sources live with the benchmarks
+sys.path.insert(0, str(Path(__file__).parents[1] / "scripts" / "bench"))
+
+from fake_server import FakeServer, Profile  # noqa: E402
+from strip import synthetic_module  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    """A fast local stand-in for the model server."""
+    with FakeServer(Profile(prefill=1e6, decode=1e6, slots=8)) as fake:
+        yield fake
+
+
+@pytest.fixture
+def package(tmp_path):
+    """A package of three documented modules of about 2000 tokens each."""
+    root = tmp_path / "pkg"
+    root.mkdir()
+    for idx in range(3):
+        (root / f"mod{idx}.py").write_text(synthetic_module(idx), encoding="utf-8")
+    return root
+
+
+def run_options(server: FakeServer, **kwargs) -> dict:
+    """Arguments of `document` for a quick uncached run against `server`."""
+    return {
+        "llm_baseurl": server.url,
+        "llm_model": "fake",
+        "cache": False,
+        "warm_up": False,
+        "poll_seconds": 0.05,
+        **kwargs,
+    }
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from conftest import run_options
+from fake_server import FakeServer, Profile
+
+from pdoc_ai.batch import BATCH_STATE_NAME, BatchState
+from pdoc_ai.llm import LLM
+from pdoc_ai.main import Documenter, document
+from pdoc_ai.summary import RunSummary
+
+FILES = ["/mod0.py", "/mod1.py", "/mod2.py"]
+
+
+@pytest.mark.parametrize("mode", ["rewrite", "docstrings"])
+def test_batch_documents_every_file(server, package, mode):
+    if mode == "docstrings":
+        for path in package.glob("mod*.py"):
+            path.write_text("def f(a):\n    return a\n", encoding="utf-8")
+
+    summary = document(package, **run_options(server, batch=True, mode=mode))
+
+    assert summary.failed == {}
+    assert sorted(summary.succeeded) == FILES
+    assert [b["request_counts"]["total"] for b in server.batches.values()] == [3]
+    assert not (package / BATCH_STATE_NAME).exists()
+
+
+def test_resume_collects_saved_batch_and_submits_the_rest(package):
+    with FakeServer(Profile(prefill=1e6, decode=1e6, batch_delay=0.5)) as server:
+        state = BatchState(path=package / BATCH_STATE_NAME)
+
+        async def interrupted() -> None:
+            llm = LLM(base_url=server.url, model="fake", cache=None)
+            documenter = Documenter(package=package, llm=llm)
+            task = asyncio.create_task(
+                documenter.run_batch(
+                    [package / "mod0.py"], RunSummary(), state=state, poll_seconds=0.05
+                )
+            )
+            while not state.batches:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await llm.aclose()
+
+        asyncio.run(interrupted())
+        assert list(BatchState.load(package).files) == ["mod0.py"]
+
+        summary = document(package, **run_options(server, batch=True))
+
+    assert summary.failed == {}
+    assert sorted(summary.succeeded) == FILES
+    # The saved batch was collected, not submitted again
+    totals = [b["request_counts"]["total"] for b in server.batches.values()]
+    assert totals == [1, 2]
+    assert not (package / BATCH_STATE_NAME).exists()
+
+
+def test_failed_batch_lines_fail_only_their_files(package):
+    profile = Profile(prefill=1e6, decode=1e6, slots=1, error_rate=0.5, seed=1)
+    with FakeServer(profile) as server:
+        summary = document(package, **run_options(server, batch=True))
+        counts = server.batches["batch_1"]["request_counts"]
+
+    assert counts["failed"] and counts["completed"]
+    assert len(summary.failed) == counts["failed"]
+    assert len(summary.succeeded) == counts["completed"]
+    assert sorted([*summary.failed, *summary.succeeded]) == FILES
+    for relpath in summary.succeeded:
+        assert (package / f"nosync_{relpath[1:]}").is_file()
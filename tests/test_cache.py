@@ -0,0 +1,20 @@
+from pdoc_ai.cache import ResponseCache
+
+
+def test_size_counts_overwritten_entries_once(tmp_path):
+    cache = ResponseCache(directory=tmp_path)
+    key = ResponseCache.key({"model": "fake", "messages": []})
+    for value in ("first", "second response", "third"):
+        cache.set(key, value)
+    on_disk = sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+    assert cache.size == on_disk
+    assert cache.get(key) == "third"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(directory=tmp_path, max_bytes=100)
+    cache.set("aa1", "x" * 40)
+    cache.set("bb2", "y" * 40)
+    cache.set("cc3", "z" * 40)
+    assert cache.size <= 100
+    assert cache.get("cc3") == "z" * 40
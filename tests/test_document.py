@@ -0,0 +1,57 @@
+import ast
+
+import pytest
+from conftest import run_options
+
+from pdoc_ai.main import document
+
+
+def outputs(package):
+    return {path.name: path for path in package.glob("mod*.py")}
+
+
+@pytest.mark.parametrize("context_size", [5500, 7000])
+def test_chunked_files_join_back_into_the_source(server, package, context_size):
+    summary = document(
+        package, **run_options(server, context_sizes={"fake": context_size})
+    )
+
+    assert summary.failed == {}
+    assert sorted(summary.succeeded) == ["/mod0.py", "/mod1.py", "/mod2.py"]
+    # More than one request per file, so the files were split
+    assert server.counts["ok"] > 3
+    for name, source in outputs(package).items():
+        documented = (package / f"nosync_{name}").read_text(encoding="utf-8")
+        # The server echoes every chunk, so joined they are the source, up to
+        # the blank lines at the chunk edges
+        assert ast.dump(ast.parse(documented)) == ast.dump(
+            ast.parse(source.read_text(encoding="utf-8"))
+        )
+
+
+def test_undecodable_file_fails_alone_when_routing(server, package):
+    (package / "latin.py").write_bytes(b"x = '\xff'\n")
+
+    summary = document(package, **run_options(server, routes={"small": 10000}))
+
+    assert list(summary.failed) == ["/latin.py"]
+    assert sorted(summary.succeeded) == ["/mod0.py", "/mod1.py", "/mod2.py"]
+
+
+def test_docstrings_mode_splices_into_the_source(server, package):
+    source = package / "mod0.py"
+    source.write_text(
+        "def quoted(a):\n    return f'\"{a}\"'\n\n\nclass Empty:\n    pass\n",
+        encoding="utf-8",
+    )
+
+    summary = document(package, pyfile=source, **run_options(server, mode="docstrings"))
+
+    assert summary.failed == {}
+    tree = ast.parse((package / "nosync_mod0.py").read_text(encoding="utf-8"))
+    assert ast.get_docstring(tree) is not None
+    assert all(
+        ast.get_docstring(node) is not None
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef))
+    )
@@ -0,0 +1,15 @@
+from pdoc_ai.planner import plan
+
+
+def test_unreadable_files_are_reported_not_raised(package):
+    (package / "latin.py").write_bytes(b"x = '\xff'\n")
+    (package / "broken.py").write_text("def broken(:\n", encoding="utf-8")
+
+    result = plan(package, mode="docstrings")
+
+    errors = {f.name: f.error for f in result.files if f.error is not None}
+    assert set(errors) == {"/latin.py", "/broken.py"}
+    assert errors["/latin.py"].startswith("UnicodeDecodeError")
+    assert errors["/broken.py"].startswith("SyntaxError")
+    assert len(result.files) == 5
+    assert "Could not plan 2 file(s)" in str(result)
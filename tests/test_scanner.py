@@ -0,0 +1,19 @@
+from pdoc_ai.scanner import walk
+
+
+def test_walk_skips_build_dirs_but_not_subpackages(tmp_path):
+    files = [
+        "mod.py",
+        "build/lib/mod.py",
+        "venv/lib/site.py",
+        ".hidden/mod.py",
+        "tests/test_mod.py",
+        "pkg/build/__init__.py",
+        "pkg/build/steps.py",
+    ]
+    for relpath in files:
+        (tmp_path / relpath).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relpath).write_text("x = 1\n", encoding="utf-8")
+
+    assert walk(tmp_path) == ["mod.py", "pkg/build/__init__.py", "pkg/build/steps.py"]
+    assert walk(tmp_path, exclude_patterns=["**/build/*"]) == ["mod.py"]
@@ -0,0 +1,49 @@
+import ast
+
+import pytest
+
+from pdoc_ai.splice import (
+    MODULE,
+    find_undocumented,
+    format_docstring,
+    splice_docstrings,
+)
+
+SOURCE = """import os
+
+
+class Model:
+    def value(self):
+        return os.sep
+"""
+
+
+@pytest.mark.parametrize(
+    "docstring",
+    [
+        'Return the value "ok"',
+        "Return the path separator \\",
+        'Say """hi"""',
+        'Match \\d+ in """quotes"""',
+        'First line.\n\nSecond paragraph ending in a quote "',
+    ],
+)
+def test_format_docstring_round_trips(docstring):
+    lines = format_docstring(docstring, "    ")
+    source = "def f():\n" + "".join(lines) + "    pass\n"
+    node = ast.parse(source).body[0]
+    assert ast.get_docstring(node).rstrip() == docstring
+
+
+def test_splice_leaves_other_lines_untouched():
+    symbols = find_undocumented(SOURCE)
+    assert {s.name for s in symbols} == {MODULE, "Model", "Model.value"}
+
+    docstrings = {s.name: f'Docstring of "{s.name}"' for s in symbols}
+    result = splice_docstrings(SOURCE, symbols, docstrings)
+
+    tree = ast.parse(result)
+    assert ast.get_docstring(tree).rstrip() == f'Docstring of "{MODULE}"'
+    assert find_undocumented(result) == []
+    kept = [line for line in result.splitlines() if '"""' not in line]
+    assert kept == SOURCE.splitlines()